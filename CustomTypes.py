@@ -1,12 +1,97 @@
 import base64
+from io import BytesIO
+
 from sqlalchemy.types import TypeDecorator, LargeBinary
 
+
+def mimetype_imagem(dados):
+    """Identifica o tipo da imagem pelos primeiros bytes (JPEG por padrão)."""
+    dados = bytes(dados[:12])
+    if dados[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'image/png'
+    if dados[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if dados[:4] == b'RIFF' and dados[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/jpeg'
+
+
+class Imagem:
+    """
+    Imagem lida do banco. Guarda o buffer entregue pelo driver (bytes ou
+    memoryview) sem copiá-lo; o Base64 só é gerado quando um template pede o
+    data URI (``{{ imagem }}`` ou ``imagem.data_uri()``), uma vez por objeto.
+    Para HTTP e ReportLab use ``bytes(imagem)`` ou ``imagem.abrir()``.
+    """
+    __slots__ = ('dados', '_data_uri')
+
+    def __init__(self, dados):
+        # O psycopg2 entrega memoryview no formato 'c'; 'B' permite comparar com bytes
+        if isinstance(dados, memoryview) and dados.format != 'B':
+            dados = dados.cast('B')
+        self.dados = dados
+        self._data_uri = None
+
+    @property
+    def mimetype(self):
+        return mimetype_imagem(self.dados)
+
+    def base64(self):
+        return base64.b64encode(self.dados).decode('ascii')
+
+    def data_uri(self):
+        if self._data_uri is None:
+            self._data_uri = f"data:{self.mimetype};base64,{self.base64()}"
+        return self._data_uri
+
+    def abrir(self):
+        """Arquivo em memória com a imagem, para bibliotecas que leem de um fluxo."""
+        return BytesIO(self.dados)
+
+    def __bytes__(self):
+        return bytes(self.dados)
+
+    def __len__(self):
+        return len(self.dados)
+
+    def __bool__(self):
+        return len(self.dados) > 0
+
+    def __eq__(self, outro):
+        if isinstance(outro, Imagem):
+            outro = outro.dados
+        if isinstance(outro, (bytes, bytearray, memoryview)):
+            return self.dados == outro
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(bytes(self.dados))
+
+    # Jinja chama __html__ ao renderizar; o data URI não tem caracteres a escapar
+    def __html__(self):
+        return self.data_uri()
+
+    __str__ = data_uri
+
+    def __repr__(self):
+        return f"<Imagem {self.mimetype} {len(self)} bytes>"
+
+
 class ImageBase64(TypeDecorator):
+    """
+    Coluna BYTEA para imagens. Na gravação aceita bytes, memoryview, Imagem ou
+    uma string Base64/data URI (como vem dos formulários); na leitura devolve
+    uma Imagem com o buffer do driver.
+    """
     impl = LargeBinary
+    # Sem estado próprio: as consultas que usam o tipo podem ir para o cache de SQL
+    cache_ok = True
 
     def process_bind_param(self, value, dialect):
         if value is None:
             return None
+        if isinstance(value, Imagem):
+            return value.dados
         if isinstance(value, str):
             if value.startswith('data:image'):
                 header, encoded = value.split(',', 1)
@@ -19,16 +104,17 @@ class ImageBase64(TypeDecorator):
                 return None
         return value
 
+    def result_processor(self, dialect, coltype):
+        # Dispensa a conversão do LargeBinary para bytes: o memoryview do
+        # driver vai direto para a Imagem, sem cópia.
+        def process(value):
+            return self.process_result_value(value, dialect)
+        return process
+
     def process_result_value(self, value, dialect):
         if value is None:
             return None
-        if isinstance(value, bytes):
-            try:
-                return f"data:image/jpeg;base64,{base64.b64encode(value).decode('utf-8')}"
-            except Exception as e:
-                print(f"ERROR (CustomType result): Falha ao codificar binário para Base64: {e}")
-                return None
-        return value
+        return Imagem(value)
 
     def copy(self, **kw):
-        return ImageBase64(self.impl.length)
\ No newline at end of file
+        return ImageBase64(self.impl.length)
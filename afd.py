@@ -0,0 +1,118 @@
+"""
+Leitura em fluxo de arquivos AFD (Arquivo Fonte de Dados) dos relógios de ponto.
+
+O arquivo é lido em blocos de tamanho fixo e as linhas são interpretadas uma a
+uma, de modo que o consumo de memória não depende do tamanho do arquivo.
+As posições dos campos seguem o leiaute da Portaria 1510/2009.
+"""
+import datetime
+import os
+from collections import namedtuple
+
+# Tamanho dos blocos lidos do arquivo (em bytes).
+TAMANHO_BLOCO = 64 * 1024
+# Tipos de registro que representam marcações de ponto.
+TIPOS_MARCACAO = ('3', '7')
+
+# Marcação de ponto: NSR, tipo do registro, data/hora e o campo PIS/CPF original.
+RegistroMarcacao = namedtuple('RegistroMarcacao', ['nsr', 'tipo', 'data_hora', 'pis'])
+# Cabeçalho (registro tipo 1): identifica o REP e o empregador.
+RegistroCabecalho = namedtuple('RegistroCabecalho', ['numero_fabricacao', 'cnpj_cpf', 'razao_social'])
+
+
+def iterar_linhas(arquivo, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Gera as linhas de um arquivo AFD, decodificadas em latin-1.
+    Aceita um caminho em disco, um arquivo aberto em modo binário ou um
+    FileStorage do Werkzeug (upload).
+    """
+    if isinstance(arquivo, (str, os.PathLike)):
+        with open(arquivo, 'rb') as fluxo:
+            yield from iterar_linhas(fluxo, tamanho_bloco)
+        return
+
+    fluxo = getattr(arquivo, 'stream', arquivo)
+    resto = b''
+    while True:
+        bloco = fluxo.read(tamanho_bloco)
+        if not bloco:
+            break
+        partes = (resto + bloco).split(b'\n')
+        # A última parte pode ser uma linha incompleta; fica para o próximo bloco
+        resto = partes.pop()
+        for parte in partes:
+            yield parte.decode('latin-1').rstrip('\r')
+    if resto:
+        yield resto.decode('latin-1').rstrip('\r')
+
+
+def interpretar_linha(linha):
+    """
+    Converte uma linha de marcação (tipo 3 ou 7) em RegistroMarcacao.
+    Retorna None para linhas de outros tipos ou mal formadas.
+    """
+    linha = linha.strip()
+    if len(linha) < 34:
+        return None
+
+    tipo = linha[9]
+    if tipo not in TIPOS_MARCACAO:
+        return None
+
+    # AFD: DDMMYYYYHHMM a partir da posição 10
+    try:
+        data_hora = datetime.datetime.strptime(linha[10:22], '%d%m%Y%H%M')
+    except ValueError:
+        return None
+
+    nsr = int(linha[:9]) if linha[:9].isdigit() else None
+    return RegistroMarcacao(nsr=nsr, tipo=tipo, data_hora=data_hora, pis=linha[22:34].strip())
+
+
+def interpretar_cabecalho(linha):
+    """Converte o registro tipo 1 em RegistroCabecalho; None para as demais linhas."""
+    linha = linha.strip('\r\n')
+    if len(linha) < 204 or linha[9] != '1':
+        return None
+    return RegistroCabecalho(
+        numero_fabricacao=linha[187:204].strip(),
+        cnpj_cpf=linha[11:25].strip(),
+        razao_social=linha[37:187].strip(),
+    )
+
+
+def ler_cabecalho(arquivo):
+    """Retorna o cabeçalho da primeira linha do arquivo, ou None se não houver."""
+    linhas = iterar_linhas(arquivo)
+    try:
+        return interpretar_cabecalho(next(linhas, ''))
+    finally:
+        linhas.close()
+
+
+def iterar_linhas_desde(arquivo, nsr_minimo=0, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Como ``iterar_linhas``, descartando sem interpretar as linhas com NSR
+    menor ou igual a ``nsr_minimo``.
+    """
+    for linha in iterar_linhas(arquivo, tamanho_bloco):
+        if nsr_minimo and linha[:9].isdigit() and int(linha[:9]) <= nsr_minimo:
+            continue
+        yield linha
+
+
+def interpretar_linhas(linhas):
+    """Lista das marcações de um bloco de linhas, ignorando os demais registros."""
+    return [registro for registro in map(interpretar_linha, linhas) if registro is not None]
+
+
+def ler_marcacoes(arquivo, tamanho_bloco=TAMANHO_BLOCO, nsr_minimo=0):
+    """
+    Gera as marcações de um arquivo AFD, ignorando os demais registros.
+    Linhas com NSR menor ou igual a ``nsr_minimo`` são descartadas antes de
+    serem interpretadas.
+    """
+    for linha in iterar_linhas_desde(arquivo, nsr_minimo, tamanho_bloco):
+        registro = interpretar_linha(linha)
+        if registro is not None:
+            yield registro
@@ -1,11 +1,19 @@
-from flask import Flask, render_template, session, redirect, url_for, request, flash, jsonify, Response
-from sqlalchemy import or_, text, inspect
+from flask import Flask, render_template, session, redirect, url_for, request, flash, jsonify, Response, abort
+from sqlalchemy import or_, text, inspect, tuple_, func, type_coerce, LargeBinary
+from sqlalchemy.orm import joinedload
 from sqlalchemy.exc import IntegrityError
 from extensions import db
 from config import Config
+from CustomTypes import mimetype_imagem
 import os
+import hmac
+import uuid
+import zipfile
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.utils import secure_filename
 import datetime
+from collections import Counter
+from decimal import Decimal, InvalidOperation
 
 # Importações para geração de PDF
 from io import BytesIO
@@ -45,8 +53,10 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
 
-    # Aumenta o limite de tamanho do corpo da requisição para 16 MB (pode ser ajustado)
-    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 Megabytes
+    # Aumenta o limite de tamanho do corpo da requisição para 64 MB (pode ser ajustado).
+    # Uploads grandes são gravados pelo Werkzeug em arquivo temporário e os AFDs
+    # são lidos em fluxo, então o limite não impacta a memória do processo.
+    app.config['MAX_CONTENT_LENGTH'] = 64 * 1024 * 1024  # 64 Megabytes
 
     # Associa a instância do SQLAlchemy ao aplicativo Flask.
     # Isso deve acontecer DENTRO da função de criação do aplicativo.
@@ -60,7 +70,27 @@ def create_app():
                        RegistroPonto, LogAuditoria, Usuario, Cidade, Setor, Funcao,
                        Demissao, Jornada, EntidadeSaudeOcupacional, TipoExame,
                        ExameFuncao, ExameFuncionario, ItemEPI, DistribuicaoItem,
-                       DevolucaoItem, Adiantamento, ParcelaAdiantamento)
+                       DevolucaoItem, Adiantamento, ParcelaAdiantamento,
+                       TarefaImportacao, ResumoPontoDiario)
+    from importacao_ponto import gravar_marcacoes, registrar_marcacoes_api
+    from tarefas import submeter_importacao, submeter_importacao_zip
+    from espelho_ponto import calcular_espelho, totalizar
+    from resumo_ponto import atualizar_resumo_diario
+    from fotos import salvar_foto, escolher_tamanho, carregar_foto
+    from identificadores import resolver_primeiro, resolver_identificador, invalidar as invalidar_identificadores
+    from dependencias import verificar_dependencias, mensagem_bloqueio
+    from validacao import valida_cpf
+    from perfil_funcionario import carregar_perfil, contrato_mais_recente
+    from contratos import contrato_ativo, INDICE_CONTRATO_ATIVO
+    from historico_salarial import atualizar_historico_salarial, salario_vigente
+    from importacao_funcionarios import (
+        EXTENSOES as EXTENSOES_PLANILHA, REGIMES_CONTRATACAO, importar_funcionarios as importar_planilha_funcionarios,
+    )
+    from dissidio import aplicar_dissidio, previa_dissidio
+    from quadro_pessoal import quadro_mensal, invalidar as invalidar_quadro_pessoal
+    from busca_funcionarios import (
+        buscar_funcionarios, contar_funcionarios, cidades_cadastradas, escapar_like, ORDENACOES, STATUS_SEM_CONTRATO,
+    )
 
     # Define o diretório de uploads (para planilhas e outros arquivos)
     UPLOAD_FOLDER = 'uploads'
@@ -68,40 +98,6 @@ def create_app():
         os.makedirs(UPLOAD_FOLDER)
     app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
-    # --- Funções Auxiliares de Validação ---
-    def valida_cpf(cpf):
-        """
-        Valida o CPF de acordo com o algoritmo da Receita Federal.
-        Aceita CPF com ou sem pontos e traço.
-        """
-        cpf = ''.join(filter(str.isdigit, cpf)) # Remove pontos e traço
-
-        if len(cpf) != 11 or len(set(cpf)) == 1: # Verifica se tem 11 dígitos e não são todos iguais
-            return False
-
-        # Validação do primeiro dígito
-        soma = 0
-        for i in range(9):
-            soma += int(cpf[i]) * (10 - i)
-        digito1 = 11 - (soma % 11)
-        if digito1 > 9:
-            digito1 = 0
-        if digito1 != int(cpf[9]):
-            return False
-
-        # Validação do segundo dígão
-
-        soma = 0
-        for i in range(10):
-            soma += int(cpf[i]) * (11 - i)
-        digito2 = 11 - (soma % 11)
-        if digito2 > 9:
-            digito2 = 0
-        if digito2 != int(cpf[10]):
-            return False
-
-        return True
-
     # --- Rotas da Aplicação ---
 
     @app.route('/')
@@ -119,11 +115,19 @@ def create_app():
         exames_proximos = ExameFuncionario.query.filter(ExameFuncionario.data_vencimento <= limite).all()
         vencidos = [e for e in exames_proximos if e.data_vencimento < hoje]
         alerta_amarelo = [e for e in exames_proximos if hoje <= e.data_vencimento <= hoje + datetime.timedelta(days=7)]
+        # Presença lida do resumo diário, sem agregar registro_ponto
+        presentes_hoje = ResumoPontoDiario.query.filter_by(data=hoje).count()
+        anomalias_ponto = ResumoPontoDiario.query.filter(
+            ResumoPontoDiario.data >= hoje - datetime.timedelta(days=7),
+            ResumoPontoDiario.anomalia.is_(True)
+        ).count()
         return render_template(
             'index.html',
             total_funcionarios_ativos=total_funcionarios_ativos,
             exames_vencidos=len(vencidos),
-            exames_proximos=len(alerta_amarelo)
+            exames_proximos=len(alerta_amarelo),
+            presentes_hoje=presentes_hoje,
+            anomalias_ponto=anomalias_ponto
         )
 
     @app.route('/login', methods=['GET', 'POST'])
@@ -203,14 +207,115 @@ def create_app():
     @app.route('/funcionarios')
     def listar_funcionarios():
         """
-        Exibe a lista de todos os funcionários cadastrados.
+        Exibe a primeira página da busca de funcionários; as seguintes são
+        carregadas pela página através de /api/funcionarios.
         """
         if 'usuario_id' not in session:
             flash('Você precisa estar logado para acessar esta página.', 'warning')
             return redirect(url_for('login'))
-        
-        funcionarios = Funcionario.query.all()
-        return render_template('funcionarios.html', funcionarios=funcionarios)
+
+        filtros = {
+            'busca': request.args.get('busca', '').strip(),
+            'status': request.args.get('status', '').strip(),
+            'cidade': request.args.get('cidade', '').strip(),
+            'ordem': request.args.get('ordem', 'nome'),
+        }
+        if filtros['ordem'] not in ORDENACOES:
+            filtros['ordem'] = 'nome'
+        funcionarios, proxima = buscar_funcionarios(
+            filtros['busca'], filtros['status'], filtros['cidade'], filtros['ordem']
+        )
+        return render_template(
+            'funcionarios.html',
+            funcionarios=funcionarios,
+            proxima=proxima,
+            total=contar_funcionarios(filtros['busca'], filtros['status'], filtros['cidade']),
+            filtros=filtros,
+            cidades=cidades_cadastradas(),
+            status_sem_contrato=STATUS_SEM_CONTRATO,
+        )
+
+    @app.route('/api/funcionarios', methods=['GET'])
+    def api_listar_funcionarios():
+        """
+        Página seguinte da busca de funcionários (mesmos filtros da listagem),
+        a partir da chave ``apos`` devolvida pela página anterior.
+        """
+        if 'usuario_id' not in session:
+            return jsonify({'error': 'Não autenticado.'}), 401
+
+        try:
+            funcionarios, proxima = buscar_funcionarios(
+                request.args.get('busca', ''),
+                request.args.get('status', '').strip(),
+                request.args.get('cidade', '').strip(),
+                request.args.get('ordem', 'nome'),
+                request.args.get('apos', ''),
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        resposta = {
+            'funcionarios': [{
+                'cpf': f.cpf,
+                'nome': f.nome,
+                'data_nascimento': f.data_nascimento.strftime('%d/%m/%Y') if f.data_nascimento else '',
+                'sexo': f.sexo,
+                'pis': f.pis,
+                'id_face': f.id_face,
+                'telefone': f.telefone,
+                'grau_instrucao': f.grau_instrucao,
+                'status': f.status,
+            } for f in funcionarios],
+            'proxima': proxima,
+        }
+        if not request.args.get('apos'):
+            resposta['total'] = contar_funcionarios(
+                request.args.get('busca', ''), request.args.get('status', '').strip(), request.args.get('cidade', '').strip()
+            )
+        return jsonify(resposta)
+
+    @app.route('/funcionarios/importar', methods=['GET', 'POST'])
+    def importar_funcionarios():
+        """
+        Importa funcionários e contratos de uma planilha CSV ou XLSX.
+        As linhas com erro são listadas e as válidas são gravadas.
+        """
+        if 'usuario_id' not in session or session['tipo_usuario'] not in ['Master']:
+            flash('Acesso negado. Apenas usuários Master podem importar funcionários.', 'danger')
+            return redirect(url_for('login'))
+
+        resumo = None
+        if request.method == 'POST':
+            arquivo = request.files.get('planilha')
+            if not arquivo or not arquivo.filename:
+                flash('Nenhum arquivo selecionado.', 'danger')
+                return redirect(request.url)
+            nome_seguro = secure_filename(arquivo.filename) or 'planilha.csv'
+            if os.path.splitext(nome_seguro)[1].lower() not in EXTENSOES_PLANILHA:
+                flash('Formato de arquivo não suportado. Envie uma planilha CSV ou XLSX.', 'danger')
+                return redirect(request.url)
+
+            # A planilha é salva em disco e lida em fluxo, sem carregá-la inteira em memória
+            caminho = os.path.join(app.config['UPLOAD_FOLDER'], f"funcionarios_{uuid.uuid4().hex}_{nome_seguro}")
+            arquivo.save(caminho)
+            try:
+                resumo = importar_planilha_funcionarios(
+                    caminho, session['usuario_id'], nome_arquivo=arquivo.filename[:255],
+                    sexos=SEXOS, graus_instrucao=GRAUS_INSTRUCAO,
+                )
+            except ValueError as e:
+                flash(str(e), 'danger')
+                return redirect(request.url)
+            finally:
+                os.remove(caminho)
+
+            if resumo['funcionarios']:
+                flash(f"{resumo['funcionarios']} funcionário(s) e {resumo['contratos']} contrato(s) importados com sucesso!", 'success')
+            if resumo['erros']:
+                flash(f"{len(resumo['erros'])} linha(s) com erro não foram importadas. Corrija-as e envie somente essas linhas novamente.", 'warning')
+
+        return render_template('importar_funcionarios.html', resumo=resumo)
 
     @app.route('/funcionarios/add', methods=['GET', 'POST'])
     def adicionar_funcionario():
@@ -280,12 +385,18 @@ def create_app():
                 nome_banco=nome_banco, codigo_agencia=codigo_agencia,
                 numero_conta=numero_conta, variacao_conta=variacao_conta,
                 chave_pix=chave_pix, observacao=observacao,
-                foto_base64=foto_base64_str, # Passa a string Base64, o CustomType cuidará da decodificação
                 status=""
             )
+            # Normaliza a foto e gera as versões reduzidas (ver fotos.py)
+            try:
+                salvar_foto(novo_funcionario, foto_base64_str)
+            except ValueError as e:
+                flash(f'Foto inválida: {e}', 'danger')
+                return render_template('funcionario_form.html', funcionario=None, estados_uf=estados_uf, graus_instrucao=GRAUS_INSTRUCAO, sexos=SEXOS)
             db.session.add(novo_funcionario)
             try:
                 db.session.commit()
+                invalidar_identificadores(cpf)
                 print("DEBUG (ADD): Commit bem-sucedido.")
             except Exception as e:
                 db.session.rollback()
@@ -368,7 +479,7 @@ def create_app():
                 'codigo_agencia': funcionario.codigo_agencia, 'numero_conta': funcionario.numero_conta,
                 'variacao_conta': funcionario.variacao_conta, 'chave_pix': funcionario.chave_pix,
                 'observacao': funcionario.observacao,
-                'foto_base64': funcionario.foto_base64 # O CustomType já retornou a string Base64 para o objeto
+                'foto_hash': funcionario.foto_hash # A foto é identificada pelo hash; os bytes não vão para o log
             }
 
             funcionario.nome = nome
@@ -390,10 +501,16 @@ def create_app():
             funcionario.variacao_conta = variacao_conta
             funcionario.chave_pix = chave_pix
             funcionario.observacao = observacao
-            funcionario.foto_base64 = foto_base64_str # Passa a string Base64, o CustomType cuidará da decodificação
+            try:
+                salvar_foto(funcionario, foto_base64_str)
+            except ValueError as e:
+                db.session.rollback()
+                flash(f'Foto inválida: {e}', 'danger')
+                return render_template('funcionario_form.html', funcionario=funcionario, estados_uf=estados_uf, graus_instrucao=GRAUS_INSTRUCAO, sexos=SEXOS)
 
             try:
                 db.session.commit()
+                invalidar_identificadores(cpf)
                 print("DEBUG (EDIT): Commit bem-sucedido.")
             except Exception as e:
                 db.session.rollback()
@@ -413,7 +530,7 @@ def create_app():
                 'codigo_agencia': funcionario.codigo_agencia, 'numero_conta': funcionario.numero_conta,
                 'variacao_conta': funcionario.variacao_conta, 'chave_pix': funcionario.chave_pix,
                 'observacao': funcionario.observacao,
-                'foto_base64': funcionario.foto_base64 # O CustomType já retornou a string Base64 para o objeto
+                'foto_hash': funcionario.foto_hash
             }
 
             log_entry = LogAuditoria(
@@ -438,8 +555,46 @@ def create_app():
         if 'usuario_id' not in session:
             flash('Você precisa estar logado para acessar esta página.', 'warning')
             return redirect(url_for('login'))
-        funcionario = Funcionario.query.get_or_404(cpf)
-        return render_template('funcionario_detalhes.html', funcionario=funcionario)
+        # Funcionário e todas as coleções exibidas, em um número fixo de consultas
+        perfil = carregar_perfil(cpf)
+        if perfil is None:
+            abort(404)
+        funcionario, tem_foto = perfil
+        return render_template(
+            'funcionario_detalhes.html', funcionario=funcionario, tem_foto=tem_foto,
+            salario_atual=salario_vigente(cpf, datetime.date.today()),
+        )
+
+    @app.route('/funcionarios/<string:cpf>/foto')
+    def foto_funcionario(cpf):
+        """
+        Retorna a foto do funcionário em bytes, com ETag. O parâmetro ``lado``
+        (em pixels) escolhe a menor versão pré-calculada que o atenda. Se o
+        navegador já tiver a versão atual, responde 304 sem ler a imagem.
+        """
+        if 'usuario_id' not in session:
+            return Response(status=401)
+
+        tamanho = escolher_tamanho(request.args.get('lado', 0, type=int))
+        foto_hash = db.session.query(Funcionario.foto_hash).filter_by(cpf=cpf).scalar()
+        if foto_hash:
+            etag = f'{foto_hash}-{tamanho}'
+        else:
+            # Foto ainda sem versões (anterior a gerar_versoes_fotos.py): MD5 calculado pelo banco
+            etag = db.session.query(func.md5(type_coerce(Funcionario.foto_base64, LargeBinary))).filter_by(cpf=cpf).scalar()
+        if etag is None:
+            return Response(status=404)
+        if etag in request.if_none_match:
+            resposta = Response(status=304)
+        else:
+            _, dados = carregar_foto(cpf, tamanho)
+            if dados is None:
+                return Response(status=404)
+            resposta = Response(dados, mimetype=mimetype_imagem(dados))
+        resposta.set_etag(etag)
+        # O navegador guarda a foto, mas revalida pelo ETag a cada uso
+        resposta.headers['Cache-Control'] = 'private, no-cache'
+        return resposta
 
     @app.route('/funcionarios/delete/<string:cpf>', methods=['POST'])
     def deletar_funcionario(cpf):
@@ -453,28 +608,12 @@ def create_app():
         
         funcionario = Funcionario.query.get_or_404(cpf)
 
-        if Dependente.query.filter_by(cpf_funcionario=cpf).first():
-            flash(f'Não foi possível deletar o funcionário {funcionario.nome}. Ele possui dependentes cadastrados. Por favor, remova os dependentes primeiro.', 'danger')
-            return redirect(url_for('listar_funcionarios'))
-        if ContratoTrabalho.query.filter_by(cpf_funcionario=cpf).first():
-            flash(f'Não foi possível deletar o funcionário {funcionario.nome}. Ele possui contratos de trabalho. Por favor, remova os contratos primeiro.', 'danger')
+        # Todas as tabelas que referenciam o funcionário, em uma consulta
+        bloqueios = verificar_dependencias(funcionario)
+        if bloqueios:
+            flash(mensagem_bloqueio(f'o funcionário {funcionario.nome}', bloqueios), 'danger')
             return redirect(url_for('listar_funcionarios'))
-        if ReajusteSalarial.query.filter_by(cpf_funcionario=cpf).first():
-            flash(f'Não foi possível deletar o funcionário {funcionario.nome}. Ele possui reajustes salariais. Por favor, remova-os primeiro.', 'danger')
-            return redirect(url_for('listar_funcionarios'))
-        if ControleFerias.query.filter_by(cpf_funcionario=cpf).first():
-            flash(f'Não foi possível deletar o funcionário {funcionario.nome}. Ele possui registros de férias. Por favor, remova-os primeiro.', 'danger')
-            return redirect(url_for('listar_funcionarios'))
-        if BancoHoras.query.filter_by(cpf_funcionario=cpf).first():
-            flash(f'Não foi possível deletar o funcionário {funcionario.nome}. Ele possui registros de banco de horas. Por favor, remova-os primeiro.', 'danger')
-            return redirect(url_for('listar_funcionarios'))
-        if HorasExtras.query.filter_by(cpf_funcionario=cpf).first():
-            flash(f'Não foi possível deletar o funcionário {funcionario.nome}. Ele possui registros de horas extras. Por favor, remova-os primeiro.', 'danger')
-            return redirect(url_for('listar_funcionarios'))
-        if RegistroPonto.query.filter_by(cpf_funcionario=cpf).first():
-            flash(f'Não foi possível deletar o funcionário {funcionario.nome}. Ele possui registros de ponto. Por favor, remova-os primeiro.', 'danger')
-            return redirect(url_for('listar_funcionarios'))
-        
+
         dados_antigos = {
             'cpf': funcionario.cpf, 'nome': funcionario.nome,
             'data_nascimento': str(funcionario.data_nascimento), 'sexo': funcionario.sexo, 'pis': funcionario.pis,
@@ -486,11 +625,12 @@ def create_app():
             'codigo_agencia': funcionario.codigo_agencia, 'numero_conta': funcionario.numero_conta,
             'variacao_conta': funcionario.variacao_conta, 'chave_pix': funcionario.chave_pix,
             'observacao': funcionario.observacao,
-            'foto_base64': funcionario.foto_base64
+            'foto_hash': funcionario.foto_hash
         }
 
         db.session.delete(funcionario)
         db.session.commit()
+        invalidar_identificadores(cpf)
         log_entry = LogAuditoria(usuario_id=session['usuario_id'], acao=f"Funcionário {funcionario.nome} ({cpf}) deletado.", tabela_afetada="funcionarios", registro_id=cpf, dados_antigos=dados_antigos, dados_novos=None)
         db.session.add(log_entry)
         db.session.commit()
@@ -621,23 +761,14 @@ def create_app():
 # --- API para buscar funcionário por CPF, PIS ou IDFace ---
     @app.route('/api/buscar_funcionario_identificador/<string:identifier>', methods=['GET'])
     def api_buscar_funcionario_identificador(identifier):
-        ident_clean = identifier.replace('.', '').replace('-', '').strip()
-        funcionario = Funcionario.query.filter(
-            or_(
-                Funcionario.cpf == ident_clean,
-                Funcionario.cpf == identifier,
-                Funcionario.pis == ident_clean,
-                Funcionario.pis == identifier,
-                Funcionario.id_face == ident_clean,
-                Funcionario.id_face == identifier,
-            )
-        ).first()
-        if funcionario:
+        encontrado = resolver_identificador(identifier)
+        if encontrado:
+            cpf, pis, id_face = encontrado
             return jsonify({
-                'nome': funcionario.nome,
-                'cpf': funcionario.cpf,
-                'pis': funcionario.pis,
-                'id_face': funcionario.id_face,
+                'nome': db.session.query(Funcionario.nome).filter_by(cpf=cpf).scalar(),
+                'cpf': cpf,
+                'pis': pis,
+                'id_face': id_face,
             })
         else:
             return jsonify({'nome': None}), 404
@@ -656,18 +787,14 @@ def create_app():
                 'message': 'Funcionário não encontrado.'
             }), 404
 
-        # Busca o contrato mais recente (pela data de admissão) e que esteja ativo
-        contrato_ativo = ContratoTrabalho.query.filter_by(
-            cpf_funcionario=cpf,
-            status=True
-        ).order_by(ContratoTrabalho.data_admissao.desc()).first()
+        contrato = contrato_ativo(cpf)
 
-        if contrato_ativo:
+        if contrato:
             return jsonify({
                 'nome': funcionario.nome,
-                'cargo': contrato_ativo.funcao,
-                'setor': contrato_ativo.setor,
-                'data_admissao': contrato_ativo.data_admissao.strftime('%Y-%m-%d')
+                'cargo': contrato.funcao.nome,
+                'setor': contrato.setor.nome,
+                'data_admissao': contrato.data_admissao.strftime('%Y-%m-%d')
             })
         else:
             return jsonify({
@@ -681,14 +808,10 @@ def create_app():
     # --- API para buscar salário base do contrato ativo ---
     @app.route('/api/salario_base/<string:cpf>', methods=['GET'])
     def api_salario_base(cpf):
-        contrato = (
-            ContratoTrabalho.query
-            .filter_by(cpf_funcionario=cpf, status=True)
-            .order_by(ContratoTrabalho.data_admissao.desc())
-            .first()
-        )
+        contrato = contrato_ativo(cpf)
         if contrato:
-            return jsonify({'salario_base': float(contrato.salario_inicial)})
+            vigente = salario_vigente(cpf, datetime.date.today())
+            return jsonify({'salario_base': float(vigente[0] if vigente else contrato.salario_inicial)})
         return jsonify({'salario_base': None}), 404
 
     # --- API para buscar cidades por estado ---
@@ -824,9 +947,10 @@ def create_app():
         
         cidade = Cidade.query.get_or_404(cidibge)
 
-        if Funcionario.query.filter_by(cidade=cidade.nome_cidade, estado=cidade.estado_uf).first():
-             flash(f'Não foi possível deletar a cidade {cidade.nome_cidade} ({cidade.estado_uf}). Existem funcionários cadastrados nela. Remova os funcionários primeiro.', 'danger')
-             return redirect(url_for('listar_cidades'))
+        bloqueios = verificar_dependencias(cidade)
+        if bloqueios:
+            flash(mensagem_bloqueio(f'a cidade {cidade.nome_cidade} ({cidade.estado_uf})', bloqueios), 'danger')
+            return redirect(url_for('listar_cidades'))
 
         try:
             db.session.delete(cidade)
@@ -868,8 +992,8 @@ def create_app():
 
         if request.method == 'POST':
             cpf_funcionario = request.form['cpf_funcionario'].replace('.', '').replace('-', '')
-            setor_nome = request.form['setor'] # Pega o nome do setor do formulário
-            funcao_nome = request.form['funcao'] # Pega o nome da função do formulário
+            setor_id = int(request.form['setor_id'])
+            funcao_id = int(request.form['funcao_id'])
             salario_inicial = float(request.form['salario_inicial'])
             bonus = float(request.form['bonus']) if request.form['bonus'] else 0.00
             regime_contratacao = request.form['regime_contratacao']
@@ -885,13 +1009,13 @@ def create_app():
                 return render_template('contrato_form.html', contrato=None, setores=setores, funcoes=funcoes, jornadas=jornadas)
             
             # Validação: Um funcionário pode ter apenas um contrato ATIVO
-            if ContratoTrabalho.query.filter_by(cpf_funcionario=cpf_funcionario, status=True).first():
+            if contrato_ativo(cpf_funcionario):
                 flash('Este funcionário já possui um contrato ATIVO. Por favor, inative o contrato anterior antes de criar um novo.', 'danger')
                 return render_template('contrato_form.html', contrato=None, setores=setores, funcoes=funcoes, jornadas=jornadas)
 
 
             novo_contrato = ContratoTrabalho(
-                cpf_funcionario=cpf_funcionario, setor=setor_nome, funcao=funcao_nome, # Usando o nome direto
+                cpf_funcionario=cpf_funcionario, setor_id=setor_id, funcao_id=funcao_id,
                 jornada_id=jornada_id,
                 salario_inicial=salario_inicial, bonus=bonus,
                 regime_contratacao=regime_contratacao, data_admissao=data_admissao,
@@ -899,7 +1023,9 @@ def create_app():
             )
             db.session.add(novo_contrato)
             try:
+                atualizar_historico_salarial([cpf_funcionario])
                 db.session.commit()
+                invalidar_quadro_pessoal(data_admissao, cpfs=[cpf_funcionario])
                 if status:
                     funcionario.status = "Ativo"
                     db.session.add(funcionario)
@@ -916,6 +1042,14 @@ def create_app():
                 db.session.commit()
 
                 return redirect(url_for('listar_contratos'))
+            except IntegrityError as e:
+                # Outro contrato ativo gravado entre a validação e o commit
+                db.session.rollback()
+                if INDICE_CONTRATO_ATIVO not in str(e.orig):
+                    flash(f'Erro ao adicionar contrato: {e}', 'danger')
+                else:
+                    flash('Este funcionário já possui um contrato ATIVO.', 'danger')
+                return render_template('contrato_form.html', contrato=None, setores=setores, funcoes=funcoes, jornadas=jornadas)
             except Exception as e:
                 db.session.rollback()
                 print(f"Erro ao adicionar contrato: {e}") # Print para depuração
@@ -942,8 +1076,8 @@ def create_app():
 
         if request.method == 'POST':
             cpf_funcionario = request.form['cpf_funcionario'].replace('.', '').replace('-', '')
-            setor_nome = request.form['setor'] # Pega o nome do setor do formulário
-            funcao_nome = request.form['funcao'] # Pega o nome da função do formulário
+            setor_id = int(request.form['setor_id'])
+            funcao_id = int(request.form['funcao_id'])
             salario_inicial = float(request.form['salario_inicial'])
             bonus = float(request.form['bonus']) if request.form['bonus'] else 0.00
             regime_contratacao = request.form['regime_contratacao']
@@ -966,17 +1100,18 @@ def create_app():
 
             # Guarda dados antigos para log
             dados_antigos = {
-                'cpf_funcionario': contrato.cpf_funcionario, 'setor': contrato.setor,
-                'funcao': contrato.funcao, 'salario_inicial': float(contrato.salario_inicial),
+                'cpf_funcionario': contrato.cpf_funcionario, 'setor': contrato.setor.nome,
+                'funcao': contrato.funcao.nome, 'salario_inicial': float(contrato.salario_inicial),
                 'bonus': float(contrato.bonus), 'regime_contratacao': contrato.regime_contratacao,
                 'data_admissao': str(contrato.data_admissao), 'data_demissao': str(contrato.data_demissao) if contrato.data_demissao else None,
                 'status': contrato.status,
                 'jornada_id': contrato.jornada_id
             }
 
+            admissao_anterior = contrato.data_admissao
             contrato.cpf_funcionario = cpf_funcionario
-            contrato.setor = setor_nome # Usando o nome
-            contrato.funcao = funcao_nome # Usando o nome
+            contrato.setor_id = setor_id
+            contrato.funcao_id = funcao_id
             contrato.salario_inicial = salario_inicial
             contrato.bonus = bonus
             contrato.regime_contratacao = regime_contratacao
@@ -986,13 +1121,17 @@ def create_app():
             contrato.status = status
 
             try:
+                atualizar_historico_salarial([dados_antigos['cpf_funcionario'], cpf_funcionario])
                 db.session.commit()
+                invalidar_quadro_pessoal(
+                    admissao_anterior, data_admissao, cpfs=[dados_antigos['cpf_funcionario'], cpf_funcionario]
+                )
                 flash('Contrato atualizado com sucesso!', 'success')
 
                 # Guarda dados novos para log
                 dados_novos = {
-                    'cpf_funcionario': contrato.cpf_funcionario, 'setor': contrato.setor,
-                    'funcao': contrato.funcao, 'salario_inicial': float(contrato.salario_inicial),
+                    'cpf_funcionario': contrato.cpf_funcionario, 'setor': contrato.setor.nome,
+                    'funcao': contrato.funcao.nome, 'salario_inicial': float(contrato.salario_inicial),
                     'bonus': float(contrato.bonus), 'regime_contratacao': contrato.regime_contratacao,
                     'data_admissao': str(contrato.data_admissao), 'data_demissao': str(contrato.data_demissao) if contrato.data_demissao else None,
                     'status': contrato.status,
@@ -1011,6 +1150,14 @@ def create_app():
                 db.session.commit()
 
                 return redirect(url_for('listar_contratos'))
+            except IntegrityError as e:
+                # Outro contrato ativo gravado entre a validação e o commit
+                db.session.rollback()
+                if INDICE_CONTRATO_ATIVO not in str(e.orig):
+                    flash(f'Erro ao atualizar contrato: {e}', 'danger')
+                else:
+                    flash('Este funcionário já possui um contrato ATIVO.', 'danger')
+                return render_template('contrato_form.html', contrato=contrato, setores=setores, funcoes=funcoes, jornadas=jornadas)
             except Exception as e:
                 db.session.rollback()
                 print(f"Erro ao atualizar contrato: {e}") # Print para depuração
@@ -1033,7 +1180,7 @@ def create_app():
         # Guarda dados antigos para log
         dados_antigos = {
             'id': contrato.id, 'cpf_funcionario': contrato.cpf_funcionario,
-            'setor': contrato.setor, 'funcao': contrato.funcao,
+            'setor': contrato.setor.nome, 'funcao': contrato.funcao.nome,
             'salario_inicial': float(contrato.salario_inicial), 'bonus': float(contrato.bonus),
             'regime_contratacao': contrato.regime_contratacao,
             'data_admissao': str(contrato.data_admissao), 'data_demissao': str(contrato.data_demissao) if contrato.data_demissao else None,
@@ -1043,7 +1190,9 @@ def create_app():
         
         db.session.delete(contrato)
         try:
+            atualizar_historico_salarial([contrato.cpf_funcionario])
             db.session.commit()
+            invalidar_quadro_pessoal(contrato.data_admissao, cpfs=[contrato.cpf_funcionario])
             flash('Contrato deletado com sucesso!', 'success')
 
             log_entry = LogAuditoria(
@@ -1118,11 +1267,11 @@ def create_app():
             novo_nome = request.form['nome'].strip()
             if not novo_nome:
                 flash('O nome do setor não pode ser vazio.', 'danger')
-                return render_template('funcao_form.html', funcao=funcao)
+                return render_template('setor_form.html', setor=setor)
             
-            if Funcao.query.filter(Funcao.nome == novo_nome, Funcao.id != id).first():
-                flash(f'A função "{novo_nome}" já existe.', 'danger')
-                return render_template('funcao_form.html', funcao=funcao)
+            if Setor.query.filter(Setor.nome == novo_nome, Setor.id != id).first():
+                flash(f'O setor "{novo_nome}" já existe.', 'danger')
+                return render_template('setor_form.html', setor=setor)
             
             dados_antigos = {'nome': setor.nome}
             setor.nome = novo_nome
@@ -1151,9 +1300,10 @@ def create_app():
         setor = Setor.query.get_or_404(id)
 
         # Verificação de hierarquia: não permitir deletar setor se há contratos associados
-        if ContratoTrabalho.query.filter_by(funcao=funcao.nome).first():
-            flash(f'Não foi possível deletar a função "{funcao.nome}". Existem contratos de trabalho associados a ela. Remova ou atualize os contratos primeiro.', 'danger')
-            return redirect(url_for('listar_funcoes'))
+        bloqueios = verificar_dependencias(setor)
+        if bloqueios:
+            flash(mensagem_bloqueio(f'o setor "{setor.nome}"', bloqueios), 'danger')
+            return redirect(url_for('listar_setores'))
 
         dados_antigos = {'id': setor.id, 'nome': setor.nome}
         try:
@@ -1163,12 +1313,12 @@ def create_app():
             log_entry = LogAuditoria(usuario_id=session['usuario_id'], acao=f"Setor '{setor.nome}' ID {id} deletado.", tabela_afetada="setores", registro_id=id, dados_antigos=dados_antigos, dados_novos=None)
             db.session.add(log_entry)
             db.session.commit()
-            return redirect(url_for('listar_funcoes'))
+            return redirect(url_for('listar_setores'))
         except Exception as e:
             db.session.rollback()
-            print(f"Erro ao deletar função: {e}") # Print para depuração
-            flash(f'Erro ao deletar função: {e}', 'danger')
-            return redirect(url_for('listar_funcoes'))
+            print(f"Erro ao deletar setor: {e}") # Print para depuração
+            flash(f'Erro ao deletar setor: {e}', 'danger')
+            return redirect(url_for('listar_setores'))
 
 
     # --- Módulo: Cadastro de Funções ---
@@ -1257,9 +1407,10 @@ def create_app():
         
         funcao = Funcao.query.get_or_404(id)
 
-        # Verificação de hierarquia: não permitir deletar função se há contratos associados
-        if ContratoTrabalho.query.filter_by(funcao=funcao.nome).first():
-            flash(f'Não foi possível deletar a função "{funcao.nome}". Existem contratos de trabalho associados a ela. Remova ou atualize os contratos primeiro.', 'danger')
+        # Verificação de hierarquia: não permitir deletar função se há contratos ou exames associados
+        bloqueios = verificar_dependencias(funcao)
+        if bloqueios:
+            flash(mensagem_bloqueio(f'a função "{funcao.nome}"', bloqueios), 'danger')
             return redirect(url_for('listar_funcoes'))
 
         dados_antigos = {'id': funcao.id, 'nome': funcao.nome}
@@ -1387,6 +1538,11 @@ def create_app():
 
         jornada = Jornada.query.get_or_404(id)
 
+        bloqueios = verificar_dependencias(jornada)
+        if bloqueios:
+            flash(mensagem_bloqueio(f'a jornada {jornada.id}', bloqueios), 'danger')
+            return redirect(url_for('listar_jornadas'))
+
         dados_antigos = {
             'id': jornada.id,
             'primeiro_turno_inicio': str(jornada.primeiro_turno_inicio),
@@ -1460,6 +1616,7 @@ def create_app():
             )
             db.session.add(novo_reajuste)
             try:
+                atualizar_historico_salarial([cpf_funcionario])
                 db.session.commit()
                 flash('Reajuste salarial adicionado com sucesso!', 'success')
                 
@@ -1516,6 +1673,7 @@ def create_app():
             reajuste.percentual_reajuste_bonus = percentual_reajuste_bonus
 
             try:
+                atualizar_historico_salarial([dados_antigos['cpf_funcionario'], cpf_funcionario])
                 db.session.commit()
                 flash('Reajuste salarial atualizado com sucesso!', 'success')
                 
@@ -1566,6 +1724,7 @@ def create_app():
         
         db.session.delete(reajuste)
         try:
+            atualizar_historico_salarial([reajuste.cpf_funcionario])
             db.session.commit()
             flash('Reajuste salarial deletado com sucesso!', 'success')
 
@@ -1587,6 +1746,52 @@ def create_app():
             flash(f'Erro ao deletar reajuste: {e}', 'danger')
             return redirect(url_for('listar_reajustes'))
 
+    @app.route('/reajustes/dissidio', methods=['GET', 'POST'])
+    def dissidio_coletivo():
+        """
+        Aplica o mesmo reajuste a todos os contratos ativos (ou aos de um setor,
+        função ou regime), com prévia dos novos salários antes de gravar.
+        """
+        if 'usuario_id' not in session or session['tipo_usuario'] not in ['Master']:
+            flash('Acesso negado. Apenas usuários Master podem aplicar dissídios.', 'danger')
+            return redirect(url_for('login'))
+
+        setores = Setor.query.order_by(Setor.nome).all()
+        funcoes = Funcao.query.order_by(Funcao.nome).all()
+        contexto = dict(setores=setores, funcoes=funcoes, regimes=REGIMES_CONTRATACAO, form=request.form, previa=None)
+        if request.method == 'POST':
+            try:
+                data_alteracao = datetime.datetime.strptime(request.form['data_alteracao'], '%Y-%m-%d').date()
+                percentual_salario = Decimal(request.form['percentual_reajuste_salario'].replace(',', '.'))
+                percentual_bonus = Decimal(request.form['percentual_reajuste_bonus'].replace(',', '.'))
+                filtros = {
+                    'setor_id': int(request.form['setor_id']) if request.form.get('setor_id') else None,
+                    'funcao_id': int(request.form['funcao_id']) if request.form.get('funcao_id') else None,
+                    'regime_contratacao': request.form.get('regime_contratacao') or None,
+                }
+            except (KeyError, ValueError, InvalidOperation):
+                flash('Informe a data e os percentuais do dissídio.', 'danger')
+                return render_template('dissidio_form.html', **contexto)
+
+            if request.form.get('acao') != 'aplicar':
+                contexto['previa'] = previa_dissidio(data_alteracao, percentual_salario, percentual_bonus, **filtros)
+                return render_template('dissidio_form.html', **contexto)
+
+            try:
+                quantidade = aplicar_dissidio(data_alteracao, percentual_salario, percentual_bonus, session['usuario_id'], **filtros)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Erro ao aplicar dissídio: {e}") # Print para depuração
+                flash(f'Erro ao aplicar dissídio: {e}', 'danger')
+                return render_template('dissidio_form.html', **contexto)
+            if quantidade:
+                flash(f'Dissídio aplicado a {quantidade} funcionário(s)!', 'success')
+            else:
+                flash('Nenhum contrato ativo atendido pelo dissídio (ou todos já reajustados nessa data).', 'warning')
+            return redirect(url_for('listar_reajustes'))
+
+        return render_template('dissidio_form.html', **contexto)
+
     # --- Módulo: Demissões ---
     
     def calcular_dias_aviso(data_admissao, data_demissao):
@@ -1649,14 +1854,14 @@ def create_app():
 
             # Validações adicionais (ex: data de demissão não pode ser antes da admissão)
             # Você pode adicionar validações mais complexas aqui.
-            contrato_ativo = ContratoTrabalho.query.filter_by(cpf_funcionario=cpf_funcionario, status=True).first()
-            if contrato_ativo and data_demissao < contrato_ativo.data_admissao:
+            contrato = contrato_ativo(cpf_funcionario)
+            if contrato and data_demissao < contrato.data_admissao:
                 flash('A data de demissão não pode ser anterior à data de admissão.', 'danger')
                 return render_template('demissao_form.html', demissao=None)
 
-            if contrato_ativo:
+            if contrato:
                 if quantidade_dias_aviso is None:
-                    quantidade_dias_aviso = calcular_dias_aviso(contrato_ativo.data_admissao, data_demissao)
+                    quantidade_dias_aviso = calcular_dias_aviso(contrato.data_admissao, data_demissao)
                 if data_aviso_previo is None and quantidade_dias_aviso is not None:
                     data_aviso_previo = data_demissao - datetime.timedelta(days=quantidade_dias_aviso)
                 if data_termino_aviso is None and quantidade_dias_aviso is not None:
@@ -1680,11 +1885,13 @@ def create_app():
                 db.session.commit()
 
                 # Opcional: Atualizar o status do contrato para inativo
-                if contrato_ativo:
-                    contrato_ativo.status = False
-                    contrato_ativo.data_demissao = data_demissao # Atualiza a data de demissão no contrato
-                    db.session.add(contrato_ativo) # Adiciona a mudança na sessão
+                if contrato:
+                    contrato.status = False
+                    contrato.data_demissao = data_demissao # Atualiza a data de demissão no contrato
+                    db.session.add(contrato) # Adiciona a mudança na sessão
+                    atualizar_historico_salarial([cpf_funcionario])
                     db.session.commit() # Salva a mudança no contrato
+                    invalidar_quadro_pessoal(contrato.data_admissao)
 
                 funcionario.status = "Inativo"
                 db.session.add(funcionario)
@@ -1799,7 +2006,9 @@ def create_app():
                         contrato_ativo_ou_recente.status = False
                         contrato_ativo_ou_recente.data_demissao = demissao.data_demissao
                         db.session.add(contrato_ativo_ou_recente)
+                        atualizar_historico_salarial([cpf_funcionario])
                         db.session.commit()
+                        invalidar_quadro_pessoal(contrato_ativo_ou_recente.data_admissao)
 
                 flash('Registro de demissão atualizado com sucesso!', 'success')
 
@@ -2112,19 +2321,16 @@ def create_app():
             data_adiantamento = datetime.datetime.strptime(request.form['data_adiantamento'], '%Y-%m-%d').date()
             observacoes = request.form.get('observacoes')
 
-            contrato = (
-                ContratoTrabalho.query
-                .filter_by(cpf_funcionario=cpf_funcionario, status=True)
-                .order_by(ContratoTrabalho.data_admissao.desc())
-                .first()
-            )
+            contrato = contrato_ativo(cpf_funcionario)
             if not contrato:
                 flash('Funcionário sem contrato ativo.', 'danger')
                 return render_template('adiantamento_form.html', adiantamento=None)
 
+            # Salário com os reajustes vigentes na data do adiantamento
+            vigente = salario_vigente(cpf_funcionario, data_adiantamento)
             novo = Adiantamento(
                 cpf_funcionario=cpf_funcionario,
-                salario_base=contrato.salario_inicial,
+                salario_base=vigente[0] if vigente else contrato.salario_inicial,
                 valor_total=valor_total,
                 numero_parcelas=numero_parcelas,
                 data_adiantamento=data_adiantamento,
@@ -2197,16 +2403,20 @@ def create_app():
             flash('Acesso negado. Apenas usuários Master podem gerar relatórios.', 'danger')
             return redirect(url_for('login'))
 
-        funcionario = Funcionario.query.get_or_404(cpf)
-        
+        # Funcionário com contratos, dependentes e reajustes já carregados (ver perfil_funcionario.py)
+        perfil = carregar_perfil(cpf)
+        if perfil is None:
+            abort(404)
+        funcionario, _ = perfil
+
         # Obter o contrato mais recente (pode ser ativo ou inativo)
-        contrato = ContratoTrabalho.query.filter_by(cpf_funcionario=cpf).order_by(ContratoTrabalho.data_admissao.desc()).first()
-        
+        contrato = contrato_mais_recente(funcionario)
+
         # Obter dependentes
-        dependentes = Dependente.query.filter_by(cpf_funcionario=cpf).all()
+        dependentes = funcionario.dependentes
 
         # Obter reajustes salariais
-        reajustes = ReajusteSalarial.query.filter_by(cpf_funcionario=cpf).order_by(ReajusteSalarial.data_alteracao.asc()).all()
+        reajustes = sorted(funcionario.reajustes, key=lambda reajuste: reajuste.data_alteracao)
 
         buffer = BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=A4,
@@ -2251,19 +2461,11 @@ def create_app():
         story.append(Paragraph("FICHA CADASTRAL DO FUNCIONÁRIO", style_title))
         story.append(Spacer(1, 0.2 * inch))
 
-        # Foto do Funcionário (se houver)
-        if funcionario.foto_base64:
+        # Foto do Funcionário (se houver): versão média, suficiente para 1,5" a 300 dpi
+        _, foto_dados = carregar_foto(funcionario.cpf, escolher_tamanho(450))
+        if foto_dados:
             try:
-                # Verifica se a string Base64 contém o prefixo antes de dividi-la
-                if funcionario.foto_base64.startswith('data:image'):
-                    img_data_base64 = funcionario.foto_base64.split(',', 1)[1]
-                else:
-                    img_data_base64 = funcionario.foto_base64
-                
-                # Aumenta o try-except para a decodificação e criação da imagem
-                img_data = BytesIO(base64.b64decode(img_data_base64))
-                img = Image(img_data)
-                img._restrictSize(1.5 * inch, 1.5 * inch) # Ajusta o tamanho da imagem
+                img = Image(BytesIO(foto_dados), width=1.5 * inch, height=1.5 * inch, kind='proportional')
                 img.hAlign = 'CENTER'
                 story.append(img)
                 story.append(Spacer(1, 0.1 * inch))
@@ -2319,8 +2521,8 @@ def create_app():
         
         if contrato:
             dados_contrato = [
-                [Paragraph("Setor", style_small_bold), Paragraph(contrato.setor, style_small)],
-                [Paragraph("Função", style_small_bold), Paragraph(contrato.funcao, style_small)],
+                [Paragraph("Setor", style_small_bold), Paragraph(contrato.setor.nome, style_small)],
+                [Paragraph("Função", style_small_bold), Paragraph(contrato.funcao.nome, style_small)],
                 [Paragraph("Salário Inicial", style_small_bold), Paragraph(f"R$ {contrato.salario_inicial:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."), style_small)],
                 [Paragraph("Bônus", style_small_bold), Paragraph(f"R$ {contrato.bonus:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."), style_small)],
                 [Paragraph("Regime de Contratação", style_small_bold), Paragraph(contrato.regime_contratacao, style_small)],
@@ -2328,6 +2530,13 @@ def create_app():
                 [Paragraph("Data de Demissão", style_small_bold), Paragraph(contrato.data_demissao.strftime('%d/%m/%Y') if contrato.data_demissao else 'N/A', style_small)],
                 [Paragraph("Status Contrato", style_small_bold), Paragraph('Ativo' if contrato.status else 'Inativo', style_small)],
             ]
+            # Valores vigentes hoje, com os reajustes salariais aplicados
+            vigente = salario_vigente(cpf, datetime.date.today()) if contrato.status else None
+            if vigente:
+                dados_contrato[4:4] = [
+                    [Paragraph("Salário Atual", style_small_bold), Paragraph(f"R$ {vigente[0]:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."), style_small)],
+                    [Paragraph("Bônus Atual", style_small_bold), Paragraph(f"R$ {vigente[1]:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."), style_small)],
+                ]
             tabela_contrato = Table([[Paragraph('INFORMAÇÕES DE CONTRATO (Último Contrato)', style_heading2), '']] + dados_contrato, colWidths=[2.2*inch, 3.8*inch])
             tabela_contrato.setStyle(table_style)
             story.append(tabela_contrato)
@@ -2410,16 +2619,68 @@ def create_app():
             next_month = (start_date + datetime.timedelta(days=32)).replace(day=1)
             end_date = next_month - datetime.timedelta(days=1)
 
-        query = db.session.query(RegistroPonto).outerjoin(Funcionario)
+        filtros = {
+            'funcionario': request.args.get('funcionario', '').strip(),
+            'identificador': request.args.get('identificador', '').strip(),
+            'tipo_lancamento': request.args.get('tipo_lancamento', '').strip(),
+        }
+
+        query = db.session.query(RegistroPonto)
         query = query.filter(RegistroPonto.data_hora >= datetime.datetime.combine(start_date, datetime.time.min))
         query = query.filter(RegistroPonto.data_hora <= datetime.datetime.combine(end_date, datetime.time.max))
-        registros = query.order_by(RegistroPonto.data_hora.desc()).all()
+        if filtros['funcionario']:
+            nomes = db.session.query(Funcionario.cpf).filter(
+                Funcionario.nome.ilike(f"%{escapar_like(filtros['funcionario'])}%", escape='\\')
+            )
+            query = query.filter(RegistroPonto.cpf_funcionario.in_(nomes))
+        if filtros['identificador']:
+            # Prefixo de CPF ou PIS, com ou sem pontuação
+            digitos = ''.join(filter(str.isdigit, filtros['identificador']))
+            condicoes = [RegistroPonto.pis.like(f"{escapar_like(filtros['identificador'])}%", escape='\\')]
+            if digitos:
+                condicoes += [RegistroPonto.cpf_funcionario.like(f"{digitos}%"), RegistroPonto.pis.like(f"{digitos}%")]
+            query = query.filter(or_(*condicoes))
+        if filtros['tipo_lancamento']:
+            query = query.filter(RegistroPonto.tipo_lancamento == filtros['tipo_lancamento'])
+
+        # Paginação por chave (data_hora, id): a página seguinte começa após o
+        # último registro exibido, sem OFFSET, usando o índice de registro_ponto.
+        # O total do período é contado apenas na primeira página.
+        por_pagina = 100
+        apos = request.args.get('apos', '')
+        if apos:
+            try:
+                apos_data_hora, apos_id = apos.rsplit('_', 1)
+                chave_apos = (datetime.datetime.fromisoformat(apos_data_hora), int(apos_id))
+            except ValueError:
+                flash('Página inválida; exibindo a primeira página.', 'warning')
+                apos = ''
+        total = None
+        if apos:
+            query = query.filter(tuple_(RegistroPonto.data_hora, RegistroPonto.id) < chave_apos)
+        else:
+            total = query.with_entities(func.count(RegistroPonto.id)).scalar()
+
+        registros = (
+            query.options(joinedload(RegistroPonto.funcionario).load_only(Funcionario.cpf, Funcionario.nome))
+            .order_by(RegistroPonto.data_hora.desc(), RegistroPonto.id.desc())
+            .limit(por_pagina + 1)
+            .all()
+        )
+        proxima = None
+        if len(registros) > por_pagina:
+            registros = registros[:por_pagina]
+            proxima = f"{registros[-1].data_hora.isoformat()}_{registros[-1].id}"
 
         return render_template(
             'registro_ponto.html',
             registros_ponto=registros,
             start_date=start_date.strftime('%Y-%m-%d'),
-            end_date=end_date.strftime('%Y-%m-%d')
+            end_date=end_date.strftime('%Y-%m-%d'),
+            filtros=filtros,
+            total=total,
+            primeira_pagina=not apos,
+            proxima=proxima
         )
 
     @app.route('/registros_ponto/importar', methods=['GET', 'POST'])
@@ -2429,73 +2690,164 @@ def create_app():
             return redirect(url_for('login'))
 
         if request.method == 'POST':
-            arquivo = request.files.get('arquivo_afd')
-            if not arquivo or arquivo.filename == '':
+            arquivos = [a for a in request.files.getlist('arquivo_afd') if a and a.filename]
+            if not arquivos:
                 flash('Nenhum arquivo selecionado.', 'danger')
                 return redirect(request.url)
 
-            linhas = arquivo.read().decode('latin-1').splitlines()
-            inseridos = 0
-            
-            for linha in linhas:
-                linha = linha.strip()
-                if len(linha) < 34:
-                    continue
-
-                tipo = linha[9]
-                if tipo not in ('3', '7'):
-                    continue
+            # Cada arquivo é salvo em disco e importado em segundo plano; a
+            # requisição retorna imediatamente e a página acompanha o progresso.
+            # Um ZIP com os AFDs de vários relógios é importado em uma única tarefa.
+            for arquivo in arquivos:
+                nome_seguro = secure_filename(arquivo.filename) or 'arquivo.afd'
+                caminho = os.path.join(app.config['UPLOAD_FOLDER'], f"afd_{uuid.uuid4().hex}_{nome_seguro}")
+                arquivo.save(caminho)
 
-                # AFD: DDMMYYYYHHMM a partir da posição 10
-                data_str = linha[10:22]
-                pis_campo = linha[22:34].strip()
-                # Alguns relógios registram o CPF no campo PIS com zeros
-                # à esquerda. Removemos esses zeros para comparar com o CPF
-                # salvo no banco, mas mantemos o valor original para salvar
-                # no registro de ponto.
-                cpf_possivel = pis_campo.lstrip('0')
-                # Alguns relógios inserem um zero extra no início do CPF para
-                # preencher 12 dígitos no campo PIS. Para garantir a busca,
-                # também consideramos os 11 últimos dígitos (CPF completo)
-                cpf_completo = pis_campo[-11:]
+                tarefa = TarefaImportacao(nome_arquivo=arquivo.filename[:255], usuario_id=session['usuario_id'])
+                db.session.add(tarefa)
+                db.session.commit()
+                if zipfile.is_zipfile(caminho):
+                    submeter_importacao_zip(app, tarefa.id, caminho)
+                else:
+                    submeter_importacao(app, tarefa.id, caminho)
+
+            flash(f'{len(arquivos)} arquivo(s) enviado(s) para importação. Acompanhe o andamento abaixo.', 'success')
+            return redirect(url_for('importar_registros_ponto'))
+
+        tarefas = TarefaImportacao.query.order_by(TarefaImportacao.id.desc()).limit(20).all()
+        return render_template('importar_registro_ponto.html', tarefas=tarefas)
+
+    # --- API para acompanhar uma importação de AFD em segundo plano ---
+    @app.route('/api/importacoes_ponto/<int:id>', methods=['GET'])
+    def api_status_importacao(id):
+        tarefa = TarefaImportacao.query.get_or_404(id)
+        return jsonify({
+            'id': tarefa.id,
+            'nome_arquivo': tarefa.nome_arquivo,
+            'status': tarefa.status,
+            'marcacoes': tarefa.marcacoes,
+            'inseridos': tarefa.inseridos,
+            'duplicados': tarefa.duplicados,
+            'sem_funcionario': tarefa.sem_funcionario,
+            'arquivos': tarefa.arquivos or [],
+            'erro': tarefa.erro,
+            'data_inicio': tarefa.data_inicio.strftime('%Y-%m-%d %H:%M:%S') if tarefa.data_inicio else None,
+            'data_fim': tarefa.data_fim.strftime('%Y-%m-%d %H:%M:%S') if tarefa.data_fim else None,
+        })
+
+    # --- API de marcações em lote (relógios e integrações) ---
+    @app.route('/api/registros_ponto/lote', methods=['POST'])
+    def api_registrar_marcacoes_lote():
+        # Aceita usuário logado ou o token de integração configurado
+        token = app.config.get('API_TOKEN_PONTO')
+        autorizacao = request.headers.get('Authorization', '')
+        token_valido = bool(token) and autorizacao.startswith('Bearer ') and hmac.compare_digest(
+            autorizacao[len('Bearer '):].encode(), token.encode()
+        )
+        if 'usuario_id' not in session and not token_valido:
+            return jsonify({'error': 'Não autorizado.'}), 401
 
-                try:
-                    data_hora = datetime.datetime.strptime(data_str, '%d%m%Y%H%M')
-                except ValueError:
-                    continue
+        dados = request.get_json(silent=True)
+        itens = dados.get('marcacoes') if isinstance(dados, dict) else dados
+        if not isinstance(itens, list):
+            return jsonify({'error': 'Envie uma lista de marcações (ou {"marcacoes": [...]}).'}), 400
+        if len(itens) > app.config.get('API_PONTO_MAXIMO_LOTE', 5000):
+            return jsonify({'error': f"Máximo de {app.config.get('API_PONTO_MAXIMO_LOTE', 5000)} marcações por requisição."}), 413
 
-                # Busca funcionário utilizando o PIS informado no arquivo.
-                # Caso não encontre, tenta localizar usando o CPF, pois muitos
-                # registros antigos usam o CPF no campo destinado ao PIS.
-                funcionario = Funcionario.query.filter(
-                    or_(
-                        Funcionario.pis == pis_campo,
-                        Funcionario.cpf == cpf_possivel,
-                        Funcionario.cpf == cpf_completo,
-                    )
-                ).first()
-                if not funcionario:
-                    # pulamos registros sem funcionário correspondente
-                    continue
+        try:
+            resultados = registrar_marcacoes_api(itens)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"ERROR: Erro ao registrar marcações em lote: {e}")
+            return jsonify({'error': f'Erro ao registrar marcações: {e}'}), 500
+
+        return jsonify({
+            'inseridos': sum(1 for r in resultados if r['status'] == 'inserido'),
+            'duplicados': sum(1 for r in resultados if r['status'] == 'duplicado'),
+            'erros': sum(1 for r in resultados if r['status'] == 'erro'),
+            'resultados': resultados,
+        })
+
+    # --- API do quadro de pessoal (contratos vigentes por mês, setor e função) ---
+    @app.route('/api/quadro_pessoal', methods=['GET'])
+    def api_quadro_pessoal():
+        if 'usuario_id' not in session:
+            return jsonify({'error': 'Login necessário.'}), 401
 
-                if RegistroPonto.query.filter_by(cpf_funcionario=funcionario.cpf, data_hora=data_hora).first():
+        try:
+            hoje = datetime.date.today()
+            inicio_str = request.args.get('inicio')
+            fim_str = request.args.get('fim')
+            inicio = datetime.datetime.strptime(inicio_str, '%Y-%m').date() if inicio_str else datetime.date(hoje.year - 1, hoje.month, 1)
+            fim = datetime.datetime.strptime(fim_str, '%Y-%m').date() if fim_str else hoje
+            setor_id = int(request.args['setor_id']) if request.args.get('setor_id') else None
+            funcao_id = int(request.args['funcao_id']) if request.args.get('funcao_id') else None
+        except ValueError:
+            return jsonify({'error': 'Formato de mês inválido (use AAAA-MM).'}), 400
+        if fim < inicio:
+            return jsonify({'error': 'O mês final deve ser posterior ao inicial.'}), 400
+
+        nomes_setores = dict(db.session.query(Setor.id, Setor.nome))
+        nomes_funcoes = dict(db.session.query(Funcao.id, Funcao.nome))
+        meses = []
+        for mes, grupos in sorted(quadro_mensal(inicio, fim).items()):
+            por_setor, por_funcao = Counter(), Counter()
+            for (setor, funcao), quantidade in grupos.items():
+                if (setor_id and setor != setor_id) or (funcao_id and funcao != funcao_id):
                     continue
-                
-                novo = RegistroPonto(
-                    cpf_funcionario=funcionario.cpf,
-                    pis=pis_campo,
-                    id_face=funcionario.id_face,
-                    data_hora=data_hora,
-                    tipo_lancamento='Importação PIS'
-                )
-                db.session.add(novo)
-                inseridos += 1
+                por_setor[nomes_setores.get(setor, setor)] += quantidade
+                por_funcao[nomes_funcoes.get(funcao, funcao)] += quantidade
+            meses.append({
+                'mes': mes.strftime('%Y-%m'),
+                'total': sum(por_setor.values()),
+                'por_setor': dict(por_setor),
+                'por_funcao': dict(por_funcao),
+            })
+        return jsonify({'meses': meses})
 
-            db.session.commit()
-            flash(f'{inseridos} registros importados com sucesso!', 'success')
-            return redirect(url_for('listar_registros_ponto'))
+    # --- API do espelho de ponto (todos os funcionários ou um CPF, por período) ---
+    @app.route('/api/espelho_ponto', methods=['GET'])
+    def api_espelho_ponto():
+        if 'usuario_id' not in session:
+            return jsonify({'error': 'Login necessário.'}), 401
 
-        return render_template('importar_registro_ponto.html')
+        try:
+            hoje = datetime.date.today()
+            inicio_str = request.args.get('inicio')
+            fim_str = request.args.get('fim')
+            data_inicio = datetime.datetime.strptime(inicio_str, '%Y-%m-%d').date() if inicio_str else hoje.replace(day=1)
+            data_fim = datetime.datetime.strptime(fim_str, '%Y-%m-%d').date() if fim_str else hoje
+        except ValueError:
+            return jsonify({'error': 'Formato de data inválido (use AAAA-MM-DD).'}), 400
+        if data_fim < data_inicio:
+            return jsonify({'error': 'A data final deve ser posterior à inicial.'}), 400
+
+        cpf = request.args.get('cpf')
+        cpfs = [cpf.replace('.', '').replace('-', '')] if cpf else None
+        espelho = calcular_espelho(data_inicio, data_fim, cpfs)
+
+        return jsonify({
+            cpf_funcionario: {
+                'totais': totalizar(dias),
+                'dias': [
+                    {
+                        'data': dia.data.strftime('%Y-%m-%d'),
+                        'marcacoes': [m.strftime('%H:%M') for m in dia.marcacoes],
+                        'minutos_previstos': dia.minutos_previstos,
+                        'minutos_trabalhados': dia.minutos_trabalhados,
+                        'minutos_atraso': dia.minutos_atraso,
+                        'minutos_extras': dia.minutos_extras,
+                        'minutos_falta': dia.minutos_falta,
+                        'marcacao_faltante': dia.marcacao_faltante,
+                        'falta': dia.falta,
+                        'abonado': dia.abonado,
+                    }
+                    for dia in dias
+                ],
+            }
+            for cpf_funcionario, dias in espelho.items()
+        })
     
     # Rota para registro de ponto:
     @app.route('/registro_ponto', methods=['GET', 'POST'])
@@ -2519,17 +2871,28 @@ def create_app():
                 flash('Data e hora inválidas.', 'danger')
                 return render_template('registro_ponto_form.html', registro_ponto=None)
 
-            novo_ponto = RegistroPonto(
-                cpf_funcionario=cpf,
-                pis=pis,
-                id_face=id_face,
-                data_hora=data_hora,
-                tipo_lancamento=tipo_lancamento,
-                observacao=observacao
-            )
-            db.session.add(novo_ponto)
+            # Grava os identificadores do cadastro do funcionário informado
+            encontrado = resolver_primeiro(('cpf', cpf), ('pis', pis), ('id_face', id_face))
+            if encontrado is None:
+                flash('Funcionário não encontrado para o CPF, PIS ou IDFace informado.', 'danger')
+                return render_template('registro_ponto_form.html', registro_ponto=None)
+            cpf, pis, id_face = encontrado
+
+            # A unicidade (funcionário, data/hora) é garantida pelo banco
+            inseridos = gravar_marcacoes([{
+                'cpf_funcionario': cpf,
+                'pis': pis,
+                'id_face': id_face,
+                'data_hora': data_hora,
+                'tipo_lancamento': tipo_lancamento,
+                'observacao': observacao,
+            }])
             db.session.commit()
 
+            if not inseridos:
+                flash('Já existe um registro de ponto para este funcionário nesta data e hora.', 'warning')
+                return render_template('registro_ponto_form.html', registro_ponto=None)
+
             flash('Ponto registrado com sucesso!', 'success')
             return redirect(url_for('listar_registros_ponto'))
 
@@ -2555,6 +2918,8 @@ def create_app():
 
         db.session.delete(registro)
         try:
+            db.session.flush()
+            atualizar_resumo_diario([(registro.cpf_funcionario, registro.data_hora)])
             db.session.commit()
             flash('Registro de ponto deletado com sucesso!', 'success')
 
@@ -2598,6 +2963,12 @@ def create_app():
                 flash('Data e hora inválidas.', 'danger')
                 return render_template('registro_ponto_form.html', registro_ponto=registro)
 
+            encontrado = resolver_primeiro(('cpf', cpf), ('pis', pis), ('id_face', id_face))
+            if encontrado is None:
+                flash('Funcionário não encontrado para o CPF, PIS ou IDFace informado.', 'danger')
+                return render_template('registro_ponto_form.html', registro_ponto=registro)
+            cpf, pis, id_face = encontrado
+
             dados_antigos = {
                 'cpf_funcionario': registro.cpf_funcionario,
                 'pis': registro.pis,
@@ -2615,6 +2986,12 @@ def create_app():
             registro.observacao = observacao
 
             try:
+                db.session.flush()
+                # Atualiza o resumo do dia antigo e do novo (o registro pode ter mudado de dia ou de funcionário)
+                atualizar_resumo_diario([
+                    (dados_antigos['cpf_funcionario'], datetime.datetime.strptime(dados_antigos['data_hora'], '%Y-%m-%dT%H:%M')),
+                    (registro.cpf_funcionario, registro.data_hora),
+                ])
                 db.session.commit()
                 dados_novos = {
                     'cpf_funcionario': registro.cpf_funcionario,
@@ -2707,6 +3084,10 @@ def create_app():
             return redirect(url_for('login'))
 
         usuario = Usuario.query.get_or_404(id)
+        bloqueios = verificar_dependencias(usuario)
+        if bloqueios:
+            flash(mensagem_bloqueio(f'o usuário {usuario.nome}', bloqueios), 'danger')
+            return redirect(url_for('listar_usuarios'))
         db.session.delete(usuario)
         db.session.commit()
         flash('Usuário deletado com sucesso!', 'success')
@@ -2762,6 +3143,11 @@ def create_app():
 
         entidade = EntidadeSaudeOcupacional.query.get_or_404(id)
 
+        bloqueios = verificar_dependencias(entidade)
+        if bloqueios:
+            flash(mensagem_bloqueio(f'a entidade {entidade.nome}', bloqueios), 'danger')
+            return redirect(url_for('listar_entidades_saude'))
+
         dados_antigos = {
             'id': entidade.id,
             'nome': entidade.nome,
@@ -2852,8 +3238,9 @@ def create_app():
 
         tipo = TipoExame.query.get_or_404(id)
 
-        if ExameFuncionario.query.filter_by(tipo_exame_id=id).first() or ExameFuncao.query.filter_by(tipo_exame_id=id).first():
-            flash('Não foi possível deletar o tipo de exame. Existem registros associados a ele.', 'danger')
+        bloqueios = verificar_dependencias(tipo)
+        if bloqueios:
+            flash(mensagem_bloqueio(f'o tipo de exame "{tipo.nome}"', bloqueios), 'danger')
             return redirect(url_for('listar_tipos_exames'))
 
         dados_antigos = {
@@ -3089,6 +3476,43 @@ def initialize_database(app_instance):
             except Exception as e:
                 print(f"Erro ao adicionar coluna status: {e}")
 
+        if 'foto_hash' not in funcionario_cols:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text('ALTER TABLE funcionarios ADD COLUMN foto_hash VARCHAR(64)'))
+                    conn.commit()
+                print("Coluna 'foto_hash' adicionada à tabela funcionarios (execute gerar_versoes_fotos.py).")
+            except Exception as e:
+                print(f"Erro ao adicionar coluna foto_hash: {e}")
+
+        if 'pis_digitos' not in funcionario_cols:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text(
+                        "ALTER TABLE funcionarios ADD COLUMN pis_digitos VARCHAR(14) "
+                        "GENERATED ALWAYS AS (NULLIF(regexp_replace(pis, '[^0-9]', '', 'g'), '')) STORED"
+                    ))
+                    conn.commit()
+                print("Coluna 'pis_digitos' adicionada à tabela funcionarios.")
+            except Exception as e:
+                print(f"Erro ao adicionar coluna pis_digitos: {e}")
+        if 'uq_funcionarios_pis_digitos' not in {i['name'] for i in inspect(engine).get_indexes('funcionarios')}:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text('CREATE UNIQUE INDEX uq_funcionarios_pis_digitos ON funcionarios (pis_digitos)'))
+                    conn.commit()
+                print("Índice uq_funcionarios_pis_digitos criado.")
+            except Exception as e:
+                # PIS repetidos com formatações diferentes: a resolução continua indexada,
+                # mas os cadastros duplicados precisam ser corrigidos.
+                print(f"Erro ao criar índice único de PIS (há PIS duplicados?): {e}")
+                try:
+                    with engine.connect() as conn:
+                        conn.execute(text('CREATE INDEX IF NOT EXISTS ix_funcionarios_pis_digitos ON funcionarios (pis_digitos)'))
+                        conn.commit()
+                except Exception as e:
+                    print(f"Erro ao criar índice de PIS: {e}")
+
         usuario_cols = [c['name'] for c in inspector.get_columns('usuarios')]
         if 'nome_completo' not in usuario_cols:
             try:
@@ -3108,6 +3532,184 @@ def initialize_database(app_instance):
                 print("Coluna 'jornada_id' adicionada à tabela contratos_trabalho.")
             except Exception as e:
                 print(f"Erro ao adicionar coluna jornada_id: {e}")
+
+        # Setor e função dos contratos passam do nome (texto) para chave
+        # estrangeira. Nomes usados em contratos e ausentes do cadastro são
+        # cadastrados antes, para que nenhum contrato fique sem referência.
+        # Cada conversão roda em uma transação: ou tudo é convertido, ou nada.
+        for coluna, tabela in (('setor', 'setores'), ('funcao', 'funcoes')):
+            if f'{coluna}_id' in contrato_cols:
+                continue
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(
+                        f"INSERT INTO {tabela} (nome) SELECT DISTINCT btrim({coluna}) FROM contratos_trabalho "
+                        f"WHERE {coluna} IS NOT NULL ON CONFLICT (nome) DO NOTHING"
+                    ))
+                    conn.execute(text(f'ALTER TABLE contratos_trabalho ADD COLUMN {coluna}_id INTEGER REFERENCES {tabela}(id)'))
+                    conn.execute(text(
+                        f"UPDATE contratos_trabalho c SET {coluna}_id = t.id FROM {tabela} t WHERE t.nome = btrim(c.{coluna})"
+                    ))
+                    conn.execute(text(f'ALTER TABLE contratos_trabalho ALTER COLUMN {coluna}_id SET NOT NULL'))
+                    conn.execute(text(f'ALTER TABLE contratos_trabalho DROP COLUMN {coluna}'))
+                    conn.execute(text(
+                        f'CREATE INDEX IF NOT EXISTS ix_contratos_trabalho_{coluna}_id ON contratos_trabalho ({coluna}_id)'
+                    ))
+                print(f"Coluna '{coluna}' de contratos_trabalho convertida em '{coluna}_id'.")
+            except Exception as e:
+                print(f"Erro ao converter a coluna {coluna} de contratos_trabalho: {e}")
+
+        # Um contrato ativo por funcionário: contratos ativos repetidos são
+        # inativados (fica ativo o de admissão mais recente) antes do índice único.
+        if 'uq_contratos_trabalho_ativo' not in {i['name'] for i in inspector.get_indexes('contratos_trabalho')}:
+            try:
+                with engine.begin() as conn:
+                    inativados = conn.execute(text(
+                        'UPDATE contratos_trabalho c SET status = false FROM ('
+                        '  SELECT id, row_number() OVER (PARTITION BY cpf_funcionario '
+                        '    ORDER BY data_admissao DESC, id DESC) AS ordem '
+                        '  FROM contratos_trabalho WHERE status'
+                        ') r WHERE c.id = r.id AND r.ordem > 1'
+                    )).rowcount
+                    conn.execute(text(
+                        'CREATE UNIQUE INDEX uq_contratos_trabalho_ativo ON contratos_trabalho (cpf_funcionario) WHERE status'
+                    ))
+                print(f"Índice único de contrato ativo criado ({inativados} contratos ativos repetidos inativados).")
+            except Exception as e:
+                print(f"Erro ao criar índice único de contrato ativo: {e}")
+
+        # Vigência dos contratos, para o quadro de pessoal mensal (ver quadro_pessoal.py)
+        if 'ix_contratos_trabalho_vigencia' not in {i['name'] for i in inspector.get_indexes('contratos_trabalho')}:
+            from quadro_pessoal import SQL_INDICE_VIGENCIA
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text(SQL_INDICE_VIGENCIA))
+                    conn.commit()
+                print("Índice ix_contratos_trabalho_vigencia criado.")
+            except Exception as e:
+                print(f"Erro ao criar índice de vigência de contratos: {e}")
+
+        # Unicidade das marcações de ponto: remove duplicidades antigas
+        # (mantendo o registro mais antigo) antes de criar o índice único.
+        indices_ponto = [i['name'] for i in inspector.get_indexes('registro_ponto')]
+        if 'uq_registro_ponto_funcionario_data_hora' not in indices_ponto:
+            try:
+                with engine.connect() as conn:
+                    removidos = conn.execute(text(
+                        'DELETE FROM registro_ponto a USING registro_ponto b '
+                        'WHERE a.cpf_funcionario = b.cpf_funcionario '
+                        'AND a.data_hora = b.data_hora AND a.id > b.id'
+                    )).rowcount
+                    conn.execute(text(
+                        'CREATE UNIQUE INDEX uq_registro_ponto_funcionario_data_hora '
+                        'ON registro_ponto (cpf_funcionario, data_hora)'
+                    ))
+                    conn.commit()
+                print(f"Índice único de registro_ponto criado ({removidos} registros duplicados removidos).")
+            except Exception as e:
+                print(f"Erro ao criar índice único de registro_ponto: {e}")
+
+        tarefa_cols = [c['name'] for c in inspector.get_columns('tarefas_importacao')]
+        if 'arquivos' not in tarefa_cols:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text('ALTER TABLE tarefas_importacao ADD COLUMN arquivos JSON'))
+                    conn.commit()
+                print("Coluna 'arquivos' adicionada à tabela tarefas_importacao.")
+            except Exception as e:
+                print(f"Erro ao adicionar coluna arquivos: {e}")
+
+        # Busca de funcionários (ver busca_funcionarios.py): função sem_acento e
+        # índices de prefixo e trigram. Sem as extensões unaccent/pg_trgm a busca
+        # continua funcionando, apenas sem o índice do nome.
+        from busca_funcionarios import (
+            SQL_SEM_ACENTO_UNACCENT, SQL_SEM_ACENTO_TRANSLATE, INDICES_BUSCA, INDICES_BUSCA_OBSOLETOS,
+        )
+        for extensao in ('unaccent', 'pg_trgm'):
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text(f'CREATE EXTENSION IF NOT EXISTS {extensao}'))
+                    conn.commit()
+            except Exception as e:
+                print(f"Extensão {extensao} indisponível: {e}")
+        try:
+            with engine.connect() as conn:
+                tem_unaccent = conn.execute(text("SELECT to_regproc('public.unaccent') IS NOT NULL")).scalar()
+                conn.execute(text(SQL_SEM_ACENTO_UNACCENT if tem_unaccent else SQL_SEM_ACENTO_TRANSLATE))
+                conn.commit()
+        except Exception as e:
+            print(f"Erro ao criar a função sem_acento: {e}")
+        indices_funcionarios = {i['name'] for i in inspect(engine).get_indexes('funcionarios')}
+        for nome_indice in INDICES_BUSCA_OBSOLETOS:
+            if nome_indice not in indices_funcionarios:
+                continue
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text(f'DROP INDEX IF EXISTS {nome_indice}'))
+                    conn.commit()
+                print(f"Índice {nome_indice} removido.")
+            except Exception as e:
+                print(f"Erro ao remover índice {nome_indice}: {e}")
+        for nome_indice, sql_indice in INDICES_BUSCA.items():
+            if nome_indice in indices_funcionarios:
+                continue
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text(sql_indice))
+                    conn.commit()
+                print(f"Índice {nome_indice} criado.")
+            except Exception as e:
+                print(f"Erro ao criar índice {nome_indice}: {e}")
+        for nome_indice, colunas in (('ix_funcionarios_nome_cpf', 'nome, cpf'), ('ix_funcionarios_cidade', 'cidade')):
+            if nome_indice not in indices_funcionarios:
+                try:
+                    with engine.connect() as conn:
+                        conn.execute(text(f'CREATE INDEX {nome_indice} ON funcionarios ({colunas})'))
+                        conn.commit()
+                except Exception as e:
+                    print(f"Erro ao criar índice {nome_indice}: {e}")
+
+        if 'ix_registro_ponto_data_hora_id' not in indices_ponto:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text('CREATE INDEX ix_registro_ponto_data_hora_id ON registro_ponto (data_hora, id)'))
+                    conn.commit()
+                print("Índice ix_registro_ponto_data_hora_id criado.")
+            except Exception as e:
+                print(f"Erro ao criar índice de data/hora de registro_ponto: {e}")
+
+        # Primeira carga do resumo diário de ponto em bancos que já têm marcações
+        # (desde a véspera da primeira, que pode ser o dia da jornada dela)
+        try:
+            with engine.connect() as conn:
+                periodo = conn.execute(text(
+                    'SELECT min(data_hora)::date - 1, max(data_hora)::date FROM registro_ponto '
+                    'WHERE NOT EXISTS (SELECT 1 FROM resumo_ponto_diario)'
+                )).first()
+            if periodo and periodo[0]:
+                from resumo_ponto import reconstruir_resumo_diario
+                dias = reconstruir_resumo_diario(periodo[0], periodo[1])
+                db.session.commit()
+                print(f"Resumo diário de ponto carregado ({dias} dias).")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Erro ao carregar o resumo diário de ponto: {e}")
+
+        # Primeira carga do histórico salarial em bancos que já têm contratos
+        try:
+            with engine.connect() as conn:
+                sem_historico = conn.execute(text(
+                    'SELECT EXISTS (SELECT 1 FROM contratos_trabalho) '
+                    'AND NOT EXISTS (SELECT 1 FROM historico_salarial)'
+                )).scalar()
+            if sem_historico:
+                from historico_salarial import reconstruir_historico_salarial
+                periodos = reconstruir_historico_salarial()
+                db.session.commit()
+                print(f"Histórico salarial carregado ({periodos} períodos).")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Erro ao carregar o histórico salarial: {e}")
         from models import (
             Usuario,
             LogAuditoria,
@@ -0,0 +1,60 @@
+"""
+Compara a validação de CPF e PIS um a um (valida_cpf, valida_pis) com a
+validação em lote do NumPy (validar_cpfs, validar_pis) e confere que as duas
+dão o mesmo resultado. Não usa o banco de dados.
+
+Uso:
+    python benchmark_validacao.py [--quantidade 1000000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from validacao import PESOS_PIS, valida_cpf, valida_pis, validar_cpfs, validar_pis
+
+
+def gerar_numeros(quantidade, pesos_digitos, semente=42):
+    """
+    Números de 11 dígitos aleatórios, metade com os dígitos verificadores
+    corretos (``pesos_digitos`` lista os pesos de cada dígito verificador).
+    """
+    gerador = np.random.default_rng(semente)
+    digitos = gerador.integers(0, 10, size=(quantidade, 11))
+    corretos = np.arange(quantidade) % 2 == 0
+    for posicao, pesos in pesos_digitos:
+        digito = 11 - (digitos[:, :len(pesos)] @ np.asarray(pesos)) % 11
+        digitos[corretos, posicao] = np.where(digito > 9, 0, digito)[corretos]
+    return [''.join(map(str, linha)) for linha in digitos.tolist()]
+
+
+def medir(nome, funcao_escalar, funcao_lote, numeros):
+    inicio = time.perf_counter()
+    escalar = [funcao_escalar(numero) for numero in numeros]
+    tempo_escalar = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    lote = funcao_lote(numeros)
+    tempo_lote = time.perf_counter() - inicio
+
+    if lote != escalar:
+        raise SystemExit(f'{nome}: resultados diferentes entre a validação escalar e em lote.')
+    print(
+        f'{nome}: {len(numeros)} números, {sum(escalar)} válidos | '
+        f'um a um {tempo_escalar:.2f} s | em lote {tempo_lote:.2f} s | {tempo_escalar / tempo_lote:.1f}x'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara a validação de CPF e PIS escalar e em lote.')
+    parser.add_argument('--quantidade', type=int, default=1000000, help='Números gerados para cada documento')
+    args = parser.parse_args()
+
+    cpfs = gerar_numeros(args.quantidade, [(9, range(10, 1, -1)), (10, range(11, 1, -1))])
+    medir('CPF', valida_cpf, validar_cpfs, cpfs)
+    numeros_pis = gerar_numeros(args.quantidade, [(10, PESOS_PIS)])
+    medir('PIS', valida_pis, validar_pis, numeros_pis)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Busca paginada de funcionários para a tela de cadastro e a API da listagem.
+
+O termo de busca é comparado com o nome sem acentos e sem diferenciar
+maiúsculas (função sem_acento e índice trigram criados em
+initialize_database) e, quando tem dígitos, como prefixo de CPF, PIS ou
+IDFace. A paginação é por chave (nome, cpf) ou (cpf): cada página começa após
+o último funcionário da anterior, sem OFFSET.
+"""
+from sqlalchemy import func, or_, tuple_
+from sqlalchemy.orm import load_only
+
+from extensions import db
+from models import Funcionario
+
+POR_PAGINA = 50
+ORDENACOES = ('nome', 'cpf')
+# Filtro de status para funcionários que nunca tiveram contrato (status vazio)
+STATUS_SEM_CONTRATO = 'Sem contrato'
+
+# Função imutável usada na busca e no índice trigram. Usa a extensão unaccent
+# quando disponível; caso contrário, remove os acentos do português com translate.
+SQL_SEM_ACENTO_UNACCENT = (
+    "CREATE OR REPLACE FUNCTION sem_acento(text) RETURNS text "
+    "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT "
+    "AS $$ SELECT public.unaccent('public.unaccent', $1) $$"
+)
+SQL_SEM_ACENTO_TRANSLATE = (
+    "CREATE OR REPLACE FUNCTION sem_acento(text) RETURNS text "
+    "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT "
+    "AS $$ SELECT translate($1, 'áàâãäéèêëíìîïóòôõöúùûüçñÁÀÂÃÄÉÈÊËÍÌÎÏÓÒÔÕÖÚÙÛÜÇÑ', "
+    "'aaaaaeeeeiiiiooooouuuucnAAAAAEEEEIIIIOOOOOUUUUCN') $$"
+)
+
+# Índices de busca criados em initialize_database (o trigram depende do pg_trgm).
+# O prefixo do PIS usa a coluna gerada pis_digitos, já normalizada.
+INDICES_BUSCA = {
+    'ix_funcionarios_nome_trgm':
+        'CREATE INDEX ix_funcionarios_nome_trgm ON funcionarios USING gin (sem_acento(lower(nome)) gin_trgm_ops)',
+    'ix_funcionarios_cpf_prefixo':
+        'CREATE INDEX ix_funcionarios_cpf_prefixo ON funcionarios (cpf text_pattern_ops)',
+    'ix_funcionarios_pis_digitos_prefixo':
+        'CREATE INDEX ix_funcionarios_pis_digitos_prefixo ON funcionarios (pis_digitos text_pattern_ops)',
+    'ix_funcionarios_id_face_prefixo':
+        'CREATE INDEX ix_funcionarios_id_face_prefixo ON funcionarios (id_face text_pattern_ops)',
+}
+# Índices substituídos, removidos em initialize_database.
+INDICES_BUSCA_OBSOLETOS = ('ix_funcionarios_pis_prefixo',)
+
+
+def escapar_like(valor):
+    """Escapa os curingas de LIKE (``%``, ``_`` e ``\\``) de um texto digitado pelo usuário."""
+    return valor.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def filtrar_funcionarios(consulta, busca='', status='', cidade=''):
+    """Aplica à consulta os filtros de busca livre, status e cidade."""
+    busca = busca.strip()
+    if busca:
+        termo = escapar_like(busca)
+        condicoes = [
+            func.sem_acento(func.lower(Funcionario.nome)).like(
+                func.concat('%', func.sem_acento(func.lower(termo)), '%'), escape='\\'
+            ),
+            Funcionario.id_face.like(f'{termo}%', escape='\\'),
+        ]
+        digitos = ''.join(filter(str.isdigit, busca))
+        if digitos:
+            condicoes += [
+                Funcionario.cpf.like(f'{digitos}%'),
+                Funcionario.pis_digitos.like(f'{digitos}%'),
+            ]
+        consulta = consulta.filter(or_(*condicoes))
+
+    if status == STATUS_SEM_CONTRATO:
+        consulta = consulta.filter(or_(Funcionario.status.is_(None), Funcionario.status == ''))
+    elif status:
+        consulta = consulta.filter(Funcionario.status == status)
+    if cidade:
+        consulta = consulta.filter(Funcionario.cidade == cidade)
+    return consulta
+
+
+def _chave(funcionario, ordem):
+    if ordem == 'cpf':
+        return funcionario.cpf
+    return f'{funcionario.nome}_{funcionario.cpf}'
+
+
+def buscar_funcionarios(busca='', status='', cidade='', ordem='nome', apos='', limite=POR_PAGINA):
+    """
+    Retorna (funcionarios, proxima): uma página de funcionários e a chave da
+    página seguinte (None na última). ``apos`` é a chave recebida da página
+    anterior. Lança ValueError para ordenação desconhecida.
+    """
+    if ordem not in ORDENACOES:
+        raise ValueError(f'Ordenação inválida: {ordem}')
+
+    consulta = filtrar_funcionarios(Funcionario.query, busca, status, cidade).options(load_only(
+        Funcionario.cpf, Funcionario.nome, Funcionario.data_nascimento, Funcionario.sexo, Funcionario.pis,
+        Funcionario.id_face, Funcionario.telefone, Funcionario.grau_instrucao, Funcionario.cidade,
+        Funcionario.status,
+    ))
+    if ordem == 'cpf':
+        if apos:
+            consulta = consulta.filter(Funcionario.cpf > apos)
+        consulta = consulta.order_by(Funcionario.cpf)
+    else:
+        if apos:
+            nome, _, cpf = apos.rpartition('_')
+            consulta = consulta.filter(tuple_(Funcionario.nome, Funcionario.cpf) > (nome, cpf))
+        consulta = consulta.order_by(Funcionario.nome, Funcionario.cpf)
+
+    funcionarios = consulta.limit(limite + 1).all()
+    proxima = None
+    if len(funcionarios) > limite:
+        funcionarios = funcionarios[:limite]
+        proxima = _chave(funcionarios[-1], ordem)
+    return funcionarios, proxima
+
+
+def contar_funcionarios(busca='', status='', cidade=''):
+    return filtrar_funcionarios(db.session.query(func.count(Funcionario.cpf)), busca, status, cidade).scalar()
+
+
+def cidades_cadastradas():
+    """Cidades distintas dos funcionários, para o filtro da listagem."""
+    return [
+        cidade for (cidade,) in
+        db.session.query(Funcionario.cidade).filter(Funcionario.cidade.isnot(None), Funcionario.cidade != '')
+        .distinct().order_by(Funcionario.cidade)
+    ]
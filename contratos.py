@@ -0,0 +1,31 @@
+"""
+Contrato ativo dos funcionários.
+
+Cada funcionário tem no máximo um contrato ativo, garantido pelo índice único
+parcial uq_contratos_trabalho_ativo (cpf_funcionario WHERE status). As
+consultas abaixo usam esse mesmo índice: a busca de um CPF ou de muitos é uma
+única consulta, sem ordenação.
+"""
+from extensions import db
+from models import ContratoTrabalho
+
+# Nome do índice, para reconhecer a violação em IntegrityError
+INDICE_CONTRATO_ATIVO = 'uq_contratos_trabalho_ativo'
+
+
+def contratos_ativos(cpfs):
+    """Dicionário {cpf: contrato ativo} dos CPFs informados; CPFs sem contrato ativo ficam de fora."""
+    cpfs = set(cpfs)
+    if not cpfs:
+        return {}
+    contratos = (
+        db.session.query(ContratoTrabalho)
+        .filter(ContratoTrabalho.cpf_funcionario.in_(cpfs), ContratoTrabalho.status == True)
+        .all()
+    )
+    return {contrato.cpf_funcionario: contrato for contrato in contratos}
+
+
+def contrato_ativo(cpf):
+    """Contrato ativo do funcionário, ou None."""
+    return contratos_ativos([cpf]).get(cpf)
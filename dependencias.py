@@ -0,0 +1,105 @@
+"""
+Verificação dos registros que impedem a exclusão de um cadastro.
+
+As referências são obtidas das chaves estrangeiras declaradas nos modelos
+(db.metadata), acrescidas das referências por valor que não têm chave
+estrangeira no banco (funcionários que guardam o nome e a UF da cidade). Todas as tabelas são
+verificadas em um único comando, um SELECT com EXISTS por tabela unido por
+UNION ALL, que retorna a quantidade de registros apenas das tabelas que
+bloqueiam a exclusão.
+"""
+from sqlalchemy import and_, exists, func, literal, select, union_all
+
+from extensions import db
+
+# Referências sem chave estrangeira: tabela referenciada ->
+# [(tabela de origem, ((coluna de origem, coluna referenciada), ...)), ...]
+REFERENCIAS_POR_VALOR = {
+    'cidades': [('funcionarios', (('cidade', 'nome_cidade'), ('estado', 'estado_uf')))],
+}
+
+# Nomes exibidos nas mensagens, no plural.
+DESCRICOES = {
+    'funcionarios': 'funcionários',
+    'dependentes': 'dependentes',
+    'contratos_trabalho': 'contratos de trabalho',
+    'reajustes_salariais': 'reajustes salariais',
+    'historico_salarial': 'períodos do histórico salarial',
+    'controle_ferias': 'registros de férias',
+    'demissoes': 'demissões',
+    'banco_horas': 'registros de banco de horas',
+    'horas_extras': 'registros de horas extras',
+    'registro_ponto': 'registros de ponto',
+    'resumo_ponto_diario': 'resumos diários de ponto',
+    'tarefas_importacao': 'importações de ponto',
+    'logs_auditoria': 'registros de auditoria',
+    'exames_funcoes': 'exames vinculados a funções',
+    'exames_funcionarios': 'exames de funcionários',
+    'distribuicoes_itens': 'distribuições de fardas/EPIs',
+    'devolucoes_itens': 'devoluções de fardas/EPIs',
+    'adiantamentos': 'adiantamentos',
+    'parcelas_adiantamento': 'parcelas de adiantamento',
+}
+
+_referencias = {}
+
+
+def referencias(tabela):
+    """
+    Lista as referências à tabela como pares (tabela de origem, ((coluna de
+    origem, coluna referenciada), ...)), das chaves estrangeiras e de
+    REFERENCIAS_POR_VALOR. O resultado é calculado uma vez por tabela.
+    """
+    if tabela not in _referencias:
+        encontradas = []
+        for origem in db.metadata.sorted_tables:
+            for fk in origem.foreign_key_constraints:
+                if fk.referred_table.name == tabela:
+                    encontradas.append((origem.name, tuple(
+                        (elemento.parent.name, elemento.column.name) for elemento in fk.elements
+                    )))
+        encontradas.extend(REFERENCIAS_POR_VALOR.get(tabela, ()))
+        _referencias[tabela] = encontradas
+    return _referencias[tabela]
+
+
+def verificar_dependencias(objeto, ignorar=()):
+    """
+    Retorna um dicionário tabela de origem -> quantidade de registros que
+    referenciam ``objeto``, apenas para as tabelas com algum registro.
+    Tabelas em ``ignorar`` (por exemplo, removidas em cascata) não são
+    verificadas. Faz no máximo uma consulta.
+    """
+    alvo = objeto.__table__
+    consultas = []
+    for nome_origem, pares in referencias(alvo.name):
+        if nome_origem in ignorar:
+            continue
+        origem = db.metadata.tables[nome_origem]
+        condicao = and_(*(
+            origem.c[coluna_origem] == getattr(objeto, alvo.c[coluna_alvo].key)
+            for coluna_origem, coluna_alvo in pares
+        ))
+        consultas.append(
+            select(
+                literal(nome_origem).label('tabela'),
+                select(func.count()).select_from(origem).where(condicao).scalar_subquery().label('quantidade'),
+            ).where(exists().where(condicao))
+        )
+    if not consultas:
+        return {}
+    comando = consultas[0] if len(consultas) == 1 else union_all(*consultas)
+    return {tabela: quantidade for tabela, quantidade in db.session.execute(comando)}
+
+
+def descrever_dependencias(bloqueios):
+    """Texto como '3 dependentes, 1 contratos de trabalho' para as mensagens."""
+    return ', '.join(f'{quantidade} {DESCRICOES.get(tabela, tabela)}' for tabela, quantidade in bloqueios.items())
+
+
+def mensagem_bloqueio(descricao, bloqueios):
+    """Mensagem padrão quando a exclusão de ``descricao`` é impedida."""
+    return (
+        f'Não foi possível deletar {descricao}. Existem registros associados: '
+        f'{descrever_dependencias(bloqueios)}. Remova-os ou atualize-os primeiro.'
+    )
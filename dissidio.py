@@ -0,0 +1,100 @@
+"""
+Dissídio coletivo: o mesmo reajuste salarial para todos os contratos ativos,
+opcionalmente filtrados por setor, função ou regime de contratação.
+
+Os reajustes são incluídos por um único INSERT ... SELECT sobre os contratos
+ativos, na mesma transação que atualiza o histórico salarial e grava um único
+registro de auditoria com o resumo. Funcionários que já têm reajuste na data
+ou admitidos depois dela ficam de fora, o que também impede aplicar o mesmo
+dissídio duas vezes.
+"""
+from sqlalchemy import Date, Numeric, exists, insert, literal, select
+
+from extensions import db
+from models import ContratoTrabalho, Funcionario, LogAuditoria, ReajusteSalarial
+from historico_salarial import atualizar_historico_salarial, reajustar, salarios_vigentes
+
+
+def _condicoes(data, setor_id=None, funcao_id=None, regime_contratacao=None):
+    condicoes = [
+        ContratoTrabalho.status == True,
+        ContratoTrabalho.data_admissao <= data,
+        ~exists().where(
+            ReajusteSalarial.cpf_funcionario == ContratoTrabalho.cpf_funcionario,
+            ReajusteSalarial.data_alteracao == data,
+        ),
+    ]
+    if setor_id:
+        condicoes.append(ContratoTrabalho.setor_id == setor_id)
+    if funcao_id:
+        condicoes.append(ContratoTrabalho.funcao_id == funcao_id)
+    if regime_contratacao:
+        condicoes.append(ContratoTrabalho.regime_contratacao == regime_contratacao)
+    return condicoes
+
+
+def previa_dissidio(data, percentual_salario, percentual_bonus, **filtros):
+    """
+    Lista, por funcionário atingido, o salário e o bônus vigentes na data e os
+    valores com o dissídio aplicado, em ordem de nome. Não grava nada.
+    """
+    contratos = (
+        db.session.query(ContratoTrabalho, Funcionario.nome)
+        .join(Funcionario)
+        .filter(*_condicoes(data, **filtros))
+        .order_by(Funcionario.nome)
+        .all()
+    )
+    vigentes = salarios_vigentes([contrato.cpf_funcionario for contrato, _ in contratos], data)
+    previa = []
+    for contrato, nome in contratos:
+        salario, bonus = vigentes.get(contrato.cpf_funcionario, (contrato.salario_inicial, contrato.bonus or 0))
+        previa.append({
+            'cpf': contrato.cpf_funcionario, 'nome': nome,
+            'setor': contrato.setor.nome, 'funcao': contrato.funcao.nome,
+            'salario_atual': salario, 'bonus_atual': bonus,
+            'salario_novo': reajustar(salario, percentual_salario),
+            'bonus_novo': reajustar(bonus, percentual_bonus),
+        })
+    return previa
+
+
+def aplicar_dissidio(data, percentual_salario, percentual_bonus, usuario_id, **filtros):
+    """
+    Inclui o reajuste para todos os funcionários atingidos, atualiza o
+    histórico salarial deles e grava a auditoria, em uma transação. Retorna a
+    quantidade de reajustes incluídos.
+    """
+    selecao = select(
+        ContratoTrabalho.cpf_funcionario,
+        literal(data, Date),
+        literal(percentual_salario, Numeric(5, 2)),
+        literal(percentual_bonus, Numeric(5, 2)),
+    ).where(*_condicoes(data, **filtros))
+    cpfs = db.session.execute(
+        insert(ReajusteSalarial)
+        .from_select(
+            ['cpf_funcionario', 'data_alteracao', 'percentual_reajuste_salario', 'percentual_reajuste_bonus'],
+            selecao,
+        )
+        .returning(ReajusteSalarial.cpf_funcionario)
+    ).scalars().all()
+    if cpfs:
+        atualizar_historico_salarial(cpfs)
+        db.session.add(LogAuditoria(
+            usuario_id=usuario_id,
+            acao=(
+                f"Dissídio de {percentual_salario}% no salário e {percentual_bonus}% no bônus "
+                f"em {data.strftime('%d/%m/%Y')}: {len(cpfs)} funcionários reajustados."
+            ),
+            tabela_afetada='reajustes_salariais',
+            dados_novos={
+                'data_alteracao': str(data),
+                'percentual_reajuste_salario': float(percentual_salario),
+                'percentual_reajuste_bonus': float(percentual_bonus),
+                'filtros': {campo: valor for campo, valor in filtros.items() if valor},
+                'cpfs': sorted(cpfs),
+            },
+        ))
+    db.session.commit()
+    return len(cpfs)
@@ -0,0 +1,257 @@
+"""
+Cálculo do espelho de ponto: marcações pareadas em intervalos e comparadas
+com a jornada do contrato.
+
+Todo o período é carregado com duas consultas (contratos com jornada e
+marcações), independentemente da quantidade de funcionários e de dias; o
+processamento é feito em uma única passada sobre as marcações ordenadas por
+funcionário e data/hora.
+
+Regras adotadas:
+- as marcações são agrupadas pelo dia da jornada: o dia começa
+  ANTECEDENCIA_ENTRADA minutos antes do início do primeiro turno e termina no
+  mesmo horário do dia seguinte, de modo que um turno noturno (22:00 às 06:00)
+  fica inteiro no dia em que começou; sem jornada, vale o dia civil;
+- os contratos de um funcionário não se sobrepõem: cada um termina, no máximo,
+  na véspera da admissão seguinte (contratos inativos sem data de demissão,
+  por exemplo);
+- as marcações de um dia são pareadas na ordem (entrada, saída, entrada,
+  saída...); um número ímpar de marcações indica marcação faltante e a última
+  fica sem par;
+- os lançamentos de Atestado e Abono (Falta/DSR) não são marcações: apenas
+  abonam o dia civil em que foram lançados;
+- diferenças de até 10 minutos no dia são desconsideradas (CLT, art. 58, § 1º);
+- o atraso é medido entre o início de cada turno e a entrada do par
+  correspondente;
+- dias sem turno previsto (fins de semana, por padrão) contam inteiramente
+  como hora extra.
+"""
+import datetime
+from collections import defaultdict, namedtuple
+from itertools import groupby
+
+from sqlalchemy import or_
+
+from extensions import db
+from models import ContratoTrabalho, Jornada, RegistroPonto
+
+# Lançamentos que justificam o dia em vez de registrar uma marcação.
+TIPOS_ABONO = ('Atestado', 'Abono Falta', 'Abono DSR')
+# Dias da semana com expediente (segunda = 0).
+DIAS_UTEIS = (0, 1, 2, 3, 4)
+# Tolerância diária, em minutos, para atrasos e horas extras.
+TOLERANCIA_DIARIA = 10
+# Minutos antes do início do primeiro turno em que começa o dia da jornada.
+ANTECEDENCIA_ENTRADA = 4 * 60
+UM_DIA = datetime.timedelta(days=1)
+
+DiaEspelho = namedtuple('DiaEspelho', [
+    'cpf_funcionario', 'data', 'marcacoes', 'minutos_previstos', 'minutos_trabalhados',
+    'minutos_atraso', 'minutos_extras', 'minutos_falta', 'marcacao_faltante', 'falta', 'abonado',
+])
+
+
+def _minutos(hora):
+    return hora.hour * 60 + hora.minute
+
+
+def _minutos_desde(data, data_hora):
+    """Minutos de ``data_hora`` desde a meia-noite de ``data`` (além de 24 horas no dia seguinte)."""
+    return int((data_hora - datetime.datetime.combine(data, datetime.time.min)).total_seconds() // 60)
+
+
+def turnos_da_jornada(jornada):
+    """
+    Lista os turnos da jornada como pares (início, fim) em minutos desde a
+    meia-noite do dia em que a jornada começa. Os turnos são consecutivos: o
+    que atravessa a meia-noite, e os seguintes a ele, passam de 24 horas.
+    """
+    if jornada is None:
+        return []
+    turnos = [
+        (jornada.primeiro_turno_inicio, jornada.primeiro_turno_fim),
+        (jornada.segundo_turno_inicio, jornada.segundo_turno_fim),
+    ]
+    if jornada.turno_extra_inicio and jornada.turno_extra_fim:
+        turnos.append((jornada.turno_extra_inicio, jornada.turno_extra_fim))
+
+    resultado = []
+    deslocamento = 0
+    for inicio, fim in turnos:
+        inicio = _minutos(inicio) + deslocamento
+        if resultado and inicio < resultado[-1][1]:  # Turno iniciado após a meia-noite
+            inicio += 24 * 60
+            deslocamento += 24 * 60
+        fim = _minutos(fim) + deslocamento
+        if fim <= inicio:  # Turno que atravessa a meia-noite
+            fim += 24 * 60
+            deslocamento += 24 * 60
+        resultado.append((inicio, fim))
+    return resultado
+
+
+def inicio_do_dia(turnos):
+    """Minutos, a partir da meia-noite, em que começa o dia da jornada (pode ser negativo)."""
+    return turnos[0][0] - ANTECEDENCIA_ENTRADA if turnos else 0
+
+
+def dia_da_jornada(data_hora, vigencias):
+    """
+    Dia da jornada a que pertence uma marcação, conforme os turnos do
+    contrato vigente no dia civil dela (ver ``separar_vigencias``).
+    """
+    turnos = next(
+        (turnos for admissao, fim, turnos in vigencias
+         if admissao <= data_hora.date() and (fim is None or data_hora.date() <= fim)),
+        [],
+    )
+    return (data_hora - datetime.timedelta(minutes=inicio_do_dia(turnos))).date()
+
+
+def separar_vigencias(contratos):
+    """
+    Recebe os contratos de um funcionário como tuplas (admissão, demissão,
+    turnos) em ordem de admissão e retorna as vigências sem sobreposição:
+    cada contrato termina, no máximo, na véspera da admissão do seguinte.
+    Contratos sem nenhum dia de vigência são descartados.
+    """
+    vigencias = []
+    for (admissao, demissao, turnos), proximo in zip(contratos, contratos[1:] + [None]):
+        fim = demissao
+        if proximo is not None and (fim is None or fim >= proximo[0]):
+            fim = proximo[0] - UM_DIA
+        if fim is None or fim >= admissao:
+            vigencias.append((admissao, fim, turnos))
+    return vigencias
+
+
+def calcular_dia(cpf, data, marcacoes, turnos, abonado=False, dias_uteis=DIAS_UTEIS):
+    """
+    Calcula um dia do espelho a partir das marcações (datetimes ordenados, do
+    dia da jornada ``data``) e dos turnos previstos (ver ``turnos_da_jornada``).
+    """
+    if data.weekday() not in dias_uteis:
+        turnos = []
+    previstos = sum(fim - inicio for inicio, fim in turnos)
+
+    minutos = [_minutos_desde(data, m) for m in marcacoes]
+    pares = list(zip(minutos[0::2], minutos[1::2]))
+    trabalhados = sum(saida - entrada for entrada, saida in pares if saida > entrada)
+    atraso = sum(max(0, entrada - inicio) for (entrada, _), (inicio, _) in zip(pares, turnos))
+
+    diferenca = trabalhados - previstos
+    if abs(diferenca) <= TOLERANCIA_DIARIA:
+        diferenca = 0
+    if atraso <= TOLERANCIA_DIARIA:
+        atraso = 0
+    falta = bool(turnos) and not marcacoes and not abonado
+
+    return DiaEspelho(
+        cpf_funcionario=cpf,
+        data=data,
+        marcacoes=marcacoes,
+        minutos_previstos=previstos,
+        minutos_trabalhados=trabalhados,
+        minutos_atraso=atraso,
+        minutos_extras=max(0, diferenca),
+        minutos_falta=0 if abonado else max(0, -diferenca),
+        marcacao_faltante=len(marcacoes) % 2 == 1,
+        falta=falta,
+        abonado=abonado,
+    )
+
+
+def carregar_vigencias(data_inicio, data_fim, cpfs=None):
+    """
+    Vigências (ver ``separar_vigencias``) dos contratos de cada funcionário
+    em algum dia do período, com os turnos da jornada, em uma consulta.
+    """
+    consulta = (
+        db.session.query(
+            ContratoTrabalho.cpf_funcionario, ContratoTrabalho.data_admissao, ContratoTrabalho.data_demissao, Jornada,
+        )
+        .outerjoin(Jornada, ContratoTrabalho.jornada_id == Jornada.id)
+        .filter(ContratoTrabalho.data_admissao <= data_fim)
+        .filter(or_(ContratoTrabalho.data_demissao.is_(None), ContratoTrabalho.data_demissao >= data_inicio))
+    )
+    if cpfs is not None:
+        consulta = consulta.filter(ContratoTrabalho.cpf_funcionario.in_(cpfs))
+
+    contratos = {}
+    for cpf, admissao, demissao, jornada in consulta.order_by(ContratoTrabalho.data_admissao, ContratoTrabalho.id):
+        contratos.setdefault(cpf, []).append((admissao, demissao, turnos_da_jornada(jornada)))
+    return {cpf: separar_vigencias(lista) for cpf, lista in contratos.items()}
+
+
+def carregar_marcacoes(data_inicio, data_fim, cpfs=None):
+    """
+    Marcações e abonos do período, ordenados por funcionário e data/hora, em
+    uma consulta. Inclui um dia antes e um depois, que podem pertencer aos
+    dias da jornada das pontas do período.
+    """
+    consulta = db.session.query(
+        RegistroPonto.cpf_funcionario, RegistroPonto.data_hora, RegistroPonto.tipo_lancamento,
+    ).filter(
+        RegistroPonto.data_hora >= datetime.datetime.combine(data_inicio - UM_DIA, datetime.time.min),
+        RegistroPonto.data_hora <= datetime.datetime.combine(data_fim + 2 * UM_DIA, datetime.time.max),
+        RegistroPonto.cpf_funcionario.isnot(None),
+    )
+    if cpfs is not None:
+        consulta = consulta.filter(RegistroPonto.cpf_funcionario.in_(cpfs))
+    return consulta.order_by(RegistroPonto.cpf_funcionario, RegistroPonto.data_hora).all()
+
+
+def agrupar_por_dia(registros, vigencias):
+    """
+    Agrupa os registros (data_hora, tipo_lancamento), em ordem, de um
+    funcionário: retorna {data: (marcações, abonado)}, com as marcações no
+    dia da jornada e os abonos no dia civil.
+    """
+    marcacoes, abonados = defaultdict(list), set()
+    for data_hora, tipo_lancamento in registros:
+        if tipo_lancamento in TIPOS_ABONO:
+            abonados.add(data_hora.date())
+        else:
+            marcacoes[dia_da_jornada(data_hora, vigencias)].append(data_hora)
+    return {data: (marcacoes.get(data, []), data in abonados) for data in marcacoes.keys() | abonados}
+
+
+def calcular_espelho(data_inicio, data_fim, cpfs=None, dias_uteis=DIAS_UTEIS):
+    """
+    Calcula o espelho de ponto de todos os funcionários com contrato vigente no
+    período (ou apenas de ``cpfs``). Retorna um dicionário cpf -> lista de
+    DiaEspelho, um por dia de vigência do contrato dentro do período.
+    """
+    contratos = carregar_vigencias(data_inicio, data_fim, cpfs)
+
+    # cpf -> {data: (marcações, abonado)}
+    dias_com_registro = {}
+    for cpf, registros in groupby(carregar_marcacoes(data_inicio, data_fim, cpfs), key=lambda r: r[0]):
+        if cpf in contratos:
+            dias_com_registro[cpf] = agrupar_por_dia(((r[1], r[2]) for r in registros), contratos[cpf])
+
+    espelho = {}
+    for cpf, vigencias in contratos.items():
+        dias = espelho.setdefault(cpf, [])
+        registros = dias_com_registro.get(cpf, {})
+        for admissao, fim, turnos in vigencias:
+            data = max(data_inicio, admissao)
+            ultimo = min(data_fim, fim) if fim else data_fim
+            while data <= ultimo:
+                marcacoes, abonado = registros.get(data, ([], False))
+                dias.append(calcular_dia(cpf, data, marcacoes, turnos, abonado, dias_uteis))
+                data += UM_DIA
+    return espelho
+
+
+def totalizar(dias):
+    """Soma os minutos e conta as ocorrências de uma lista de DiaEspelho."""
+    return {
+        'minutos_previstos': sum(d.minutos_previstos for d in dias),
+        'minutos_trabalhados': sum(d.minutos_trabalhados for d in dias),
+        'minutos_atraso': sum(d.minutos_atraso for d in dias),
+        'minutos_extras': sum(d.minutos_extras for d in dias),
+        'minutos_falta': sum(d.minutos_falta for d in dias),
+        'marcacoes_faltantes': sum(1 for d in dias if d.marcacao_faltante),
+        'faltas': sum(1 for d in dias if d.falta),
+    }
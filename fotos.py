@@ -0,0 +1,161 @@
+"""
+Fotos de funcionários: normalização no envio e versões pré-calculadas.
+
+A foto enviada pelo formulário é convertida para JPEG com no máximo
+LADO_MAXIMO_ORIGINAL pixels no lado maior (orientação EXIF aplicada) e salva
+em funcionarios.foto_base64. As versões menores ficam em fotos_versoes,
+indexadas pelo SHA-256 da foto normalizada (funcionarios.foto_hash), de modo
+que fotos iguais compartilham as mesmas versões. Telas e relatórios pedem o
+menor tamanho que atenda à área em que a foto será exibida.
+"""
+import base64
+import binascii
+import hashlib
+from io import BytesIO
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from CustomTypes import Imagem
+from extensions import db
+from models import Funcionario, FotoVersao
+
+# Lado maior, em pixels, da foto original normalizada.
+LADO_MAXIMO_ORIGINAL = 1024
+# Versões pré-calculadas (nome -> lado maior em pixels), da menor para a maior.
+TAMANHOS_FOTO = {'miniatura': 128, 'media': 480}
+QUALIDADE_JPEG = 85
+
+
+def decodificar_foto(valor):
+    """
+    Converte o valor do formulário (data URI ou Base64) em bytes; None se
+    vazio. Imagens e buffers já binários são devolvidos sem cópia.
+    """
+    if not valor:
+        return None
+    if isinstance(valor, Imagem):
+        return valor.dados
+    if isinstance(valor, (bytes, memoryview)):
+        return valor
+    encoded = valor.split(',', 1)[1] if valor.startswith('data:') else valor
+    try:
+        return base64.b64decode(encoded) or None
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f'Foto em Base64 inválida: {e}')
+
+
+def _jpeg(imagem, lado):
+    copia = imagem.copy()
+    copia.thumbnail((lado, lado), Image.LANCZOS)
+    saida = BytesIO()
+    copia.save(saida, format='JPEG', quality=QUALIDADE_JPEG, optimize=True)
+    return saida.getvalue(), copia.size
+
+
+def normalizar_foto(dados):
+    """
+    Retorna (original, versoes): a foto normalizada em JPEG e um dicionário
+    nome -> (bytes, (largura, altura)) com as versões de TAMANHOS_FOTO.
+    """
+    try:
+        imagem = Image.open(BytesIO(dados))
+        imagem = ImageOps.exif_transpose(imagem).convert('RGB')
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError(f'Arquivo de foto não reconhecido: {e}')
+
+    original, _ = _jpeg(imagem, LADO_MAXIMO_ORIGINAL)
+    versoes = {nome: _jpeg(imagem, lado) for nome, lado in TAMANHOS_FOTO.items()}
+    return original, versoes
+
+
+def _gravar_versoes(hash_conteudo, versoes):
+    db.session.execute(
+        pg_insert(FotoVersao).values([
+            {'hash_conteudo': hash_conteudo, 'tamanho': nome, 'dados': dados, 'largura': largura, 'altura': altura}
+            for nome, (dados, (largura, altura)) in versoes.items()
+        ]).on_conflict_do_nothing(index_elements=['hash_conteudo', 'tamanho'])
+    )
+
+
+def salvar_foto(funcionario, valor):
+    """
+    Normaliza a foto recebida do formulário e grava as versões no mesmo
+    commit do funcionário. Valor vazio remove a foto. Se o formulário devolver
+    a mesma foto já salva, nada é recalculado. Lança ValueError se a foto não
+    for uma imagem válida.
+    """
+    dados = decodificar_foto(valor)
+    if dados is None:
+        funcionario.foto_base64 = None
+        funcionario.foto_hash = None
+        return
+    if funcionario.foto_hash and hashlib.sha256(dados).hexdigest() == funcionario.foto_hash:
+        return
+
+    original, versoes = normalizar_foto(dados)
+    hash_conteudo = hashlib.sha256(original).hexdigest()
+    funcionario.foto_base64 = original
+    funcionario.foto_hash = hash_conteudo
+    _gravar_versoes(hash_conteudo, versoes)
+
+
+def escolher_tamanho(lado):
+    """Menor tamanho com pelo menos ``lado`` pixels; 'original' se nenhuma versão bastar."""
+    for nome, lado_versao in TAMANHOS_FOTO.items():
+        if lado_versao >= lado:
+            return nome
+    return 'original'
+
+
+def carregar_foto(cpf, tamanho):
+    """
+    Retorna (hash, bytes) da foto no tamanho pedido, usando a original se a
+    versão ainda não existir. ``bytes`` é None se o funcionário não tiver foto.
+    """
+    hash_conteudo = db.session.query(Funcionario.foto_hash).filter_by(cpf=cpf).scalar()
+    dados = None
+    if hash_conteudo and tamanho != 'original':
+        dados = db.session.query(FotoVersao.dados).filter_by(hash_conteudo=hash_conteudo, tamanho=tamanho).scalar()
+    if dados is None:
+        imagem = db.session.query(Funcionario.foto_base64).filter_by(cpf=cpf).scalar()
+        dados = bytes(imagem) if imagem else None
+    return hash_conteudo, dados or None
+
+
+def gerar_versoes_pendentes(tamanho_lote=100):
+    """
+    Normaliza e gera as versões das fotos ainda sem foto_hash, em lotes com
+    commit a cada lote. Fotos inválidas são mantidas como estão e relatadas.
+    Retorna (processadas, invalidas).
+    """
+    processadas, invalidas = 0, []
+    ultimo_cpf = ''
+    while True:
+        lote = (
+            db.session.query(Funcionario.cpf, Funcionario.foto_base64)
+            .filter(Funcionario.foto_base64.isnot(None), Funcionario.foto_hash.is_(None), Funcionario.cpf > ultimo_cpf)
+            .order_by(Funcionario.cpf)
+            .limit(tamanho_lote)
+            .all()
+        )
+        if not lote:
+            break
+        for cpf, imagem in lote:
+            ultimo_cpf = cpf
+            if not imagem:
+                continue
+            try:
+                original, versoes = normalizar_foto(imagem.dados)
+            except ValueError as e:
+                invalidas.append((cpf, str(e)))
+                continue
+            hash_conteudo = hashlib.sha256(original).hexdigest()
+            db.session.query(Funcionario).filter_by(cpf=cpf).update(
+                {Funcionario.foto_base64: original, Funcionario.foto_hash: hash_conteudo},
+                synchronize_session=False,
+            )
+            _gravar_versoes(hash_conteudo, versoes)
+            processadas += 1
+        db.session.commit()
+    return processadas, invalidas
@@ -0,0 +1,28 @@
+"""
+Normaliza as fotos de funcionários gravadas antes da geração de versões e
+cria as versões reduzidas (miniatura e média) em fotos_versoes.
+
+Uso:
+    python gerar_versoes_fotos.py [--lote 100]
+"""
+import argparse
+
+from app import create_app
+from fotos import gerar_versoes_pendentes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera as versões reduzidas das fotos de funcionários.')
+    parser.add_argument('--lote', type=int, default=100, help='Fotos processadas por transação')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        processadas, invalidas = gerar_versoes_pendentes(args.lote)
+        print(f"{processadas} fotos processadas.")
+        for cpf, erro in invalidas:
+            print(f"Foto inválida do funcionário {cpf}: {erro}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+Histórico salarial (tabela historico_salarial).
+
+O salário e o bônus de um contrato partem de salario_inicial e bonus na
+admissão e são corrigidos, em ordem, pelos reajustes salariais com data dentro
+do contrato. Cada reajuste incide sobre o valor vigente na véspera e o
+resultado é arredondado em centavos. A tabela guarda um período por valor, de
+data_inicio a data_fim (inclusive; vazia enquanto o período estiver em aberto).
+
+O histórico é mantido de forma incremental: a inclusão, edição ou exclusão de
+reajustes e contratos recalcula apenas os funcionários afetados, na mesma
+transação. O recálculo bloqueia antes as linhas dos funcionários (FOR NO KEY
+UPDATE, que não conflita com as chaves estrangeiras de contratos e reajustes),
+de modo que duas transações que alteram o mesmo funcionário recalculam uma
+após a outra, a segunda já vendo o que a primeira gravou. Adiantamentos, APIs
+e relatórios leem os valores vigentes desta tabela em vez de reaplicar os
+reajustes a cada consulta.
+"""
+import datetime
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from sqlalchemy import delete, insert, or_
+
+from extensions import db
+from models import ContratoTrabalho, Funcionario, HistoricoSalarial, ReajusteSalarial
+
+TAMANHO_LOTE = 1000
+CENTAVOS = Decimal('0.01')
+UM_DIA = datetime.timedelta(days=1)
+
+
+def reajustar(valor, percentual):
+    """Valor corrigido pelo percentual, arredondado em centavos."""
+    return (valor * (1 + Decimal(percentual) / 100)).quantize(CENTAVOS, rounding=ROUND_HALF_UP)
+
+
+def calcular_periodos(contratos, reajustes):
+    """
+    Calcula os períodos salariais de um funcionário, como dicionários com as
+    colunas de historico_salarial, a partir dos seus contratos e reajustes.
+
+    Um contrato sem data de demissão termina na véspera da admissão seguinte.
+    Cada reajuste vale para o contrato vigente na sua data; reajustes fora de
+    qualquer contrato são ignorados, e reajustes na mesma data se acumulam em
+    um único período.
+    """
+    contratos = sorted(contratos, key=lambda contrato: (contrato.data_admissao, contrato.id))
+    fins = [
+        contrato.data_demissao if contrato.data_demissao or proximo is None else proximo.data_admissao - UM_DIA
+        for contrato, proximo in zip(contratos, contratos[1:] + [None])
+    ]
+
+    reajustes_por_contrato = defaultdict(list)
+    for reajuste in sorted(reajustes, key=lambda reajuste: (reajuste.data_alteracao, reajuste.id)):
+        for contrato, fim in zip(reversed(contratos), reversed(fins)):
+            if contrato.data_admissao <= reajuste.data_alteracao and (fim is None or reajuste.data_alteracao <= fim):
+                reajustes_por_contrato[contrato.id].append(reajuste)
+                break
+
+    periodos = []
+    for contrato, fim in zip(contratos, fins):
+        if fim is not None and fim < contrato.data_admissao:
+            continue  # Contrato sem nenhum dia de vigência
+        salario = Decimal(contrato.salario_inicial)
+        bonus = Decimal(contrato.bonus or 0)
+        periodo = {
+            'contrato_id': contrato.id, 'cpf_funcionario': contrato.cpf_funcionario,
+            'data_inicio': contrato.data_admissao, 'salario': salario, 'bonus': bonus,
+        }
+        periodos.append(periodo)
+        for reajuste in reajustes_por_contrato[contrato.id]:
+            salario = reajustar(salario, reajuste.percentual_reajuste_salario)
+            bonus = reajustar(bonus, reajuste.percentual_reajuste_bonus)
+            if reajuste.data_alteracao > periodo['data_inicio']:
+                periodo['data_fim'] = reajuste.data_alteracao - UM_DIA
+                periodo = dict(periodo, data_inicio=reajuste.data_alteracao)
+                periodos.append(periodo)
+            periodo['salario'], periodo['bonus'] = salario, bonus
+        periodo['data_fim'] = fim
+    return periodos
+
+
+def atualizar_historico_salarial(cpfs):
+    """
+    Recalcula o histórico dos funcionários informados a partir dos contratos
+    e reajustes atuais, com uma consulta por tabela para todos eles. Ao mudar
+    o funcionário de um contrato ou reajuste, informe o CPF antigo e o novo.
+    Bloqueia os funcionários até o fim da transação. Retorna a quantidade de
+    períodos gravados. Não faz commit.
+    """
+    cpfs = {cpf for cpf in cpfs if cpf}
+    if not cpfs:
+        return 0
+    # As alterações pendentes da sessão precisam estar no banco antes da leitura
+    db.session.flush()
+    # Em ordem de CPF, para que transações com funcionários em comum não entrem em deadlock
+    db.session.query(Funcionario.cpf).filter(Funcionario.cpf.in_(cpfs)).order_by(Funcionario.cpf).with_for_update(
+        key_share=True
+    ).all()
+
+    contratos = defaultdict(list)
+    for contrato in db.session.query(
+        ContratoTrabalho.id, ContratoTrabalho.cpf_funcionario, ContratoTrabalho.data_admissao,
+        ContratoTrabalho.data_demissao, ContratoTrabalho.salario_inicial, ContratoTrabalho.bonus,
+    ).filter(ContratoTrabalho.cpf_funcionario.in_(cpfs)):
+        contratos[contrato.cpf_funcionario].append(contrato)
+    reajustes = defaultdict(list)
+    for reajuste in db.session.query(
+        ReajusteSalarial.id, ReajusteSalarial.cpf_funcionario, ReajusteSalarial.data_alteracao,
+        ReajusteSalarial.percentual_reajuste_salario, ReajusteSalarial.percentual_reajuste_bonus,
+    ).filter(ReajusteSalarial.cpf_funcionario.in_(cpfs)):
+        reajustes[reajuste.cpf_funcionario].append(reajuste)
+
+    periodos = []
+    for cpf, contratos_funcionario in contratos.items():
+        periodos.extend(calcular_periodos(contratos_funcionario, reajustes[cpf]))
+
+    ids_contratos = [contrato.id for lista in contratos.values() for contrato in lista]
+    db.session.execute(
+        delete(HistoricoSalarial)
+        .where(or_(HistoricoSalarial.cpf_funcionario.in_(cpfs), HistoricoSalarial.contrato_id.in_(ids_contratos)))
+        .execution_options(synchronize_session=False)
+    )
+    if periodos:
+        db.session.execute(insert(HistoricoSalarial), periodos)
+    return len(periodos)
+
+
+def reconstruir_historico_salarial(tamanho_lote=TAMANHO_LOTE):
+    """
+    Apaga e recalcula o histórico de todos os funcionários com contrato, em
+    lotes de CPFs. Retorna a quantidade de períodos gravados. Não faz commit.
+    """
+    db.session.execute(delete(HistoricoSalarial).execution_options(synchronize_session=False))
+    cpfs = [cpf for cpf, in db.session.query(ContratoTrabalho.cpf_funcionario).distinct().order_by(ContratoTrabalho.cpf_funcionario)]
+    return sum(
+        atualizar_historico_salarial(cpfs[inicio:inicio + tamanho_lote])
+        for inicio in range(0, len(cpfs), tamanho_lote)
+    )
+
+
+def _vigente_em(data):
+    return (
+        HistoricoSalarial.data_inicio <= data,
+        or_(HistoricoSalarial.data_fim.is_(None), HistoricoSalarial.data_fim >= data),
+    )
+
+
+def salarios_vigentes(cpfs, data):
+    """
+    Dicionário {cpf: (salario, bonus)} vigentes na data, em uma consulta. Com
+    cpfs None, traz todos os funcionários; quem não tinha contrato vigente na
+    data fica de fora.
+    """
+    consulta = (
+        db.session.query(HistoricoSalarial.cpf_funcionario, HistoricoSalarial.salario, HistoricoSalarial.bonus)
+        .filter(*_vigente_em(data))
+        .distinct(HistoricoSalarial.cpf_funcionario)
+        .order_by(HistoricoSalarial.cpf_funcionario, HistoricoSalarial.data_inicio.desc())
+    )
+    if cpfs is not None:
+        cpfs = set(cpfs)
+        if not cpfs:
+            return {}
+        consulta = consulta.filter(HistoricoSalarial.cpf_funcionario.in_(cpfs))
+    return {cpf: (salario, bonus) for cpf, salario, bonus in consulta}
+
+
+def salario_vigente(cpf, data):
+    """(salario, bonus) do funcionário vigentes na data, ou None."""
+    return salarios_vigentes([cpf], data).get(cpf)
+
+
+def periodos_salariais(cpfs, inicio, fim):
+    """
+    Dicionário {cpf: [HistoricoSalarial, ...]} com os períodos, em ordem, que
+    se sobrepõem ao intervalo de inicio a fim (inclusive). Com cpfs None,
+    traz todos os funcionários.
+    """
+    consulta = (
+        db.session.query(HistoricoSalarial)
+        .filter(HistoricoSalarial.data_inicio <= fim)
+        .filter(or_(HistoricoSalarial.data_fim.is_(None), HistoricoSalarial.data_fim >= inicio))
+        .order_by(HistoricoSalarial.cpf_funcionario, HistoricoSalarial.data_inicio)
+    )
+    if cpfs is not None:
+        consulta = consulta.filter(HistoricoSalarial.cpf_funcionario.in_(set(cpfs)))
+    periodos = defaultdict(list)
+    for periodo in consulta:
+        periodos[periodo.cpf_funcionario].append(periodo)
+    return dict(periodos)
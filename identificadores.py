@@ -0,0 +1,142 @@
+"""
+Resolução de funcionários por CPF, PIS ou IDFace.
+
+Cada identificador é procurado por uma coluna com índice único: o CPF (chave
+primária, salvo só com dígitos), funcionarios.pis_digitos (coluna gerada com
+os dígitos do PIS, que é salvo formatado) e o IDFace. Os resultados ficam em
+um cache LRU limitado, compartilhado por formulários, API e importadores, e
+as entradas de um funcionário são descartadas quando ele é incluído, editado
+ou excluído (``invalidar``). Como o cache é por processo, as entradas também
+expiram após VALIDADE_CACHE segundos, para que edições feitas em outro
+processo sejam vistas.
+
+Apenas funcionários encontrados são guardados: um identificador desconhecido
+volta a ser consultado, pois pode ser cadastrado a qualquer momento.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import or_
+
+from extensions import db
+from models import Funcionario
+
+CAMPOS_IDENTIFICADOR = ('cpf', 'pis', 'id_face')
+# Quantidade máxima de identificadores guardados no cache.
+TAMANHO_CACHE = 50000
+# Segundos até uma entrada do cache ser consultada novamente no banco.
+VALIDADE_CACHE = 300
+# Limite de valores por cláusula IN.
+TAMANHO_BLOCO_IN = 1000
+
+_cache = OrderedDict()  # (campo, valor) -> (expira_em, (cpf, pis, id_face))
+_chaves_por_cpf = {}    # cpf -> chaves do cache que apontam para o funcionário
+_trava = threading.Lock()
+
+
+def somente_digitos(valor):
+    return ''.join(filter(str.isdigit, valor or ''))
+
+
+def normalizar(campo, valor):
+    """Forma usada na busca: só dígitos para CPF e PIS, sem espaços nas pontas para o IDFace."""
+    if valor is None:
+        return ''
+    valor = str(valor).strip()
+    return valor if campo == 'id_face' else somente_digitos(valor)
+
+
+def _guardar(chave, dados, agora):
+    _cache[chave] = (agora + VALIDADE_CACHE, dados)
+    _cache.move_to_end(chave)
+    _chaves_por_cpf.setdefault(dados[0], set()).add(chave)
+    while len(_cache) > TAMANHO_CACHE:
+        antiga, (_, dados_antigos) = _cache.popitem(last=False)
+        chaves = _chaves_por_cpf.get(dados_antigos[0])
+        if chaves is not None:
+            chaves.discard(antiga)
+            if not chaves:
+                del _chaves_por_cpf[dados_antigos[0]]
+
+
+def resolver_varios(chaves):
+    """
+    Resolve pares (campo, valor normalizado) e retorna um dicionário
+    (campo, valor) -> (cpf, pis, id_face) apenas com os encontrados. Os pares
+    fora do cache são buscados em uma consulta por bloco, cada identificador
+    pelo seu índice único.
+    """
+    encontrados, faltantes = {}, []
+    agora = time.monotonic()
+    with _trava:
+        for chave in set(chaves):
+            if not chave[1]:
+                continue
+            entrada = _cache.get(chave)
+            if entrada is not None and entrada[0] > agora:
+                _cache.move_to_end(chave)
+                encontrados[chave] = entrada[1]
+            else:
+                faltantes.append(chave)
+
+    for inicio in range(0, len(faltantes), TAMANHO_BLOCO_IN):
+        bloco = faltantes[inicio:inicio + TAMANHO_BLOCO_IN]
+        valores = {campo: [v for c, v in bloco if c == campo] for campo in CAMPOS_IDENTIFICADOR}
+        condicoes = []
+        if valores['cpf']:
+            condicoes.append(Funcionario.cpf.in_(valores['cpf']))
+        if valores['pis']:
+            condicoes.append(Funcionario.pis_digitos.in_(valores['pis']))
+        if valores['id_face']:
+            condicoes.append(Funcionario.id_face.in_(valores['id_face']))
+        consulta = db.session.query(
+            Funcionario.cpf, Funcionario.pis, Funcionario.pis_digitos, Funcionario.id_face
+        ).filter(or_(*condicoes))
+
+        pedidos = set(bloco)
+        novos = {}
+        for cpf, pis, pis_digitos, id_face in consulta:
+            dados = (cpf, pis, id_face)
+            for chave in (('cpf', cpf), ('pis', pis_digitos), ('id_face', id_face)):
+                if chave in pedidos:
+                    novos[chave] = dados
+        encontrados.update(novos)
+        with _trava:
+            for chave, dados in novos.items():
+                _guardar(chave, dados, agora)
+    return encontrados
+
+
+def resolver(campo, valor):
+    """Funcionário (cpf, pis, id_face) com o identificador informado, ou None."""
+    chave = (campo, normalizar(campo, valor))
+    return resolver_varios([chave]).get(chave)
+
+
+def resolver_primeiro(*pares):
+    """
+    Resolve vários pares (campo, valor), em uma única consulta, e retorna o
+    funcionário do primeiro par encontrado, na ordem informada, ou None.
+    """
+    chaves = [(campo, normalizar(campo, valor)) for campo, valor in pares]
+    encontrados = resolver_varios(chaves)
+    return next((encontrados[chave] for chave in chaves if chave in encontrados), None)
+
+
+def resolver_identificador(valor):
+    """Resolve um identificador digitado sem saber o tipo: tenta CPF, PIS e IDFace, nessa ordem."""
+    return resolver_primeiro(*((campo, valor) for campo in CAMPOS_IDENTIFICADOR))
+
+
+def invalidar(cpf):
+    """Descarta do cache as entradas do funcionário (após incluir, editar ou excluir)."""
+    with _trava:
+        for chave in _chaves_por_cpf.pop(cpf, ()):
+            _cache.pop(chave, None)
+
+
+def limpar_cache():
+    with _trava:
+        _cache.clear()
+        _chaves_por_cpf.clear()
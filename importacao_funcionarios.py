@@ -0,0 +1,382 @@
+"""
+Importação em lote de funcionários e contratos a partir de planilhas CSV ou XLSX.
+
+A planilha tem uma linha de cabeçalho com os nomes das colunas (sem
+diferenciar maiúsculas e acentos; ver COLUNAS_FUNCIONARIO e COLUNAS_CONTRATO)
+e uma linha por funcionário, opcionalmente com o contrato de trabalho. As
+linhas são lidas em fluxo e validadas em lotes: dígitos verificadores de CPF e
+PIS, campos obrigatórios, datas, valores, tamanho dos campos, duplicidades na
+própria planilha e no banco (uma consulta por lote) e setores, funções e
+jornadas cadastrados. Todos os erros são relatados de uma vez, com o número da
+linha, e as linhas válidas são gravadas com INSERTs de várias linhas, com
+commit a cada lote. Ao final é gravado um único registro de auditoria.
+"""
+import csv
+import datetime
+import os
+import unicodedata
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from sqlalchemy import or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from extensions import db
+from models import ContratoTrabalho, Funcao, Funcionario, Jornada, LogAuditoria, Setor
+from historico_salarial import atualizar_historico_salarial
+from identificadores import invalidar, somente_digitos
+from quadro_pessoal import invalidar as invalidar_quadro_pessoal
+from validacao import validar_cpfs, validar_pis
+
+# Quantidade de linhas validadas e gravadas por lote (uma transação por lote).
+TAMANHO_LOTE = 1000
+EXTENSOES = ('.csv', '.xlsx')
+
+COLUNAS_FUNCIONARIO = (
+    'cpf', 'nome', 'data_nascimento', 'sexo', 'pis', 'id_face', 'endereco', 'bairro', 'cidade',
+    'estado', 'cep', 'telefone', 'grau_instrucao', 'codigo_banco', 'nome_banco', 'codigo_agencia',
+    'numero_conta', 'variacao_conta', 'chave_pix', 'observacao',
+)
+COLUNAS_CONTRATO = (
+    'setor', 'funcao', 'jornada_id', 'salario_inicial', 'bonus', 'regime_contratacao',
+    'data_admissao', 'data_demissao',
+)
+OBRIGATORIAS_FUNCIONARIO = ('cpf', 'nome', 'data_nascimento')
+# Exigidas quando a linha traz algum campo de contrato.
+OBRIGATORIAS_CONTRATO = ('setor', 'funcao', 'salario_inicial', 'regime_contratacao', 'data_admissao')
+REGIMES_CONTRATACAO = ('Salário Fixo', 'Escala 12x36', 'Comissão', 'Produção')
+
+# Outros nomes aceitos no cabeçalho (já normalizados).
+SINONIMOS_COLUNAS = {
+    'nascimento': 'data_nascimento',
+    'pis_pasep': 'pis',
+    'idface': 'id_face',
+    'uf': 'estado',
+    'jornada': 'jornada_id',
+    'salario': 'salario_inicial',
+    'regime': 'regime_contratacao',
+    'admissao': 'data_admissao',
+    'demissao': 'data_demissao',
+}
+
+FORMATOS_DATA = ('%d/%m/%Y', '%Y-%m-%d')
+
+
+def _normalizar_coluna(nome):
+    """'Data de Nascimento' -> 'data_de_nascimento' -> sinônimo, sem acentos."""
+    nome = unicodedata.normalize('NFKD', str(nome or '')).encode('ascii', 'ignore').decode()
+    nome = '_'.join(nome.lower().replace('-', ' ').replace('/', ' ').split())
+    nome = nome.replace('_de_', '_').replace('_do_', '_').replace('_da_', '_')
+    return SINONIMOS_COLUNAS.get(nome, nome)
+
+
+def _texto(valor):
+    """Valor de célula como texto sem espaços nas pontas ('' para vazio)."""
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _ler_csv(caminho):
+    with open(caminho, 'rb') as arquivo:
+        amostra = arquivo.read(65536)
+    try:
+        amostra.decode('utf-8')
+        codificacao = 'utf-8-sig'
+    except UnicodeDecodeError:
+        codificacao = 'latin-1'
+    texto = amostra.decode(codificacao, errors='ignore')
+    primeira_linha = texto.splitlines()[0] if texto else ''
+    delimitador = max(';,\t', key=primeira_linha.count)
+
+    with open(caminho, newline='', encoding=codificacao) as arquivo:
+        leitor = csv.reader(arquivo, delimiter=delimitador)
+        yield from leitor
+
+
+def _ler_xlsx(caminho):
+    from openpyxl import load_workbook
+
+    livro = load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        yield from livro.active.iter_rows(values_only=True)
+    finally:
+        livro.close()
+
+
+def ler_planilha(caminho):
+    """
+    Gera (número da linha, dicionário coluna -> valor) para cada linha de
+    dados, com as colunas normalizadas. Linhas vazias são ignoradas. Lança
+    ValueError para extensão não suportada ou planilha sem cabeçalho.
+    """
+    extensao = os.path.splitext(caminho)[1].lower()
+    if extensao not in EXTENSOES:
+        raise ValueError('Formato de arquivo não suportado. Envie uma planilha CSV ou XLSX.')
+    linhas = _ler_xlsx(caminho) if extensao == '.xlsx' else _ler_csv(caminho)
+
+    cabecalho = next(linhas, None)
+    if not cabecalho:
+        raise ValueError('A planilha está vazia.')
+    colunas = [_normalizar_coluna(nome) for nome in cabecalho]
+    if 'cpf' not in colunas:
+        raise ValueError('A planilha não tem a coluna CPF no cabeçalho.')
+
+    for numero, valores in enumerate(linhas, start=2):
+        if not any(_texto(valor) for valor in valores):
+            continue
+        yield numero, dict(zip(colunas, valores))
+
+
+def _data(valor):
+    if isinstance(valor, datetime.datetime):
+        return valor.date()
+    if isinstance(valor, datetime.date):
+        return valor
+    valor = _texto(valor)
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.datetime.strptime(valor, formato).date()
+        except ValueError:
+            pass
+    raise ValueError
+
+
+def _decimal(valor):
+    if isinstance(valor, (int, float, Decimal)):
+        return Decimal(str(valor)).quantize(Decimal('0.01'))
+    texto = _texto(valor).replace('R$', '').replace(' ', '')
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        return Decimal(texto).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError
+
+
+def _validar_linha(valores, sexos, graus_instrucao, setores, funcoes, jornadas):
+    """
+    Valida uma linha isoladamente. Retorna (funcionario, contrato, erros):
+    os dicionários prontos para o INSERT (contrato None se a linha não tiver
+    contrato) e a lista de mensagens de erro.
+    """
+    erros = []
+    textos = {coluna: _texto(valores.get(coluna)) for coluna in COLUNAS_FUNCIONARIO + COLUNAS_CONTRATO}
+
+    for coluna in OBRIGATORIAS_FUNCIONARIO:
+        if not textos[coluna]:
+            erros.append(f'{coluna} é obrigatório')
+
+    funcionario = {coluna: textos[coluna] or None for coluna in COLUNAS_FUNCIONARIO}
+    # CPF e PIS numéricos em planilhas perdem os zeros à esquerda
+    # (os dígitos verificadores são conferidos para o lote inteiro em importar_funcionarios)
+    funcionario['cpf'] = somente_digitos(textos['cpf']).zfill(11) if textos['cpf'] else ''
+    if textos['pis'].isdigit():
+        funcionario['pis'] = textos['pis'].zfill(11)
+    if textos['data_nascimento']:
+        try:
+            funcionario['data_nascimento'] = _data(valores.get('data_nascimento'))
+        except ValueError:
+            erros.append(f"data_nascimento inválida: {textos['data_nascimento']}")
+    if sexos and textos['sexo'] and textos['sexo'] not in sexos:
+        erros.append(f"sexo inválido: {textos['sexo']}")
+    if graus_instrucao and textos['grau_instrucao'] and textos['grau_instrucao'] not in graus_instrucao:
+        erros.append(f"grau_instrucao inválido: {textos['grau_instrucao']}")
+    if not (textos['chave_pix'] or all(textos[c] for c in ('codigo_banco', 'nome_banco', 'codigo_agencia', 'numero_conta'))):
+        erros.append('preencha a chave_pix OU todos os campos bancários')
+    for coluna in COLUNAS_FUNCIONARIO:
+        tamanho = getattr(Funcionario.__table__.c[coluna].type, 'length', None)
+        if tamanho and isinstance(funcionario[coluna], str) and len(funcionario[coluna]) > tamanho:
+            erros.append(f'{coluna} excede {tamanho} caracteres')
+
+    contrato = None
+    if any(textos[coluna] for coluna in COLUNAS_CONTRATO):
+        contrato = {coluna: textos[coluna] or None for coluna in COLUNAS_CONTRATO}
+        # Setor e função pelo nome na planilha, gravados pelo id do cadastro
+        contrato['setor_id'] = setores.get(contrato.pop('setor'))
+        contrato['funcao_id'] = funcoes.get(contrato.pop('funcao'))
+        for coluna in OBRIGATORIAS_CONTRATO:
+            if not textos[coluna]:
+                erros.append(f'{coluna} é obrigatório para o contrato')
+        if textos['setor'] and textos['setor'] not in setores:
+            erros.append(f"setor não cadastrado: {textos['setor']}")
+        if textos['funcao'] and textos['funcao'] not in funcoes:
+            erros.append(f"função não cadastrada: {textos['funcao']}")
+        if textos['regime_contratacao'] and textos['regime_contratacao'] not in REGIMES_CONTRATACAO:
+            erros.append(f"regime_contratacao inválido: {textos['regime_contratacao']}")
+        if textos['jornada_id']:
+            if not textos['jornada_id'].isdigit() or int(textos['jornada_id']) not in jornadas:
+                erros.append(f"jornada não cadastrada: {textos['jornada_id']}")
+            else:
+                contrato['jornada_id'] = int(textos['jornada_id'])
+        for coluna in ('salario_inicial', 'bonus'):
+            if textos[coluna]:
+                try:
+                    contrato[coluna] = _decimal(valores.get(coluna))
+                except ValueError:
+                    erros.append(f'{coluna} inválido: {textos[coluna]}')
+        contrato['bonus'] = contrato['bonus'] or Decimal('0.00')
+        for coluna in ('data_admissao', 'data_demissao'):
+            if textos[coluna]:
+                try:
+                    contrato[coluna] = _data(valores.get(coluna))
+                except ValueError:
+                    erros.append(f'{coluna} inválida: {textos[coluna]}')
+        if (isinstance(contrato['data_admissao'], datetime.date) and isinstance(contrato['data_demissao'], datetime.date)
+                and contrato['data_demissao'] < contrato['data_admissao']):
+            erros.append('data_demissao anterior à data_admissao')
+        contrato['status'] = contrato['data_demissao'] is None
+        funcionario['status'] = 'Ativo' if contrato['status'] else 'Inativo'
+    else:
+        funcionario['status'] = ''
+
+    return funcionario, contrato, erros
+
+
+def _existentes(funcionarios):
+    """CPFs, PIS (dígitos) e IDFaces do lote já cadastrados, em uma consulta."""
+    cpfs = [f['cpf'] for f in funcionarios]
+    pis = [somente_digitos(f['pis']) for f in funcionarios if f['pis']]
+    ids_face = [f['id_face'] for f in funcionarios if f['id_face']]
+    condicoes = [Funcionario.cpf.in_(cpfs)]
+    if pis:
+        condicoes.append(Funcionario.pis_digitos.in_(pis))
+    if ids_face:
+        condicoes.append(Funcionario.id_face.in_(ids_face))
+    existentes = {'cpf': set(), 'pis': set(), 'id_face': set()}
+    for cpf, pis_digitos, id_face in db.session.query(
+        Funcionario.cpf, Funcionario.pis_digitos, Funcionario.id_face
+    ).filter(or_(*condicoes)):
+        existentes['cpf'].add(cpf)
+        existentes['pis'].add(pis_digitos)
+        existentes['id_face'].add(id_face)
+    return existentes
+
+
+def _gravar_lote(validas):
+    """
+    Grava os funcionários e contratos válidos do lote. Retorna o conjunto de
+    CPFs efetivamente incluídos (um cadastro concorrente pode ter ocupado o
+    CPF, PIS ou IDFace entre a validação e o INSERT). Não faz commit.
+    """
+    if not validas:
+        return set()
+    # Lista de parâmetros em vez de .values(): o comando é compilado uma vez e
+    # o SQLAlchemy o envia em INSERTs de várias linhas (insertmanyvalues).
+    inseridos = set(db.session.execute(
+        pg_insert(Funcionario.__table__).on_conflict_do_nothing().returning(Funcionario.cpf),
+        [funcionario for _, funcionario, _ in validas],
+    ).scalars())
+    contratos = [
+        dict(contrato, cpf_funcionario=funcionario['cpf'])
+        for _, funcionario, contrato in validas
+        if contrato is not None and funcionario['cpf'] in inseridos
+    ]
+    if contratos:
+        db.session.execute(ContratoTrabalho.__table__.insert(), contratos)
+        atualizar_historico_salarial([contrato['cpf_funcionario'] for contrato in contratos])
+    return inseridos
+
+
+def importar_funcionarios(caminho, usuario_id, nome_arquivo=None, sexos=(), graus_instrucao=(),
+                          tamanho_lote=TAMANHO_LOTE):
+    """
+    Importa a planilha em ``caminho``. ``sexos`` e ``graus_instrucao`` são os
+    valores aceitos nessas colunas (os mesmos do formulário; vazio aceita
+    qualquer valor). Retorna um resumo com as quantidades de linhas lidas,
+    funcionários e contratos incluídos e a lista de erros como pares (linha,
+    mensagem). Lança ValueError se a planilha não puder ser lida.
+    """
+    nome_arquivo = nome_arquivo or os.path.basename(caminho)
+    setores = dict(db.session.query(Setor.nome, Setor.id))
+    funcoes = dict(db.session.query(Funcao.nome, Funcao.id))
+    jornadas = {id for (id,) in db.session.query(Jornada.id)}
+    sexos, graus_instrucao = set(sexos), set(graus_instrucao)
+
+    resumo = {'linhas': 0, 'funcionarios': 0, 'contratos': 0, 'erros': []}
+    # Identificadores já usados por linhas anteriores da planilha
+    vistos = {'cpf': {}, 'pis': {}, 'id_face': {}}
+    cpfs_incluidos = []
+
+    linhas = ler_planilha(caminho)
+    while True:
+        lote = list(islice(linhas, tamanho_lote))
+        if not lote:
+            break
+        resumo['linhas'] += len(lote)
+
+        lidas = [
+            (numero, valores) + _validar_linha(valores, sexos, graus_instrucao, setores, funcoes, jornadas)
+            for numero, valores in lote
+        ]
+        chaves_lote = [
+            {'cpf': funcionario['cpf'], 'pis': somente_digitos(funcionario['pis']), 'id_face': funcionario['id_face']}
+            for _, _, funcionario, _, _ in lidas
+        ]
+        cpfs_validos = validar_cpfs([chaves['cpf'] for chaves in chaves_lote])
+        pis_validos = validar_pis([chaves['pis'] for chaves in chaves_lote])
+
+        validadas = []
+        for (numero, valores, funcionario, contrato, erros), chaves, cpf_valido, pis_valido in zip(
+            lidas, chaves_lote, cpfs_validos, pis_validos
+        ):
+            if chaves['cpf'] and not cpf_valido:
+                erros.insert(0, f"CPF inválido: {_texto(valores.get('cpf'))}")
+            if funcionario['pis'] and not pis_valido:
+                erros.append(f"PIS inválido: {_texto(valores.get('pis'))}")
+            for campo, valor in chaves.items():
+                if valor and valor in vistos[campo]:
+                    erros.append(f'{campo} repetido na planilha (linha {vistos[campo][valor]})')
+                elif valor:
+                    vistos[campo][valor] = numero
+            validadas.append((numero, funcionario, contrato, erros, chaves))
+
+        candidatas = [v for v in validadas if not v[3]]
+        existentes = _existentes([funcionario for _, funcionario, _, _, _ in candidatas]) if candidatas else {}
+        validas = []
+        for numero, funcionario, contrato, erros, chaves in validadas:
+            if not erros:
+                for campo, valor in chaves.items():
+                    if valor and valor in existentes[campo]:
+                        erros.append(f'{campo} já cadastrado: {valor}')
+            if erros:
+                resumo['erros'].append((numero, '; '.join(erros)))
+            else:
+                validas.append((numero, funcionario, contrato))
+
+        try:
+            inseridos = _gravar_lote(validas)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"ERROR (IMPORTAÇÃO): Falha ao gravar o lote: {e}")
+            resumo['erros'].extend((numero, f'Erro ao gravar a linha: {e}') for numero, _, _ in validas)
+            continue
+        for numero, funcionario, contrato in validas:
+            if funcionario['cpf'] in inseridos:
+                cpfs_incluidos.append(funcionario['cpf'])
+                resumo['funcionarios'] += 1
+                resumo['contratos'] += contrato is not None
+                invalidar(funcionario['cpf'])
+            else:
+                resumo['erros'].append((numero, 'CPF, PIS ou IDFace cadastrado durante a importação'))
+        invalidar_quadro_pessoal(*(
+            contrato['data_admissao'] for _, funcionario, contrato in validas
+            if contrato is not None and funcionario['cpf'] in inseridos
+        ))
+
+    resumo['erros'].sort()
+    if resumo['funcionarios']:
+        db.session.add(LogAuditoria(
+            usuario_id=usuario_id,
+            acao=(
+                f"Importação da planilha {nome_arquivo}: {resumo['funcionarios']} funcionários e "
+                f"{resumo['contratos']} contratos adicionados, {len(resumo['erros'])} linhas com erro."
+            ),
+            tabela_afetada='funcionarios',
+            dados_novos={'arquivo': nome_arquivo, 'cpfs': cpfs_incluidos},
+        ))
+        db.session.commit()
+    return resumo
@@ -0,0 +1,572 @@
+"""
+Importação em lote de marcações de ponto a partir de arquivos AFD.
+
+As marcações chegam do leitor em fluxo (``afd.ler_marcacoes``) e são
+processadas em lotes, sem carregar o arquivo inteiro em memória. Para cada
+lote os funcionários são resolvidos com poucas consultas e as marcações são
+gravadas com INSERT ... ON CONFLICT DO NOTHING de várias linhas, apoiado no
+índice único (cpf_funcionario, data_hora) de registro_ponto.
+
+Arquivos com cabeçalho identificam o REP pelo número de fabricação. Para cada
+relógio é guardado o maior NSR já importado (RelogioPonto.ultimo_nsr), e as
+importações seguintes leem apenas as marcações posteriores a ele;
+``desde_nsr`` reprocessa um relógio a partir de um NSR anterior. Marcações
+sem funcionário correspondente (PIS não cadastrado, crachás de visitante)
+ficam em marcacoes_pendentes, sem segurar a marca d'água, e são gravadas na
+primeira importação do relógio depois que o funcionário for cadastrado.
+
+Vários arquivos (um ZIP ou diretório com os AFDs de todos os relógios) são
+importados em paralelo por um pool de processos: cada processo lê, interpreta
+e grava os arquivos de um relógio, com conexão e transação próprias.
+
+Lotes enviados em JSON por relógios e integrações (``registrar_marcacoes_api``)
+usam a mesma gravação idempotente, com os funcionários identificados por CPF,
+PIS ou IDFace. Em todos os casos os funcionários são resolvidos pelo módulo
+identificadores.
+"""
+import datetime
+import multiprocessing
+import os
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
+
+from flask import Flask, current_app
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from werkzeug.utils import secure_filename
+
+from extensions import db
+from models import MarcacaoPendente, RegistroPonto, RelogioPonto
+from afd import ler_cabecalho, ler_marcacoes
+from identificadores import CAMPOS_IDENTIFICADOR, normalizar, resolver_varios
+from resumo_ponto import atualizar_resumo_diario, dias_afetados, recalcular_dias
+
+# Quantidade de marcações processadas por lote.
+TAMANHO_LOTE = 5000
+# Limite de valores por cláusula IN nas consultas de apoio.
+TAMANHO_BLOCO_IN = 1000
+# Máximo de linhas por comando INSERT ... ON CONFLICT.
+TAMANHO_BLOCO_INSERT = 1000
+
+
+def _blocos(valores, tamanho=TAMANHO_BLOCO_IN):
+    """Divide uma sequência em listas de no máximo ``tamanho`` itens."""
+    valores = list(valores)
+    for i in range(0, len(valores), tamanho):
+        yield valores[i:i + tamanho]
+
+
+def _candidatos_cpf(pis_campo):
+    """
+    Alguns relógios registram o CPF no campo PIS com zeros à esquerda, ou com
+    um zero extra para completar 12 dígitos. Retorna as duas formas de CPF
+    possíveis para comparar com o CPF salvo no banco.
+    """
+    return pis_campo.lstrip('0'), pis_campo[-11:]
+
+
+def _chaves_marcacao(pis_campo):
+    """
+    Identificadores a procurar para o campo PIS/CPF de uma marcação, na ordem
+    de prioridade: o PIS (como veio e com 11 dígitos) e depois o CPF.
+    """
+    cpf_possivel, cpf_completo = _candidatos_cpf(pis_campo)
+    return [('pis', pis_campo), ('pis', pis_campo[-11:]), ('cpf', cpf_possivel), ('cpf', cpf_completo)]
+
+
+def _resolver_funcionarios(pis_campos, cache):
+    """
+    Completa ``cache`` (pis_campo -> (cpf, id_face) ou None) com os campos
+    ainda não resolvidos, pelo resolvedor compartilhado de identificadores.
+    A correspondência pelo PIS tem prioridade sobre a correspondência pelo CPF.
+    """
+    novos = [p for p in pis_campos if p not in cache]
+    if not novos:
+        return
+    encontrados = resolver_varios(chave for p in novos for chave in _chaves_marcacao(normalizar('pis', p)))
+    for pis_campo in novos:
+        dados = next(
+            (encontrados[chave] for chave in _chaves_marcacao(normalizar('pis', pis_campo)) if chave in encontrados),
+            None,
+        )
+        cache[pis_campo] = (dados[0], dados[2]) if dados else None
+
+
+def _inserir_marcacoes(registros):
+    """
+    Como ``gravar_marcacoes``, sem atualizar o resumo diário; retorna o
+    conjunto de chaves (cpf_funcionario, data_hora) efetivamente inseridas.
+    """
+    inseridas = set()
+    for bloco in _blocos(registros, TAMANHO_BLOCO_INSERT):
+        stmt = pg_insert(RegistroPonto).values(bloco).on_conflict_do_nothing(
+            index_elements=['cpf_funcionario', 'data_hora']
+        ).returning(RegistroPonto.cpf_funcionario, RegistroPonto.data_hora)
+        inseridas.update(tuple(linha) for linha in db.session.execute(stmt))
+    return inseridas
+
+
+def gravar_marcacoes(registros):
+    """
+    Grava registros de ponto (dicionários com as colunas de RegistroPonto, todos
+    com as mesmas chaves) ignorando os que já existem para o mesmo funcionário
+    e data/hora, e atualiza o resumo diário dos dias afetados. Não faz commit.
+    Retorna a quantidade de registros inseridos.
+    """
+    inseridas = _inserir_marcacoes(registros)
+    atualizar_resumo_diario(inseridas)
+    return len(inseridas)
+
+
+def _guardar_pendentes(pendentes):
+    """Guarda as marcações sem funcionário correspondente, ignorando as já guardadas."""
+    for bloco in _blocos(pendentes, TAMANHO_BLOCO_INSERT):
+        db.session.execute(
+            pg_insert(MarcacaoPendente).values(bloco).on_conflict_do_nothing(index_elements=['pis', 'data_hora'])
+        )
+
+
+def _importar_pendentes(relogio_id, funcionarios, resumo, dias):
+    """
+    Grava as marcações pendentes do relógio (None: de arquivos sem cabeçalho)
+    cujo funcionário já foi cadastrado, retirando-as de marcacoes_pendentes.
+    As quantidades são somadas às inseridas e já existentes de ``resumo``.
+    """
+    if relogio_id is None:
+        do_relogio = MarcacaoPendente.relogio_id.is_(None)
+    else:
+        do_relogio = MarcacaoPendente.relogio_id == relogio_id
+    campos = db.session.execute(select(MarcacaoPendente.pis).where(do_relogio).distinct()).scalars().all()
+    _resolver_funcionarios(campos, funcionarios)
+
+    novos = []
+    for bloco in _blocos(campo for campo in campos if funcionarios[campo] is not None):
+        encontradas = db.session.execute(
+            delete(MarcacaoPendente)
+            .where(do_relogio, MarcacaoPendente.pis.in_(bloco))
+            .returning(MarcacaoPendente.pis, MarcacaoPendente.data_hora, MarcacaoPendente.tipo_lancamento)
+        )
+        for pis_campo, data_hora, tipo_lancamento in encontradas:
+            cpf, id_face = funcionarios[pis_campo]
+            novos.append({
+                'cpf_funcionario': cpf,
+                'pis': pis_campo,
+                'id_face': id_face,
+                'data_hora': data_hora,
+                'tipo_lancamento': tipo_lancamento,
+            })
+    if not novos:
+        return
+    inseridas = _inserir_marcacoes(novos)
+    dias.update(dias_afetados(inseridas))
+    resumo['inseridos'] += len(inseridas)
+    resumo['duplicados'] += len(novos) - len(inseridas)
+
+
+def _importar_lote(lote, funcionarios, tipo_lancamento, relogio_id, resumo, dias):
+    """
+    Resolve, deduplica e grava um lote de marcações (RegistroMarcacao),
+    acrescentando a ``dias`` os dias do resumo diário a recalcular. As
+    marcações sem funcionário correspondente são guardadas como pendentes.
+    """
+    resumo['marcacoes'] += len(lote)
+    _resolver_funcionarios({marcacao.pis for marcacao in lote}, funcionarios)
+
+    resolvidas, pendentes = [], []
+    for marcacao in lote:
+        funcionario = funcionarios[marcacao.pis]
+        if funcionario is None:
+            resumo['sem_funcionario'] += 1
+            pendentes.append({
+                'relogio_id': relogio_id,
+                'nsr': marcacao.nsr,
+                'pis': marcacao.pis,
+                'data_hora': marcacao.data_hora,
+                'tipo_lancamento': tipo_lancamento,
+            })
+            continue
+        resolvidas.append((funcionario, marcacao.pis, marcacao.data_hora))
+    _guardar_pendentes(pendentes)
+    if not resolvidas:
+        return
+
+    novos = [
+        {
+            'cpf_funcionario': cpf,
+            'pis': pis_campo,
+            'id_face': id_face,
+            'data_hora': data_hora,
+            'tipo_lancamento': tipo_lancamento,
+        }
+        for (cpf, id_face), pis_campo, data_hora in resolvidas
+    ]
+    # Marcações já gravadas (ou repetidas no próprio arquivo) são descartadas pelo banco
+    inseridas = _inserir_marcacoes(novos)
+    dias.update(dias_afetados(inseridas))
+    resumo['inseridos'] += len(inseridas)
+    resumo['duplicados'] += len(novos) - len(inseridas)
+
+
+def _novo_resumo():
+    return {'marcacoes': 0, 'inseridos': 0, 'duplicados': 0, 'sem_funcionario': 0}
+
+
+def _importar_marcacoes(marcacoes, tipo_lancamento, tamanho_lote, progresso, relogio_id, funcionarios, resumo, dias):
+    """
+    Importa as marcações em lotes, somando as quantidades em ``resumo`` e
+    acrescentando a ``dias`` os dias do resumo diário a recalcular.
+    """
+    marcacoes = iter(marcacoes)
+    while True:
+        lote = list(islice(marcacoes, tamanho_lote))
+        if not lote:
+            break
+        _importar_lote(lote, funcionarios, tipo_lancamento, relogio_id, resumo, dias)
+        if progresso is not None:
+            progresso(dict(resumo))
+
+
+def importar_marcacoes(marcacoes, tipo_lancamento='Importação PIS', tamanho_lote=TAMANHO_LOTE,
+                       progresso=None, relogio_id=None):
+    """
+    Importa um iterável de marcações (``afd.RegistroMarcacao``) do relógio
+    ``relogio_id`` na transação corrente, sem fazer commit.
+
+    As marcações sem funcionário correspondente ficam em marcacoes_pendentes
+    e são gravadas na primeira importação do mesmo relógio depois de o
+    funcionário ser cadastrado.
+
+    Retorna um dicionário com a quantidade de marcações lidas, inseridas
+    (incluindo as pendentes gravadas), ignoradas por já existirem e sem
+    funcionário correspondente. Se ``progresso`` for informado, é chamado com
+    uma cópia desse dicionário ao fim de cada lote.
+    """
+    resumo, funcionarios, dias = _novo_resumo(), {}, set()
+    _importar_pendentes(relogio_id, funcionarios, resumo, dias)
+    _importar_marcacoes(marcacoes, tipo_lancamento, tamanho_lote, progresso, relogio_id, funcionarios, resumo, dias)
+    # O resumo diário é recalculado uma única vez, depois de todos os lotes
+    recalcular_dias(dias)
+    return resumo
+
+
+def _bloquear_relogio(cabecalho):
+    """
+    Obtém o relógio do cabeçalho, cadastrando-o na primeira importação, e
+    bloqueia a linha até o fim da transação. Importações simultâneas do mesmo
+    REP são assim executadas uma após a outra, cada uma vendo a marca d'água
+    gravada pela anterior.
+    """
+    db.session.execute(
+        pg_insert(RelogioPonto).values(
+            numero_fabricacao=cabecalho.numero_fabricacao,
+            cnpj_cpf_empregador=cabecalho.cnpj_cpf or None,
+            razao_social=cabecalho.razao_social or None,
+            ultimo_nsr=0,
+        ).on_conflict_do_nothing(index_elements=['numero_fabricacao'])
+    )
+    return RelogioPonto.query.filter_by(
+        numero_fabricacao=cabecalho.numero_fabricacao
+    ).with_for_update().one()
+
+
+def _relogio_do_arquivo(caminho):
+    """Relógio do cabeçalho do arquivo, já bloqueado, ou None se não houver cabeçalho."""
+    cabecalho = ler_cabecalho(caminho)
+    if cabecalho is None or not cabecalho.numero_fabricacao:
+        return None
+    return _bloquear_relogio(cabecalho)
+
+
+def _nsr_minimo(relogio, desde_nsr):
+    """NSR a partir do qual (exclusive) as linhas do relógio são lidas."""
+    if relogio is None:
+        return 0
+    if desde_nsr is not None:
+        return max(desde_nsr - 1, 0)
+    return relogio.ultimo_nsr
+
+
+def _importar_arquivo(caminho, nsr_minimo, tipo_lancamento, progresso, relogio_id, funcionarios, resumo, dias):
+    """
+    Importa as marcações do arquivo com NSR maior que ``nsr_minimo``, como
+    ``_importar_marcacoes``. Retorna o maior NSR lido.
+    """
+    maior_nsr = nsr_minimo
+
+    def acompanhar_nsr(marcacoes):
+        nonlocal maior_nsr
+        for marcacao in marcacoes:
+            if marcacao.nsr is not None and marcacao.nsr > maior_nsr:
+                maior_nsr = marcacao.nsr
+            yield marcacao
+
+    _importar_marcacoes(
+        acompanhar_nsr(ler_marcacoes(caminho, nsr_minimo=nsr_minimo)),
+        tipo_lancamento, TAMANHO_LOTE, progresso, relogio_id, funcionarios, resumo, dias,
+    )
+    return maior_nsr
+
+
+def importar_arquivo_afd(caminho, tipo_lancamento='Importação PIS', progresso=None, desde_nsr=None):
+    """
+    Importa um arquivo AFD em disco e faz commit.
+
+    Se o arquivo tiver cabeçalho com número de fabricação, as linhas com NSR
+    até o último importado daquele REP são descartadas sem interpretação, e a
+    marca d'água é avançada na mesma transação das marcações. Com
+    ``desde_nsr``, o relógio é reprocessado a partir desse NSR, ignorando a
+    marca d'água. Arquivos sem cabeçalho são importados por inteiro.
+    """
+    relogio = _relogio_do_arquivo(caminho)
+    relogio_id = relogio.id if relogio is not None else None
+    resumo, funcionarios, dias = _novo_resumo(), {}, set()
+    _importar_pendentes(relogio_id, funcionarios, resumo, dias)
+    maior_nsr = _importar_arquivo(
+        caminho, _nsr_minimo(relogio, desde_nsr), tipo_lancamento, progresso, relogio_id, funcionarios, resumo, dias,
+    )
+    if relogio is not None:
+        relogio.ultimo_nsr = max(maior_nsr, relogio.ultimo_nsr)
+        relogio.data_ultima_importacao = datetime.datetime.now()
+    # O resumo diário é recalculado uma única vez, antes do commit
+    recalcular_dias(dias)
+    db.session.commit()
+    return resumo
+
+
+def expandir_arquivos_afd(origem, pasta_temporaria):
+    """
+    Lista os arquivos AFD contidos em ``origem`` como pares (caminho, nome):
+    um arquivo simples, um diretório (percorrido recursivamente) ou um ZIP,
+    cujos arquivos são extraídos em ``pasta_temporaria``. O nome é o caminho
+    relativo dentro do diretório ou do ZIP.
+    """
+    if os.path.isdir(origem):
+        caminhos = []
+        for raiz, _, nomes in os.walk(origem):
+            caminhos.extend(os.path.join(raiz, nome) for nome in nomes if not nome.startswith('.'))
+        return [(caminho, os.path.relpath(caminho, origem)) for caminho in sorted(caminhos)]
+
+    if not zipfile.is_zipfile(origem):
+        return [(origem, origem)]
+
+    caminhos = []
+    with zipfile.ZipFile(origem) as arquivo_zip:
+        for indice, membro in enumerate(arquivo_zip.infolist()):
+            nome = os.path.basename(membro.filename)
+            if membro.is_dir() or not nome or nome.startswith('.') or membro.filename.startswith('__MACOSX'):
+                continue
+            # O nome interno do ZIP não é confiável: só o nome base, saneado
+            destino = os.path.join(pasta_temporaria, f"{indice:04d}_{secure_filename(nome) or 'arquivo.afd'}")
+            with arquivo_zip.open(membro) as entrada, open(destino, 'wb') as saida:
+                while True:
+                    bloco = entrada.read(1024 * 1024)
+                    if not bloco:
+                        break
+                    saida.write(bloco)
+            caminhos.append((destino, membro.filename))
+    return caminhos
+
+
+def _iniciar_processo(configuracao):
+    """
+    Inicializa um processo do pool de importação: um aplicativo Flask mínimo,
+    só com a configuração do banco, e o seu contexto de aplicação ativo.
+    Cada processo tem assim o seu próprio pool de conexões.
+    """
+    app = Flask(__name__)
+    app.config.update(configuracao)
+    db.init_app(app)
+    app.app_context().push()
+
+
+def _importar_arquivos_do_relogio(caminhos, tipo_lancamento, desde_nsr):
+    """
+    Importa, em um processo do pool, os arquivos de um mesmo relógio (ou um
+    arquivo sem cabeçalho) em uma transação e faz commit. Cada arquivo é
+    gravado em um savepoint; se algum não puder ser lido, a marca d'água do
+    relógio não avança. Retorna, para cada arquivo, o par (resumo, erro).
+    """
+    resultados = []
+    try:
+        relogio = _relogio_do_arquivo(caminhos[0])
+        relogio_id = relogio.id if relogio is not None else None
+        nsr_minimo = _nsr_minimo(relogio, desde_nsr)
+        funcionarios = {}
+        dias = set()  # Dias do resumo diário a recalcular, uma única vez, antes do commit
+        maior_nsr, pendentes_importadas, com_erro = nsr_minimo, False, False
+        for caminho in caminhos:
+            resumo = _novo_resumo()
+            savepoint = db.session.begin_nested()
+            try:
+                if not pendentes_importadas:
+                    _importar_pendentes(relogio_id, funcionarios, resumo, dias)
+                maior = _importar_arquivo(
+                    caminho, nsr_minimo, tipo_lancamento, None, relogio_id, funcionarios, resumo, dias,
+                )
+            except Exception as e:
+                savepoint.rollback()
+                print(f"ERROR: Falha ao ler o arquivo AFD {caminho}: {e}")
+                resultados.append((None, str(e)))
+                com_erro = True
+                continue
+            savepoint.commit()
+            pendentes_importadas = True
+            maior_nsr = max(maior_nsr, maior)
+            resultados.append((resumo, None))
+
+        if relogio is not None:
+            # Um arquivo não lido pode ter marcações abaixo do maior NSR dos demais
+            if not com_erro:
+                relogio.ultimo_nsr = max(maior_nsr, relogio.ultimo_nsr)
+            relogio.data_ultima_importacao = datetime.datetime.now()
+        recalcular_dias(dias)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"ERROR: Falha ao importar os arquivos AFD {', '.join(caminhos)}: {e}")
+        return [(None, str(e))] * len(caminhos)
+    return resultados
+
+
+def importar_arquivos_afd(caminhos, nomes=None, tipo_lancamento='Importação PIS', processos=None,
+                          progresso=None, desde_nsr=None):
+    """
+    Importa vários arquivos AFD em paralelo, cada relógio em sua transação.
+
+    Os arquivos são agrupados por relógio (número de fabricação do cabeçalho;
+    cada arquivo sem cabeçalho forma um grupo), e cada grupo é importado por
+    inteiro (leitura, interpretação e gravação) por um processo de um pool de
+    ``processos`` processos (por padrão um por CPU), com conexão e transação
+    próprias e a mesma marca d'água de ``importar_arquivo_afd`` (ou a partir
+    de ``desde_nsr``). O tempo total fica próximo ao do maior grupo. Os
+    arquivos de um mesmo relógio, que o bloqueio do relógio serializaria de
+    qualquer forma, são importados um após o outro, cada um em um savepoint:
+    um arquivo com erro de leitura não impede a importação dos demais. Os
+    processos são iniciados com ``spawn``, por poderem ser criados a partir
+    de uma thread do servidor, e recebem apenas a configuração do banco.
+
+    ``nomes`` permite exibir nomes diferentes dos caminhos no resumo.
+    ``progresso`` é chamado com o resumo geral ao fim de cada grupo. Retorna
+    ``(resumo, arquivos)``: o resumo geral e a lista com o resumo de cada
+    arquivo (chaves ``arquivo``, ``marcacoes``, ``inseridos``, ``duplicados``,
+    ``sem_funcionario`` e ``erro``). Uma marcação repetida em dois arquivos é
+    contada como inserida em um e como duplicada nos demais.
+    """
+    caminhos = list(caminhos)
+    nomes = list(nomes) if nomes is not None else caminhos
+    campos = ('marcacoes', 'inseridos', 'duplicados', 'sem_funcionario')
+    arquivos = [dict({campo: 0 for campo in campos}, arquivo=nome, erro=None) for nome in nomes]
+
+    def totalizar():
+        return {campo: sum(arquivo[campo] for arquivo in arquivos) for campo in campos}
+
+    grupos = defaultdict(list)
+    for indice, caminho in enumerate(caminhos):
+        cabecalho = ler_cabecalho(caminho)
+        numero = cabecalho.numero_fabricacao if cabecalho is not None else None
+        grupos[numero or ('sem cabeçalho', indice)].append(indice)
+    if not grupos:
+        return totalizar(), arquivos
+    # Os maiores grupos primeiro, para que nenhum grupo grande fique para o fim
+    grupos = sorted(grupos.values(), key=lambda indices: -sum(os.path.getsize(caminhos[i]) for i in indices))
+
+    configuracao = {chave: valor for chave, valor in current_app.config.items() if chave.startswith('SQLALCHEMY_')}
+    with ProcessPoolExecutor(
+        max_workers=min(processos or os.cpu_count() or 1, len(grupos)),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_iniciar_processo, initargs=(configuracao,),
+    ) as pool:
+        futuros = {
+            pool.submit(
+                _importar_arquivos_do_relogio, [caminhos[i] for i in indices], tipo_lancamento, desde_nsr,
+            ): indices
+            for indices in grupos
+        }
+        for futuro in as_completed(futuros):
+            indices = futuros[futuro]
+            try:
+                resultados = futuro.result()
+            except Exception as e:  # Processo encerrado antes de responder
+                print(f"ERROR: Falha no processo de importação: {e}")
+                resultados = [(None, str(e))] * len(indices)
+            for indice, (resumo, erro) in zip(indices, resultados):
+                if erro is None:
+                    arquivos[indice].update(resumo)
+                else:
+                    arquivos[indice]['erro'] = erro
+            if progresso is not None:
+                progresso(totalizar())
+    return totalizar(), arquivos
+
+
+# Tipo de lançamento padrão conforme o campo usado na identificação.
+TIPO_LANCAMENTO_API = {'cpf': 'Importação PIS', 'pis': 'Importação PIS', 'id_face': 'Importação IDFace'}
+
+
+def registrar_marcacoes_api(itens):
+    """
+    Grava um lote de marcações recebidas em JSON, sem fazer commit.
+
+    Cada item traz ``data_hora`` (ISO 8601, truncada no minuto como nas demais
+    marcações) e um dos campos ``cpf``, ``pis`` ou ``id_face``; ``tipo_lancamento``
+    e ``observacao`` são opcionais. Os identificadores são resolvidos pelo
+    resolvedor compartilhado (cache ou uma consulta) e as marcações gravadas
+    de forma idempotente. Retorna uma lista de resultados na ordem dos itens,
+    com ``status`` 'inserido', 'duplicado' ou 'erro'.
+    """
+    resultados = [None] * len(itens)
+    validos = []
+    for indice, item in enumerate(itens):
+        if not isinstance(item, dict):
+            resultados[indice] = {'indice': indice, 'status': 'erro', 'erro': 'Item deve ser um objeto JSON.'}
+            continue
+        campo = next((c for c in CAMPOS_IDENTIFICADOR if item.get(c)), None)
+        if campo is None:
+            resultados[indice] = {'indice': indice, 'status': 'erro', 'erro': 'Informe cpf, pis ou id_face.'}
+            continue
+        try:
+            data_hora = datetime.datetime.fromisoformat(str(item.get('data_hora', '')))
+        except ValueError:
+            resultados[indice] = {'indice': indice, 'status': 'erro',
+                                  'erro': 'data_hora inválida (use AAAA-MM-DDTHH:MM).'}
+            continue
+        if data_hora.tzinfo is not None:
+            data_hora = data_hora.astimezone().replace(tzinfo=None)
+        tipo_lancamento = item.get('tipo_lancamento') or TIPO_LANCAMENTO_API[campo]
+        if not isinstance(tipo_lancamento, str) or len(tipo_lancamento) > 50:
+            resultados[indice] = {'indice': indice, 'status': 'erro', 'erro': 'tipo_lancamento inválido.'}
+            continue
+        valor = normalizar(campo, item[campo])
+        validos.append((indice, campo, valor, data_hora.replace(second=0, microsecond=0), tipo_lancamento,
+                        item.get('observacao')))
+
+    funcionarios = resolver_varios((campo, valor) for _, campo, valor, *_ in validos)
+
+    novos, origem = [], {}
+    for indice, campo, valor, data_hora, tipo_lancamento, observacao in validos:
+        funcionario = funcionarios.get((campo, valor))
+        if funcionario is None:
+            resultados[indice] = {'indice': indice, 'status': 'erro', 'erro': 'Funcionário não encontrado.'}
+            continue
+        cpf, pis, id_face = funcionario
+        chave = (cpf, data_hora)
+        resultados[indice] = {'indice': indice, 'status': 'duplicado', 'cpf_funcionario': cpf}
+        if chave in origem:
+            continue
+        origem[chave] = indice
+        novos.append({
+            'cpf_funcionario': cpf,
+            'pis': pis,
+            'id_face': id_face,
+            'data_hora': data_hora,
+            'tipo_lancamento': tipo_lancamento,
+            'observacao': str(observacao) if observacao is not None else None,
+        })
+
+    inseridas = _inserir_marcacoes(novos)
+    atualizar_resumo_diario(inseridas)
+    for chave in inseridas:
+        resultados[origem[chave]]['status'] = 'inserido'
+    return resultados
@@ -0,0 +1,72 @@
+"""
+Importa arquivos AFD de relógios de ponto pela linha de comando.
+
+Uso:
+    python importar_afd.py arquivo1.afd [arquivo2.afd ...]
+    python importar_afd.py pasta_com_afds/ afds_do_mes.zip [--processos 4]
+    python importar_afd.py arquivo.afd --desde-nsr 1500
+
+Diretórios e arquivos ZIP são expandidos; quando há mais de um arquivo, eles
+são importados em paralelo, um relógio por processo, cada um em sua própria
+transação. ``--desde-nsr`` reprocessa os relógios dos arquivos a partir do NSR
+informado, ignorando o último NSR importado (as marcações já gravadas não são
+duplicadas).
+"""
+import argparse
+import shutil
+import tempfile
+
+from app import create_app
+from importacao_ponto import importar_arquivo_afd, importar_arquivos_afd, expandir_arquivos_afd
+
+
+def _imprimir_resumo(nome, resumo):
+    print(
+        f"{nome}: {resumo['marcacoes']} marcações lidas, "
+        f"{resumo['inseridos']} inseridas, {resumo['duplicados']} já existentes, "
+        f"{resumo['sem_funcionario']} sem funcionário correspondente."
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Importa marcações de ponto de arquivos AFD.')
+    parser.add_argument('arquivos', nargs='+', help='Caminho dos arquivos AFD, diretórios ou arquivos ZIP')
+    parser.add_argument('--processos', type=int, default=None,
+                        help='Quantidade de processos de importação (padrão: um por CPU)')
+    parser.add_argument('--desde-nsr', type=int, default=None,
+                        help='Reprocessa as marcações a partir deste NSR, ignorando o último NSR importado')
+    args = parser.parse_args()
+    if args.desde_nsr is not None and args.desde_nsr < 1:
+        parser.error('--desde-nsr deve ser maior que zero.')
+
+    app = create_app()
+    pasta = tempfile.mkdtemp(prefix='afd_')
+    try:
+        extraidos = []
+        for origem in args.arquivos:
+            extraidos.extend(expandir_arquivos_afd(origem, pasta))
+
+        with app.app_context():
+            if len(extraidos) == 1:
+                caminho, nome = extraidos[0]
+                _imprimir_resumo(nome, importar_arquivo_afd(caminho, desde_nsr=args.desde_nsr))
+                return
+
+            resumo, arquivos = importar_arquivos_afd(
+                [caminho for caminho, _ in extraidos],
+                nomes=[nome for _, nome in extraidos],
+                processos=args.processos,
+                desde_nsr=args.desde_nsr,
+            )
+            for arquivo in arquivos:
+                if arquivo['erro']:
+                    print(f"{arquivo['arquivo']}: erro na leitura: {arquivo['erro']}")
+                else:
+                    _imprimir_resumo(arquivo['arquivo'], arquivo)
+            _imprimir_resumo('Total', resumo)
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
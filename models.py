@@ -1,4 +1,5 @@
 from extensions import db
+from sqlalchemy.orm import deferred
 from werkzeug.security import generate_password_hash, check_password_hash
 import datetime
 from sqlalchemy.types import JSON, Numeric, String
@@ -12,6 +13,8 @@ class Funcionario(db.Model):
     data_nascimento = db.Column(db.Date, nullable=False)
     sexo = db.Column(db.String(20), nullable=True)
     pis = db.Column(db.String(14), unique=True)
+    # Dígitos do PIS (salvo formatado), usados na resolução de identificadores
+    pis_digitos = db.Column(db.String(14), db.Computed("NULLIF(regexp_replace(pis, '[^0-9]', '', 'g'), '')", persisted=True))
     id_face = db.Column(db.String(255), unique=True)
     endereco = db.Column(db.String(255), nullable=True)
     bairro = db.Column(db.String(100), nullable=True)
@@ -27,9 +30,19 @@ class Funcionario(db.Model):
     variacao_conta = db.Column(db.String(10), nullable=True)
     chave_pix = db.Column(db.String(255), nullable=True)
     observacao = db.Column(db.Text, nullable=True)
-    foto_base64 = db.Column(ImageBase64, nullable=True)
+    # Adiada: carregada só quando acessada; as telas usam a rota /funcionarios/<cpf>/foto
+    foto_base64 = deferred(db.Column(ImageBase64, nullable=True))
+    foto_hash = db.Column(db.String(64), nullable=True)  # SHA-256 da foto normalizada (ver fotos.py)
     status = db.Column(db.String(20), nullable=True)
 
+    # Listagem paginada por (nome, cpf), filtro por cidade e resolução pelo PIS;
+    # os índices de busca por expressão são criados em initialize_database.
+    __table_args__ = (
+        db.Index('ix_funcionarios_nome_cpf', 'nome', 'cpf'),
+        db.Index('ix_funcionarios_cidade', 'cidade'),
+        db.Index('uq_funcionarios_pis_digitos', 'pis_digitos', unique=True),
+    )
+
     # Relacionamentos
     dependentes = db.relationship('Dependente', backref='funcionario', lazy=True)
     ferias = db.relationship(
@@ -45,6 +58,18 @@ class Funcionario(db.Model):
     def __repr__(self):
         return f"<Funcionario {self.nome} ({self.cpf})>"
 
+# Tabela: fotos_versoes (versões reduzidas das fotos, por hash do conteúdo)
+class FotoVersao(db.Model):
+    __tablename__ = 'fotos_versoes'
+    hash_conteudo = db.Column(db.String(64), primary_key=True)
+    tamanho = db.Column(db.String(20), primary_key=True)  # miniatura, media
+    largura = db.Column(db.Integer, nullable=False)
+    altura = db.Column(db.Integer, nullable=False)
+    dados = db.Column(db.LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f"<FotoVersao {self.hash_conteudo[:12]} ({self.tamanho})>"
+
 # Tabela: dependentes
 class Dependente(db.Model):
     __tablename__ = 'dependentes'
@@ -61,10 +86,16 @@ class Dependente(db.Model):
 # Tabela: contratos_trabalho
 class ContratoTrabalho(db.Model):
     __tablename__ = 'contratos_trabalho'
+    __table_args__ = (
+        # No máximo um contrato ativo por funcionário (ver contratos.py)
+        db.Index('uq_contratos_trabalho_ativo', 'cpf_funcionario', unique=True, postgresql_where=db.text('status')),
+    )
     id = db.Column(db.Integer, primary_key=True)
     cpf_funcionario = db.Column(db.String(14), db.ForeignKey('funcionarios.cpf'), nullable=False)
-    setor = db.Column(db.String(100), nullable=False)
-    funcao = db.Column(db.String(100), nullable=False)
+    # Setor e função por chave estrangeira (contratos antigos guardavam o nome;
+    # convertidos em initialize_database)
+    setor_id = db.Column(db.Integer, db.ForeignKey('setores.id'), nullable=False, index=True)
+    funcao_id = db.Column(db.Integer, db.ForeignKey('funcoes.id'), nullable=False, index=True)
     jornada_id = db.Column(db.Integer, db.ForeignKey('jornadas.id'))
     salario_inicial = db.Column(db.Numeric(10, 2), nullable=False)
     bonus = db.Column(db.Numeric(10, 2), default=0.00)
@@ -76,6 +107,9 @@ class ContratoTrabalho(db.Model):
     # Relacionamento; backref cria funcionario.contratos
     funcionario = db.relationship('Funcionario', backref='contratos', lazy=True)
     jornada = db.relationship('Jornada', backref='contratos', lazy=True)
+    # Carregados junto com o contrato: as telas sempre exibem os nomes
+    setor = db.relationship('Setor', backref='contratos', lazy='joined')
+    funcao = db.relationship('Funcao', backref='contratos', lazy='joined')
 
     def __repr__(self):
         return f"<Contrato {self.id} - {self.cpf_funcionario}>"
@@ -95,6 +129,23 @@ class ReajusteSalarial(db.Model):
     def __repr__(self):
         return f"<Reajuste {self.id} - {self.cpf_funcionario}>"
 
+# Tabela: historico_salarial (salário e bônus vigentes por período; ver historico_salarial.py)
+class HistoricoSalarial(db.Model):
+    __tablename__ = 'historico_salarial'
+    contrato_id = db.Column(db.Integer, db.ForeignKey('contratos_trabalho.id', ondelete='CASCADE'), primary_key=True)
+    data_inicio = db.Column(db.Date, primary_key=True)
+    data_fim = db.Column(db.Date)  # Inclusive; vazio enquanto o período estiver em aberto
+    cpf_funcionario = db.Column(db.String(14), db.ForeignKey('funcionarios.cpf'), nullable=False)
+    salario = db.Column(db.Numeric(10, 2), nullable=False)
+    bonus = db.Column(db.Numeric(10, 2), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_historico_salarial_funcionario_inicio', 'cpf_funcionario', 'data_inicio'),
+    )
+
+    def __repr__(self):
+        return f"<Historico Salarial {self.cpf_funcionario} - {self.data_inicio}>"
+
 # Tabela: controle_ferias
 class ControleFerias(db.Model):
     __tablename__ = 'controle_ferias'
@@ -183,9 +234,85 @@ class RegistroPonto(db.Model):
     tipo_lancamento = db.Column(db.String(50), nullable=False)
     observacao = db.Column(db.Text)
 
+    # Uma marcação por funcionário e data/hora; usado pelo INSERT ... ON CONFLICT.
+    # (data_hora, id) atende a listagem por período com paginação por chave.
+    __table_args__ = (
+        db.Index('uq_registro_ponto_funcionario_data_hora', 'cpf_funcionario', 'data_hora', unique=True),
+        db.Index('ix_registro_ponto_data_hora_id', 'data_hora', 'id'),
+    )
+
     def __repr__(self):
         return f"<Registro Ponto {self.id} - {self.data_hora}>"
 
+# Tabela: resumo_ponto_diario (resumo por funcionário e dia, mantido pelo resumo_ponto.py)
+class ResumoPontoDiario(db.Model):
+    __tablename__ = 'resumo_ponto_diario'
+    cpf_funcionario = db.Column(db.String(14), db.ForeignKey('funcionarios.cpf'), primary_key=True)
+    data = db.Column(db.Date, primary_key=True)
+    primeira_marcacao = db.Column(db.DateTime, nullable=False)
+    ultima_marcacao = db.Column(db.DateTime, nullable=False)
+    quantidade_marcacoes = db.Column(db.Integer, nullable=False)
+    minutos_trabalhados = db.Column(db.Integer, nullable=False, default=0)
+    anomalia = db.Column(db.Boolean, nullable=False, default=False)  # Quantidade ímpar de marcações
+
+    __table_args__ = (
+        db.Index('ix_resumo_ponto_diario_data', 'data'),
+    )
+
+    def __repr__(self):
+        return f"<Resumo Ponto {self.cpf_funcionario} - {self.data}>"
+
+# Tabela: relogios_ponto (REPs e último NSR importado de cada um)
+class RelogioPonto(db.Model):
+    __tablename__ = 'relogios_ponto'
+    id = db.Column(db.Integer, primary_key=True)
+    numero_fabricacao = db.Column(db.String(17), unique=True, nullable=False)
+    cnpj_cpf_empregador = db.Column(db.String(14))
+    razao_social = db.Column(db.String(150))
+    ultimo_nsr = db.Column(db.Integer, nullable=False, default=0)
+    data_ultima_importacao = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f"<RelogioPonto {self.numero_fabricacao} (NSR {self.ultimo_nsr})>"
+
+# Tabela: marcacoes_pendentes (marcações de AFD ainda sem funcionário correspondente)
+class MarcacaoPendente(db.Model):
+    __tablename__ = 'marcacoes_pendentes'
+    id = db.Column(db.Integer, primary_key=True)
+    relogio_id = db.Column(db.Integer, db.ForeignKey('relogios_ponto.id'), index=True)
+    nsr = db.Column(db.Integer)
+    pis = db.Column(db.String(14), nullable=False)  # Campo PIS/CPF como veio no arquivo
+    data_hora = db.Column(db.DateTime, nullable=False)
+    tipo_lancamento = db.Column(db.String(50), nullable=False)
+    data_importacao = db.Column(db.DateTime, nullable=False, default=datetime.datetime.now)
+
+    __table_args__ = (
+        db.UniqueConstraint('pis', 'data_hora', name='uq_marcacoes_pendentes_pis_data_hora'),
+    )
+
+    def __repr__(self):
+        return f"<MarcacaoPendente {self.pis} - {self.data_hora}>"
+
+# Tabela: tarefas_importacao (importações de AFD executadas em segundo plano)
+class TarefaImportacao(db.Model):
+    __tablename__ = 'tarefas_importacao'
+    id = db.Column(db.Integer, primary_key=True)
+    nome_arquivo = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='Pendente')  # Pendente, Processando, Concluída, Erro
+    marcacoes = db.Column(db.Integer, nullable=False, default=0)
+    inseridos = db.Column(db.Integer, nullable=False, default=0)
+    duplicados = db.Column(db.Integer, nullable=False, default=0)
+    sem_funcionario = db.Column(db.Integer, nullable=False, default=0)
+    arquivos = db.Column(JSON)  # Resumo por arquivo nas importações de ZIP
+    erro = db.Column(db.Text)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.codigo'))
+    data_criacao = db.Column(db.DateTime, default=datetime.datetime.now)
+    data_inicio = db.Column(db.DateTime)
+    data_fim = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f"<TarefaImportacao {self.id} - {self.nome_arquivo} ({self.status})>"
+
 # Tabela: usuarios
 class Usuario(db.Model):
     __tablename__ = 'usuarios'
@@ -0,0 +1,57 @@
+"""
+Perfil do funcionário: o cadastro com as coleções exibidas na página de
+detalhes e na ficha cadastral (dependentes, contratos, reajustes, férias,
+demissões, exames, fardas/EPIs e adiantamentos).
+
+As coleções são carregadas com selectinload, uma consulta por coleção filtrada
+pelo CPF, e os cadastros referenciados por elas (jornada, tipo de exame,
+entidade, item de EPI) vêm na mesma consulta com joinedload. O total de
+consultas é fixo, não depende de quantos registros o funcionário tem nem de
+quais coleções a tela percorre. A foto continua adiada: as telas usam a rota
+/funcionarios/<cpf>/foto e a ficha usa fotos.carregar_foto.
+"""
+from sqlalchemy.orm import configure_mappers, joinedload, selectinload
+
+from extensions import db
+from models import (
+    Adiantamento, ContratoTrabalho, DistribuicaoItem, ExameFuncionario, Funcionario,
+)
+
+
+def opcoes_perfil():
+    """Opções de carga das coleções do perfil, para uso em consultas de Funcionario."""
+    # Os atributos criados por backref (contratos, exames, tipo_exame, ...) só
+    # existem depois que os mapeamentos são configurados.
+    configure_mappers()
+    return (
+        selectinload(Funcionario.dependentes),
+        selectinload(Funcionario.contratos).joinedload(ContratoTrabalho.jornada),
+        selectinload(Funcionario.reajustes),
+        selectinload(Funcionario.ferias),
+        selectinload(Funcionario.demissoes),
+        selectinload(Funcionario.exames).options(
+            joinedload(ExameFuncionario.tipo_exame), joinedload(ExameFuncionario.entidade),
+        ),
+        selectinload(Funcionario.itens_recebidos).options(
+            joinedload(DistribuicaoItem.item), selectinload(DistribuicaoItem.devolucoes),
+        ),
+        selectinload(Funcionario.adiantamentos).selectinload(Adiantamento.parcelas),
+    )
+
+
+def carregar_perfil(cpf):
+    """
+    Retorna (funcionario, tem_foto) com todas as coleções do perfil já
+    carregadas, ou None se o CPF não estiver cadastrado.
+    """
+    return (
+        db.session.query(Funcionario, Funcionario.foto_base64.isnot(None))
+        .options(*opcoes_perfil())
+        .filter(Funcionario.cpf == cpf)
+        .one_or_none()
+    )
+
+
+def contrato_mais_recente(funcionario):
+    """Contrato com a data de admissão mais recente (ativo ou não), ou None."""
+    return max(funcionario.contratos, key=lambda contrato: contrato.data_admissao, default=None)
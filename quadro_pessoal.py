@@ -0,0 +1,167 @@
+"""
+Quadro de pessoal (headcount) mensal por setor e função.
+
+Um contrato conta no mês se estiver vigente no último dia do mês (ou hoje, no
+mês corrente): admitido até essa data e sem demissão anterior a ela. Um
+contrato inativo sem data de demissão (como os desativados pela migração do
+contrato único ativo) termina na véspera da admissão seguinte do funcionário,
+como no histórico salarial; se não houver admissão seguinte, fica de fora,
+pois não se sabe quando terminou.
+
+Todos os meses do período são calculados por uma única consulta: a série de
+meses (generate_series) é ligada aos contratos pela vigência, um daterange
+atendido pelo índice GiST ix_contratos_trabalho_vigencia (criado em
+initialize_database). Os poucos contratos inativos sem demissão, cuja vigência
+depende de outro contrato, ficam fora do índice e são somados por uma segunda
+parte da consulta. Os meses encerrados ficam em cache por processo; incluir,
+editar ou excluir contratos descarta os meses a partir da admissão do contrato
+(``invalidar``), e as entradas expiram após VALIDADE_CACHE segundos, para que
+alterações feitas em outro processo sejam vistas.
+"""
+import datetime
+import threading
+import time
+
+from sqlalchemy import bindparam, text
+
+from extensions import db
+
+# Segundos até um mês encerrado ser consultado novamente no banco.
+VALIDADE_CACHE = 300
+
+# Vigência do contrato. Uma demissão anterior à admissão (cadastro antigo
+# inconsistente) conta como um único dia, em vez de invalidar o intervalo.
+# Índice e consulta usam a mesma expressão e a mesma condição.
+VIGENCIA = (
+    "daterange(data_admissao, CASE WHEN data_demissao < data_admissao "
+    "THEN data_admissao ELSE data_demissao END, '[]')"
+)
+CONDICAO_VIGENCIA = 'status OR data_demissao IS NOT NULL'
+SQL_INDICE_VIGENCIA = (
+    f'CREATE INDEX IF NOT EXISTS ix_contratos_trabalho_vigencia '
+    f'ON contratos_trabalho USING gist (({VIGENCIA})) WHERE {CONDICAO_VIGENCIA}'
+)
+
+# Contratos fora do índice: inativos sem demissão, encerrados na véspera da
+# admissão seguinte do funcionário (na ordem de admissão e id). São poucos;
+# a CTE é calculada uma vez por consulta, só para os funcionários que os têm.
+_SQL_SEM_DEMISSAO = '''
+    SELECT setor_id, funcao_id, daterange(data_admissao, fim, '[]') AS vigencia
+    FROM (
+        SELECT setor_id, funcao_id, data_admissao, status, data_demissao,
+               lead(data_admissao) OVER (PARTITION BY cpf_funcionario ORDER BY data_admissao, id) - 1 AS fim
+        FROM contratos_trabalho
+        WHERE cpf_funcionario IN (
+            SELECT cpf_funcionario FROM contratos_trabalho WHERE status IS NOT TRUE AND data_demissao IS NULL
+        )
+    ) AS contratos
+    WHERE status IS NOT TRUE AND data_demissao IS NULL AND fim >= data_admissao
+'''
+
+_DIA_DO_MES = "LEAST((m.mes + interval '1 month - 1 day')::date, CAST(:hoje AS date))"
+_MESES = "generate_series(CAST(:inicio AS timestamp), CAST(:fim AS timestamp), interval '1 month') AS m(mes)"
+
+_SQL_QUADRO = f'''
+    WITH sem_demissao AS MATERIALIZED ({_SQL_SEM_DEMISSAO})
+    SELECT mes, setor_id, funcao_id, sum(quantidade)::integer AS quantidade
+    FROM (
+        SELECT m.mes::date AS mes, setor_id, funcao_id, count(*) AS quantidade
+        FROM {_MESES}
+        JOIN contratos_trabalho ON {VIGENCIA} @> {_DIA_DO_MES}
+        WHERE {CONDICAO_VIGENCIA}
+        GROUP BY 1, 2, 3
+        UNION ALL
+        SELECT m.mes::date, setor_id, funcao_id, count(*)
+        FROM {_MESES}
+        JOIN sem_demissao ON vigencia @> {_DIA_DO_MES}
+        GROUP BY 1, 2, 3
+    ) AS quadro
+    GROUP BY 1, 2, 3
+'''
+
+_SQL_ADMISSAO_SEM_DEMISSAO = (
+    'SELECT min(data_admissao) FROM contratos_trabalho '
+    'WHERE cpf_funcionario IN :cpfs AND status IS NOT TRUE AND data_demissao IS NULL'
+)
+
+_cache = {}  # primeiro dia do mês -> (expira_em, {(setor_id, funcao_id): quantidade})
+_geracao = 0  # Incrementada a cada invalidação, para não guardar cálculos anteriores a ela
+_trava = threading.Lock()
+
+
+def meses_entre(inicio, fim):
+    """Primeiros dias dos meses de inicio a fim, inclusive."""
+    mes = inicio.replace(day=1)
+    meses = []
+    while mes <= fim:
+        meses.append(mes)
+        mes = (mes + datetime.timedelta(days=32)).replace(day=1)
+    return meses
+
+
+def quadro_mensal(inicio, fim):
+    """
+    Dicionário {mes: {(setor_id, funcao_id): quantidade}} dos meses de inicio
+    a fim (chaves no primeiro dia do mês). Meses futuros não são calculados.
+    """
+    hoje = datetime.date.today()
+    mes_atual = hoje.replace(day=1)
+    meses = meses_entre(inicio, min(fim, hoje))
+    agora = time.monotonic()
+
+    quadro = {}
+    with _trava:
+        geracao = _geracao
+        for mes in meses:
+            entrada = _cache.get(mes)
+            if entrada and entrada[0] > agora:
+                quadro[mes] = entrada[1]
+    faltantes = [mes for mes in meses if mes not in quadro]
+    if not faltantes:
+        return quadro
+
+    calculados = {mes: {} for mes in faltantes}
+    for mes, setor_id, funcao_id, quantidade in db.session.execute(
+        text(_SQL_QUADRO), {'inicio': faltantes[0], 'fim': faltantes[-1], 'hoje': hoje}
+    ):
+        if mes in calculados:
+            calculados[mes][(setor_id, funcao_id)] = quantidade
+    quadro.update(calculados)
+
+    with _trava:
+        if geracao == _geracao:
+            for mes, grupos in calculados.items():
+                if mes < mes_atual:
+                    _cache[mes] = (agora + VALIDADE_CACHE, grupos)
+    return quadro
+
+
+def invalidar(*datas, cpfs=()):
+    """
+    Descarta do cache os meses a partir da menor data informada (a admissão,
+    antiga e nova, dos contratos incluídos, editados ou excluídos). Com
+    ``cpfs``, considera também a admissão dos contratos inativos sem demissão
+    desses funcionários, cujo fim depende da admissão seguinte.
+    """
+    global _geracao
+    datas = list(datas)
+    cpfs = [cpf for cpf in cpfs if cpf]
+    if cpfs:
+        datas.append(db.session.execute(
+            text(_SQL_ADMISSAO_SEM_DEMISSAO).bindparams(bindparam('cpfs', expanding=True)), {'cpfs': cpfs}
+        ).scalar())
+    datas = [data for data in datas if data]
+    if not datas:
+        return
+    desde = min(datas).replace(day=1)
+    with _trava:
+        _geracao += 1
+        for mes in [mes for mes in _cache if mes >= desde]:
+            del _cache[mes]
+
+
+def limpar_cache():
+    global _geracao
+    with _trava:
+        _geracao += 1
+        _cache.clear()
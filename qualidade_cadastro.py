@@ -0,0 +1,289 @@
+"""
+Verificação da qualidade dos identificadores em funcionarios, registro_ponto
+e dependentes.
+
+As tabelas são percorridas em lotes, paginados pela chave primária, e cada
+lote é validado de uma vez (validacao.validar_cpfs e validar_pis). São
+apontados:
+
+- CPFs com dígito verificador inválido ou com pontuação (chaves primárias; só
+  relatados, pois são referenciados por outras tabelas);
+- PIS inválidos, e PIS gravados com pontuação ou vazios;
+- IDFace com espaços nas pontas ou vazios;
+- marcações de ponto sem funcionário cadastrado;
+- dependentes sem funcionário cadastrado;
+- identificadores repetidos entre funcionários (mesmo CPF, PIS ou IDFace
+  depois de normalizados).
+
+Com ``corrigir=True`` os valores normalizáveis são gravados na forma usada
+nas buscas: PIS só com dígitos, IDFace sem espaços, vazios como NULL, e as
+marcações sem funcionário são associadas pelo PIS ou IDFace quando houver um
+funcionário correspondente (e o resumo diário desses dias é recalculado). O
+commit é feito a cada lote.
+"""
+import csv
+from collections import Counter
+
+from sqlalchemy import func, select, update
+
+from extensions import db
+from models import Dependente, Funcionario, RegistroPonto
+from identificadores import invalidar, resolver_varios, somente_digitos
+from resumo_ponto import atualizar_resumo_diario
+from validacao import validar_cpfs, validar_pis
+
+# Registros lidos por lote.
+TAMANHO_LOTE = 5000
+# Exemplos guardados por tipo de problema no resumo.
+AMOSTRAS = 10
+
+DESCRICOES_PROBLEMAS = {
+    'cpf_invalido': 'CPF inválido ou com pontuação',
+    'pis_invalido': 'PIS inválido',
+    'pis_formatado': 'PIS com pontuação',
+    'pis_vazio': 'PIS vazio (em vez de nulo)',
+    'id_face_espacos': 'IDFace com espaços nas pontas',
+    'id_face_vazio': 'IDFace vazio (em vez de nulo)',
+    'marcacao_sem_funcionario': 'Marcação sem funcionário cadastrado',
+    'marcacao_associada': 'Marcação associada ao funcionário pelo PIS ou IDFace',
+    'marcacao_duplicada': 'Marcação sem funcionário que repete uma marcação já associada',
+    'dependente_sem_funcionario': 'Dependente sem funcionário cadastrado',
+    'identificador_repetido': 'Identificador repetido entre funcionários',
+}
+
+
+class RelatorioQualidade:
+    """
+    Acumula os problemas encontrados: quantidade por tipo, alguns exemplos e,
+    se ``arquivo`` for informado, todas as ocorrências em CSV (tipo, tabela,
+    chave, valor, corrigido).
+    """
+
+    def __init__(self, arquivo=None):
+        self.quantidades = Counter()
+        self.corrigidos = Counter()
+        self.amostras = {}
+        self._csv = csv.writer(arquivo, delimiter=';') if arquivo else None
+        if self._csv:
+            self._csv.writerow(['problema', 'tabela', 'chave', 'valor', 'corrigido'])
+
+    def registrar(self, problema, tabela, chave, valor, corrigido=False):
+        self.quantidades[problema] += 1
+        if corrigido:
+            self.corrigidos[problema] += 1
+        amostras = self.amostras.setdefault(problema, [])
+        if len(amostras) < AMOSTRAS:
+            amostras.append((tabela, chave, valor))
+        if self._csv:
+            self._csv.writerow([problema, tabela, chave, valor, 'sim' if corrigido else 'não'])
+
+
+def _em_lotes(consulta, chave, tamanho_lote):
+    """Executa ``consulta`` (um select) em páginas ordenadas por ``chave``."""
+    ultimo = None
+    while True:
+        pagina = consulta if ultimo is None else consulta.where(chave > ultimo)
+        lote = db.session.execute(pagina.order_by(chave).limit(tamanho_lote)).all()
+        if not lote:
+            return
+        yield lote
+        ultimo = lote[-1][0]
+
+
+def _normalizar_pis(pis):
+    """(problema, valor normalizado) para o PIS gravado, ou (None, pis) se já normalizado."""
+    if pis is None:
+        return None, None
+    if not pis.strip():
+        return 'pis_vazio', None
+    digitos = somente_digitos(pis)
+    if digitos != pis:
+        return 'pis_formatado', digitos
+    return None, pis
+
+
+def _normalizar_id_face(id_face):
+    if id_face is None:
+        return None, None
+    if not id_face.strip():
+        return 'id_face_vazio', None
+    if id_face != id_face.strip():
+        return 'id_face_espacos', id_face.strip()
+    return None, id_face
+
+
+def _valores_em_uso(pendentes):
+    """
+    Pares (campo, valor) de funcionarios que já têm algum dos valores
+    normalizados pendentes; PIS e IDFace são únicos, então esses não podem ser
+    corrigidos sem antes resolver a repetição.
+    """
+    em_uso = set()
+    for campo in ('pis', 'id_face'):
+        valores = {normalizado for _, c, _, _, normalizado in pendentes if c == campo and normalizado}
+        if valores:
+            coluna = getattr(Funcionario, campo)
+            em_uso.update((campo, valor) for (valor,) in db.session.execute(select(coluna).where(coluna.in_(valores))))
+    return em_uso
+
+
+def verificar_funcionarios(relatorio, corrigir=False, tamanho_lote=TAMANHO_LOTE):
+    consulta = select(Funcionario.cpf, Funcionario.pis, Funcionario.id_face)
+    for lote in _em_lotes(consulta, Funcionario.cpf, tamanho_lote):
+        cpfs_validos = validar_cpfs([cpf for cpf, _, _ in lote])
+        pis_validos = validar_pis([somente_digitos(pis) for _, pis, _ in lote])
+        pendentes = []  # (cpf, campo, valor, problema, normalizado)
+        for (cpf, pis, id_face), cpf_valido, pis_valido in zip(lote, cpfs_validos, pis_validos):
+            if not cpf_valido:
+                relatorio.registrar('cpf_invalido', 'funcionarios', cpf, cpf)
+            if pis and pis.strip() and not pis_valido:
+                relatorio.registrar('pis_invalido', 'funcionarios', cpf, pis)
+            for campo, valor, normalizar in (('pis', pis, _normalizar_pis), ('id_face', id_face, _normalizar_id_face)):
+                problema, normalizado = normalizar(valor)
+                if problema:
+                    pendentes.append((cpf, campo, valor, problema, normalizado))
+
+        em_uso = _valores_em_uso(pendentes) if corrigir else set()
+        alteracoes = {}
+        for cpf, campo, valor, problema, normalizado in pendentes:
+            corrigido = corrigir and (campo, normalizado) not in em_uso
+            relatorio.registrar(problema, 'funcionarios', cpf, valor, corrigido)
+            if corrigido:
+                alteracoes.setdefault(cpf, {'cpf': cpf})[campo] = normalizado
+                if normalizado:
+                    em_uso.add((campo, normalizado))
+
+        if alteracoes:
+            # UPDATE em lote pela chave primária
+            db.session.execute(update(Funcionario), list(alteracoes.values()))
+            db.session.commit()
+            for cpf in alteracoes:
+                invalidar(cpf)
+
+
+def verificar_identificadores_repetidos(relatorio):
+    """
+    Funcionários que compartilham o CPF, o PIS ou o IDFace depois de
+    normalizados. Uma consulta agregada por identificador; só relatados.
+    """
+    expressoes = {
+        'cpf': func.regexp_replace(Funcionario.cpf, '[^0-9]', '', 'g'),
+        'pis': Funcionario.pis_digitos,
+        'id_face': func.nullif(func.btrim(Funcionario.id_face), ''),
+    }
+    for campo, expressao in expressoes.items():
+        consulta = (
+            select(expressao, func.array_agg(Funcionario.cpf))
+            .where(expressao.isnot(None))
+            .group_by(expressao)
+            .having(func.count() > 1)
+        )
+        for valor, cpfs in db.session.execute(consulta):
+            relatorio.registrar('identificador_repetido', 'funcionarios', ', '.join(sorted(cpfs)), f'{campo}: {valor}')
+
+
+def _chaves_resolucao(cpf, pis, id_face):
+    """Identificadores de uma marcação sem funcionário, na ordem de preferência."""
+    chaves = []
+    if cpf:
+        chaves.append(('cpf', somente_digitos(cpf)))
+    digitos_pis = somente_digitos(pis)
+    if digitos_pis:
+        chaves += [('pis', digitos_pis), ('pis', digitos_pis[-11:])]
+    if id_face and id_face.strip():
+        chaves.append(('id_face', id_face.strip()))
+    return chaves
+
+
+def verificar_registros_ponto(relatorio, corrigir=False, tamanho_lote=TAMANHO_LOTE):
+    consulta = (
+        select(
+            RegistroPonto.id, RegistroPonto.cpf_funcionario, RegistroPonto.pis, RegistroPonto.id_face,
+            RegistroPonto.data_hora, Funcionario.cpf.isnot(None),
+        )
+        .outerjoin(Funcionario, Funcionario.cpf == RegistroPonto.cpf_funcionario)
+    )
+    for lote in _em_lotes(consulta, RegistroPonto.id, tamanho_lote):
+        cpfs_validos = validar_cpfs([cpf or '' for _, cpf, _, _, _, _ in lote])
+        orfas = [linha for linha in lote if not linha[5]]
+        encontrados = resolver_varios(
+            chave for _, cpf, pis, id_face, _, _ in orfas for chave in _chaves_resolucao(cpf, pis, id_face)
+        )
+
+        # Marcações já associadas nos mesmos instantes: a associação de uma
+        # órfã não pode repetir (cpf_funcionario, data_hora).
+        associacoes = {}
+        for id, cpf, pis, id_face, data_hora, _ in orfas:
+            funcionario = next(
+                (encontrados[chave] for chave in _chaves_resolucao(cpf, pis, id_face) if chave in encontrados), None
+            )
+            if funcionario:
+                associacoes[id] = (funcionario[0], data_hora)
+        ocupados = set()
+        if associacoes:
+            pares = set(associacoes.values())
+            ocupados = set(db.session.execute(
+                select(RegistroPonto.cpf_funcionario, RegistroPonto.data_hora).where(
+                    RegistroPonto.cpf_funcionario.in_({cpf for cpf, _ in pares}),
+                    RegistroPonto.data_hora.in_({data_hora for _, data_hora in pares}),
+                )
+            ).all())
+
+        alteracoes, associadas = [], set()
+        for (id, cpf, pis, id_face, data_hora, tem_funcionario), cpf_valido in zip(lote, cpfs_validos):
+            if cpf and not cpf_valido:
+                relatorio.registrar('cpf_invalido', 'registro_ponto', id, cpf)
+
+            alteracao = {}
+            for campo, valor, normalizar in (('pis', pis, _normalizar_pis), ('id_face', id_face, _normalizar_id_face)):
+                problema, normalizado = normalizar(valor)
+                if problema:
+                    relatorio.registrar(problema, 'registro_ponto', id, valor, corrigir)
+                    alteracao[campo] = normalizado
+
+            if not tem_funcionario:
+                identificacao = cpf or pis or id_face or ''
+                if id not in associacoes:
+                    relatorio.registrar('marcacao_sem_funcionario', 'registro_ponto', id, identificacao)
+                elif associacoes[id] in ocupados:
+                    relatorio.registrar('marcacao_duplicada', 'registro_ponto', id, identificacao)
+                else:
+                    novo_cpf = associacoes[id][0]
+                    relatorio.registrar('marcacao_associada', 'registro_ponto', id, f'{identificacao} -> {novo_cpf}', corrigir)
+                    ocupados.add(associacoes[id])
+                    alteracao['cpf_funcionario'] = novo_cpf
+                    associadas.add((novo_cpf, data_hora))
+            if alteracao:
+                alteracoes.append(dict(alteracao, id=id))
+
+        if corrigir and alteracoes:
+            db.session.execute(update(RegistroPonto), alteracoes)
+            atualizar_resumo_diario(associadas)
+            db.session.commit()
+
+
+def verificar_dependentes(relatorio, tamanho_lote=TAMANHO_LOTE):
+    consulta = (
+        select(Dependente.cpf_dependente, Dependente.cpf_funcionario, Funcionario.cpf.isnot(None))
+        .outerjoin(Funcionario, Funcionario.cpf == Dependente.cpf_funcionario)
+    )
+    for lote in _em_lotes(consulta, Dependente.cpf_dependente, tamanho_lote):
+        cpfs_validos = validar_cpfs([cpf for cpf, _, _ in lote])
+        for (cpf, cpf_funcionario, tem_funcionario), cpf_valido in zip(lote, cpfs_validos):
+            if not cpf_valido:
+                relatorio.registrar('cpf_invalido', 'dependentes', cpf, cpf)
+            if not tem_funcionario:
+                relatorio.registrar('dependente_sem_funcionario', 'dependentes', cpf, cpf_funcionario)
+
+
+def verificar_cadastro(corrigir=False, tamanho_lote=TAMANHO_LOTE, arquivo=None):
+    """
+    Verifica as três tabelas e retorna o RelatorioQualidade. ``arquivo`` (um
+    arquivo texto aberto) recebe todas as ocorrências em CSV.
+    """
+    relatorio = RelatorioQualidade(arquivo)
+    verificar_funcionarios(relatorio, corrigir, tamanho_lote)
+    verificar_identificadores_repetidos(relatorio)
+    verificar_registros_ponto(relatorio, corrigir, tamanho_lote)
+    verificar_dependentes(relatorio, tamanho_lote)
+    return relatorio
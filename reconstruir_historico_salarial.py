@@ -0,0 +1,28 @@
+"""
+Reconstrói o histórico salarial (historico_salarial) de todos os funcionários
+a partir dos contratos e dos reajustes salariais.
+
+Uso:
+    python reconstruir_historico_salarial.py [--lote 1000]
+"""
+import argparse
+
+from app import create_app
+from extensions import db
+from historico_salarial import TAMANHO_LOTE, reconstruir_historico_salarial
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconstrói o histórico salarial de todos os funcionários.')
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help='Funcionários recalculados por lote')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        periodos = reconstruir_historico_salarial(args.lote)
+        db.session.commit()
+        print(f"Histórico salarial reconstruído: {periodos} períodos.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""
+Reconstrói o resumo diário de ponto (resumo_ponto_diario) a partir das
+marcações de registro_ponto.
+
+Uso:
+    python reconstruir_resumo_ponto.py 2025-01-01 2025-01-31
+"""
+import argparse
+import datetime
+
+from app import create_app
+from extensions import db
+from resumo_ponto import reconstruir_resumo_diario
+
+
+def _data(valor):
+    return datetime.datetime.strptime(valor, '%Y-%m-%d').date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconstrói o resumo diário de ponto de um período.')
+    parser.add_argument('inicio', type=_data, help='Data inicial (AAAA-MM-DD)')
+    parser.add_argument('fim', type=_data, help='Data final, inclusive (AAAA-MM-DD)')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        dias = reconstruir_resumo_diario(args.inicio, args.fim)
+        db.session.commit()
+        print(f"Resumo reconstruído: {dias} dias de funcionários entre {args.inicio} e {args.fim}.")
+
+
+if __name__ == '__main__':
+    main()
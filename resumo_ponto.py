@@ -0,0 +1,216 @@
+"""
+Resumo diário de presença (tabela resumo_ponto_diario).
+
+Cada linha resume as marcações de um funcionário em um dia da jornada:
+primeira e última marcação, quantidade, minutos trabalhados e o indicador de
+anomalia (quantidade ímpar de marcações). O dia e os pares entrada/saída são
+os do espelho de ponto (``espelho_ponto.dia_da_jornada`` e ``calcular_dia``):
+um turno noturno, das 22:00 às 06:00, fica inteiro no dia em que começou.
+
+O resumo é mantido de forma incremental: toda gravação, edição ou exclusão de
+marcações recalcula apenas os dias afetados, na mesma transação. Relatórios e
+painéis leem esta tabela em vez de agregar registro_ponto.
+
+Transações simultâneas que alteram marcações do mesmo funcionário
+(importações em segundo plano, API de lotes) são serializadas por advisory
+locks, um por grupo de funcionários (o CPF distribuído em GRUPOS_BLOQUEIO
+grupos, para que uma importação grande não esgote a tabela de locks do
+PostgreSQL): a segunda recalcula os dias depois que a primeira terminou,
+vendo as marcações das duas. Os locks são obtidos uma única vez por
+transação, todos de uma vez e em ordem de grupo, logo antes do recálculo;
+por isso as importações acumulam os dias afetados (``dias_afetados``) e
+chamam ``recalcular_dias`` uma vez, antes do commit. O resumo é gravado com
+INSERT ... ON CONFLICT DO UPDATE.
+"""
+from collections import defaultdict
+from itertools import groupby
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY, DATE, VARCHAR
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from extensions import db
+from models import ResumoPontoDiario
+from espelho_ponto import (
+    TIPOS_ABONO, UM_DIA, calcular_dia, carregar_marcacoes, carregar_vigencias, dia_da_jornada,
+)
+
+# Dias por consulta na reconstrução de um período.
+DIAS_POR_BLOCO = 31
+# Dias (funcionário e data) recalculados por consulta.
+TAMANHO_BLOCO_DIAS = 5000
+# Grupos de funcionários para os advisory locks do recálculo.
+GRUPOS_BLOQUEIO = 256
+# Máximo de linhas por comando INSERT ... ON CONFLICT.
+TAMANHO_BLOCO_INSERT = 1000
+
+# Um advisory lock por grupo de funcionários, obtidos em ordem de grupo para
+# que duas transações com funcionários em comum não entrem em deadlock.
+_SQL_BLOQUEAR_FUNCIONARIOS = '''
+    SELECT pg_advisory_xact_lock(hashtext('resumo_ponto_diario'), grupo)
+    FROM (
+        SELECT DISTINCT hashtext(cpf_funcionario) & (:grupos - 1) AS grupo
+        FROM unnest(:cpfs) AS chaves(cpf_funcionario)
+        ORDER BY 1
+    ) AS grupos
+'''
+
+# Marcações em torno de cada dia: o dia da jornada pode começar na véspera e
+# terminar no dia seguinte. O índice único (cpf_funcionario, data_hora) de
+# registro_ponto atende a busca de cada dia.
+_SQL_MARCACOES_DOS_DIAS = '''
+    SELECT DISTINCT r.cpf_funcionario, r.data_hora
+    FROM unnest(:cpfs, :datas) AS chaves(cpf_funcionario, data)
+    JOIN registro_ponto r
+      ON r.cpf_funcionario = chaves.cpf_funcionario
+     AND r.data_hora >= chaves.data - 1
+     AND r.data_hora < chaves.data + 2
+    WHERE r.tipo_lancamento NOT IN :tipos_abono
+    ORDER BY 1, 2
+'''
+
+# Dias que ficaram sem marcações (todas excluídas ou só abonos).
+_SQL_REMOVER_DIAS = '''
+    DELETE FROM resumo_ponto_diario s
+    USING unnest(:cpfs, :datas) AS chaves(cpf_funcionario, data)
+    WHERE s.cpf_funcionario = chaves.cpf_funcionario AND s.data = chaves.data
+'''
+
+
+def _parametros_chaves(chaves):
+    return [
+        bindparam('cpfs', value=[cpf for cpf, _ in chaves], type_=ARRAY(VARCHAR)),
+        bindparam('datas', value=[data for _, data in chaves], type_=ARRAY(DATE)),
+    ]
+
+
+def resumir_dias(cpf, marcacoes, vigencias):
+    """
+    Resume as marcações (datetimes ordenados, sem abonos) de um funcionário
+    por dia da jornada, conforme as vigências dos contratos (ver
+    ``espelho_ponto.separar_vigencias``). Retorna {data: linha do resumo}.
+    """
+    por_dia = defaultdict(list)
+    for data_hora in marcacoes:
+        por_dia[dia_da_jornada(data_hora, vigencias)].append(data_hora)
+
+    resumo = {}
+    for data, do_dia in por_dia.items():
+        dia = calcular_dia(cpf, data, do_dia, [])
+        resumo[data] = {
+            'cpf_funcionario': cpf,
+            'data': data,
+            'primeira_marcacao': do_dia[0],
+            'ultima_marcacao': do_dia[-1],
+            'quantidade_marcacoes': len(do_dia),
+            'minutos_trabalhados': dia.minutos_trabalhados,
+            'anomalia': dia.marcacao_faltante,
+        }
+    return resumo
+
+
+def _gravar_resumos(linhas):
+    for i in range(0, len(linhas), TAMANHO_BLOCO_INSERT):
+        stmt = pg_insert(ResumoPontoDiario).values(linhas[i:i + TAMANHO_BLOCO_INSERT])
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['cpf_funcionario', 'data'],
+            set_={
+                campo: stmt.excluded[campo]
+                for campo in ('primeira_marcacao', 'ultima_marcacao', 'quantidade_marcacoes',
+                              'minutos_trabalhados', 'anomalia')
+            },
+        ))
+
+
+def dias_afetados(marcacoes):
+    """
+    Dias da jornada, como pares (cpf, data), das marcações informadas como
+    pares (cpf, data_hora) incluídas, alteradas (antes e depois) ou excluídas.
+    """
+    marcacoes = {(cpf, data_hora) for cpf, data_hora in marcacoes if cpf}
+    if not marcacoes:
+        return set()
+    datas = [data_hora.date() for _, data_hora in marcacoes]
+    vigencias = carregar_vigencias(min(datas), max(datas), sorted({cpf for cpf, _ in marcacoes}))
+    return {(cpf, dia_da_jornada(data_hora, vigencias.get(cpf, []))) for cpf, data_hora in marcacoes}
+
+
+def _recalcular_bloco(chaves):
+    datas = [data for _, data in chaves]
+    # As marcações de um dia da jornada ficam entre a véspera e o dia seguinte
+    vigencias = carregar_vigencias(min(datas) - UM_DIA, max(datas) + 2 * UM_DIA, sorted({cpf for cpf, _ in chaves}))
+    registros = db.session.execute(
+        text(_SQL_MARCACOES_DOS_DIAS).bindparams(
+            *_parametros_chaves(chaves), bindparam('tipos_abono', value=list(TIPOS_ABONO), expanding=True)
+        )
+    )
+    dias_por_cpf = defaultdict(set)
+    for cpf, data in chaves:
+        dias_por_cpf[cpf].add(data)
+
+    linhas = []
+    for cpf, grupo in groupby(registros, key=lambda r: r[0]):
+        resumo = resumir_dias(cpf, [data_hora for _, data_hora in grupo], vigencias.get(cpf, []))
+        linhas.extend(resumo[data] for data in sorted(dias_por_cpf[cpf]) if data in resumo)
+    _gravar_resumos(linhas)
+
+    gravados = {(linha['cpf_funcionario'], linha['data']) for linha in linhas}
+    vazios = [chave for chave in chaves if chave not in gravados]
+    if vazios:
+        db.session.execute(text(_SQL_REMOVER_DIAS).bindparams(*_parametros_chaves(vazios)))
+
+
+def recalcular_dias(chaves):
+    """
+    Recalcula o resumo dos dias informados, como pares (cpf, data) de dias da
+    jornada, a partir das marcações atuais; dias sem marcações são removidos
+    do resumo. Antes, bloqueia os funcionários até o fim da transação; deve
+    ser chamada uma única vez por transação. Não faz commit.
+    """
+    chaves = sorted({(cpf, data) for cpf, data in chaves if cpf})
+    if not chaves:
+        return
+    db.session.execute(
+        text(_SQL_BLOQUEAR_FUNCIONARIOS).bindparams(
+            bindparam('cpfs', value=sorted({cpf for cpf, _ in chaves}), type_=ARRAY(VARCHAR)),
+            bindparam('grupos', value=GRUPOS_BLOQUEIO),
+        )
+    )
+    for i in range(0, len(chaves), TAMANHO_BLOCO_DIAS):
+        _recalcular_bloco(chaves[i:i + TAMANHO_BLOCO_DIAS])
+
+
+def atualizar_resumo_diario(marcacoes):
+    """
+    Recalcula o resumo dos dias da jornada das marcações informadas, como
+    pares (cpf, data_hora) incluídos, alterados (antes e depois) ou excluídos
+    (ver ``recalcular_dias``). Não faz commit.
+    """
+    recalcular_dias(dias_afetados(marcacoes))
+
+
+def reconstruir_resumo_diario(data_inicio, data_fim):
+    """
+    Apaga e recalcula o resumo de todos os funcionários entre as duas datas
+    (inclusive), em blocos de DIAS_POR_BLOCO dias. Retorna a quantidade de
+    dias gravados. Não faz commit.
+    """
+    db.session.execute(
+        text('DELETE FROM resumo_ponto_diario WHERE data BETWEEN :data_inicio AND :data_fim'),
+        {'data_inicio': data_inicio, 'data_fim': data_fim},
+    )
+
+    dias = 0
+    inicio = data_inicio
+    while inicio <= data_fim:
+        fim = min(data_fim, inicio + (DIAS_POR_BLOCO - 1) * UM_DIA)
+        vigencias = carregar_vigencias(inicio - UM_DIA, fim + 2 * UM_DIA)
+        linhas = []
+        for cpf, registros in groupby(carregar_marcacoes(inicio, fim), key=lambda r: r[0]):
+            marcacoes = [data_hora for _, data_hora, tipo in registros if tipo not in TIPOS_ABONO]
+            resumo = resumir_dias(cpf, marcacoes, vigencias.get(cpf, []))
+            linhas.extend(linha for data, linha in sorted(resumo.items()) if inicio <= data <= fim)
+        _gravar_resumos(linhas)
+        dias += len(linhas)
+        inicio = fim + UM_DIA
+    return dias
@@ -0,0 +1,105 @@
+"""
+Execução de importações de AFD em segundo plano.
+
+Cada arquivo enviado vira uma TarefaImportacao, processada por um pool local
+de threads. O estado da tarefa é gravado em uma conexão própria, de modo que
+o endpoint de status enxerga o progresso enquanto a importação ainda está em
+andamento na transação principal.
+
+Um ZIP com os AFDs de vários relógios vira uma única tarefa, cujos arquivos
+são importados em paralelo por um pool de processos, um relógio por processo
+(ver importacao_ponto).
+"""
+import datetime
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import update
+
+from extensions import db
+from models import TarefaImportacao
+from importacao_ponto import importar_arquivo_afd, importar_arquivos_afd, expandir_arquivos_afd
+
+# Quantidade padrão de importações executadas ao mesmo tempo.
+WORKERS_PADRAO = 4
+
+_executor = None
+
+
+def _obter_executor(app):
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=app.config.get('IMPORTACAO_WORKERS', WORKERS_PADRAO),
+            thread_name_prefix='importacao_afd',
+        )
+    return _executor
+
+
+def atualizar_tarefa(tarefa_id, **valores):
+    """Grava o estado da tarefa imediatamente, fora da transação da importação."""
+    with db.engine.begin() as conn:
+        conn.execute(
+            update(TarefaImportacao).where(TarefaImportacao.id == tarefa_id).values(**valores)
+        )
+
+
+def _executar_importacao(app, tarefa_id, caminho):
+    with app.app_context():
+        atualizar_tarefa(tarefa_id, status='Processando', data_inicio=datetime.datetime.now())
+        try:
+            resumo = importar_arquivo_afd(
+                caminho,
+                progresso=lambda parcial: atualizar_tarefa(tarefa_id, **parcial),
+            )
+        except Exception as e:
+            db.session.rollback()
+            print(f"ERROR: Falha na importação AFD (tarefa {tarefa_id}): {e}")
+            atualizar_tarefa(tarefa_id, status='Erro', erro=str(e), data_fim=datetime.datetime.now())
+        else:
+            atualizar_tarefa(tarefa_id, status='Concluída', data_fim=datetime.datetime.now(), **resumo)
+        finally:
+            try:
+                os.remove(caminho)
+            except OSError as e:
+                print(f"ERROR: Não foi possível remover o arquivo temporário {caminho}: {e}")
+
+
+def _executar_importacao_zip(app, tarefa_id, caminho):
+    with app.app_context():
+        atualizar_tarefa(tarefa_id, status='Processando', data_inicio=datetime.datetime.now())
+        pasta = tempfile.mkdtemp(prefix='afd_', dir=app.config['UPLOAD_FOLDER'])
+        try:
+            extraidos = expandir_arquivos_afd(caminho, pasta)
+            resumo, arquivos = importar_arquivos_afd(
+                [c for c, _ in extraidos],
+                nomes=[nome for _, nome in extraidos],
+                processos=app.config.get('IMPORTACAO_PROCESSOS'),
+                progresso=lambda parcial: atualizar_tarefa(tarefa_id, **parcial),
+            )
+        except Exception as e:
+            db.session.rollback()
+            print(f"ERROR: Falha na importação AFD (tarefa {tarefa_id}): {e}")
+            atualizar_tarefa(tarefa_id, status='Erro', erro=str(e), data_fim=datetime.datetime.now())
+        else:
+            atualizar_tarefa(
+                tarefa_id, status='Concluída', data_fim=datetime.datetime.now(), arquivos=arquivos, **resumo
+            )
+        finally:
+            shutil.rmtree(pasta, ignore_errors=True)
+            try:
+                os.remove(caminho)
+            except OSError as e:
+                print(f"ERROR: Não foi possível remover o arquivo temporário {caminho}: {e}")
+
+
+def submeter_importacao(app, tarefa_id, caminho):
+    """Enfileira a importação do arquivo ``caminho`` para a tarefa informada."""
+    _obter_executor(app).submit(_executar_importacao, app, tarefa_id, caminho)
+
+
+def submeter_importacao_zip(app, tarefa_id, caminho):
+    """Enfileira a importação de todos os AFDs do ZIP ``caminho`` em uma única tarefa."""
+    _obter_executor(app).submit(_executar_importacao_zip, app, tarefa_id, caminho)
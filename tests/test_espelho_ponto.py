@@ -0,0 +1,73 @@
+import datetime
+from types import SimpleNamespace
+
+from espelho_ponto import agrupar_por_dia, calcular_dia, separar_vigencias, turnos_da_jornada
+
+CPF = '12345678909'
+SEGUNDA = datetime.date(2025, 1, 6)
+
+
+def _hora(data, texto, dias=0):
+    hora = datetime.datetime.strptime(texto, '%H:%M').time()
+    return datetime.datetime.combine(data + datetime.timedelta(days=dias), hora)
+
+
+def _jornada(*turnos):
+    horas = [datetime.datetime.strptime(h, '%H:%M').time() for h in turnos]
+    return SimpleNamespace(
+        primeiro_turno_inicio=horas[0], primeiro_turno_fim=horas[1],
+        segundo_turno_inicio=horas[2], segundo_turno_fim=horas[3],
+        turno_extra_inicio=None, turno_extra_fim=None,
+    )
+
+
+NOTURNA = _jornada('22:00', '02:00', '03:00', '06:00')
+
+
+def test_turnos_noturnos_sao_consecutivos():
+    assert turnos_da_jornada(NOTURNA) == [(22 * 60, 26 * 60), (27 * 60, 30 * 60)]
+    assert turnos_da_jornada(_jornada('08:00', '12:00', '13:00', '17:00')) == [(480, 720), (780, 1020)]
+
+
+def test_turno_das_22_as_06_fica_no_dia_em_que_comecou():
+    turnos = turnos_da_jornada(NOTURNA)
+    vigencias = [(SEGUNDA, None, turnos)]
+    marcacoes = [
+        _hora(SEGUNDA, '21:58'), _hora(SEGUNDA, '02:00', 1), _hora(SEGUNDA, '03:00', 1), _hora(SEGUNDA, '06:02', 1),
+        _hora(SEGUNDA, '22:05', 1), _hora(SEGUNDA, '02:00', 2), _hora(SEGUNDA, '03:00', 2), _hora(SEGUNDA, '06:00', 2),
+    ]
+
+    dias = agrupar_por_dia([(m, 'Importação PIS') for m in marcacoes], vigencias)
+    assert sorted(dias) == [SEGUNDA, SEGUNDA + datetime.timedelta(days=1)]
+    assert dias[SEGUNDA] == (marcacoes[:4], False)
+
+    segunda = calcular_dia(CPF, SEGUNDA, dias[SEGUNDA][0], turnos)
+    assert segunda.minutos_previstos == 7 * 60
+    assert segunda.minutos_trabalhados == 7 * 60 + 4
+    assert (segunda.minutos_extras, segunda.minutos_falta, segunda.minutos_atraso) == (0, 0, 0)
+    assert not segunda.marcacao_faltante
+
+    terca = calcular_dia(CPF, SEGUNDA + datetime.timedelta(days=1), dias[SEGUNDA + datetime.timedelta(days=1)][0], turnos)
+    assert terca.minutos_trabalhados == 7 * 60 - 5
+    assert not terca.marcacao_faltante
+
+
+def test_abono_fica_no_dia_civil():
+    vigencias = [(SEGUNDA, None, turnos_da_jornada(NOTURNA))]
+    dias = agrupar_por_dia([(_hora(SEGUNDA, '00:00'), 'Atestado')], vigencias)
+    assert dias == {SEGUNDA: ([], True)}
+
+
+def test_contratos_sobrepostos_terminam_na_vespera_da_admissao_seguinte():
+    turnos = turnos_da_jornada(NOTURNA)
+    contratos = [
+        (datetime.date(2020, 1, 1), None, turnos),
+        (datetime.date(2022, 3, 1), datetime.date(2024, 12, 31), turnos),
+        (datetime.date(2024, 6, 1), None, []),
+        (datetime.date(2024, 6, 1), None, turnos),
+    ]
+    assert separar_vigencias(contratos) == [
+        (datetime.date(2020, 1, 1), datetime.date(2022, 2, 28), turnos),
+        (datetime.date(2022, 3, 1), datetime.date(2024, 5, 31), turnos),
+        (datetime.date(2024, 6, 1), None, turnos),
+    ]
@@ -0,0 +1,53 @@
+import datetime
+from types import SimpleNamespace
+
+from espelho_ponto import turnos_da_jornada
+from resumo_ponto import resumir_dias
+
+CPF = '12345678909'
+SEGUNDA = datetime.date(2025, 1, 6)
+TERCA = SEGUNDA + datetime.timedelta(days=1)
+
+
+def _hora(data, texto, dias=0):
+    hora = datetime.datetime.strptime(texto, '%H:%M').time()
+    return datetime.datetime.combine(data + datetime.timedelta(days=dias), hora)
+
+
+def _jornada(*turnos):
+    horas = [datetime.datetime.strptime(h, '%H:%M').time() for h in turnos]
+    return SimpleNamespace(
+        primeiro_turno_inicio=horas[0], primeiro_turno_fim=horas[1],
+        segundo_turno_inicio=horas[2], segundo_turno_fim=horas[3],
+        turno_extra_inicio=None, turno_extra_fim=None,
+    )
+
+
+def test_turno_das_22_as_06_fica_em_uma_linha_do_resumo():
+    vigencias = [(SEGUNDA, None, turnos_da_jornada(_jornada('22:00', '02:00', '03:00', '06:00')))]
+    marcacoes = [
+        _hora(SEGUNDA, '22:00'), _hora(SEGUNDA, '02:00', 1), _hora(SEGUNDA, '03:00', 1), _hora(SEGUNDA, '06:00', 1),
+        _hora(SEGUNDA, '22:05', 1), _hora(SEGUNDA, '06:00', 2),
+    ]
+
+    resumo = resumir_dias(CPF, marcacoes, vigencias)
+    assert sorted(resumo) == [SEGUNDA, TERCA]
+    assert resumo[SEGUNDA] == {
+        'cpf_funcionario': CPF,
+        'data': SEGUNDA,
+        'primeira_marcacao': _hora(SEGUNDA, '22:00'),
+        'ultima_marcacao': _hora(SEGUNDA, '06:00', 1),
+        'quantidade_marcacoes': 4,
+        'minutos_trabalhados': 7 * 60,
+        'anomalia': False,
+    }
+    assert resumo[TERCA]['quantidade_marcacoes'] == 2
+    assert resumo[TERCA]['minutos_trabalhados'] == 7 * 60 + 55
+    assert not resumo[TERCA]['anomalia']
+
+
+def test_sem_contrato_vale_o_dia_civil():
+    marcacoes = [_hora(SEGUNDA, '22:00'), _hora(SEGUNDA, '06:00', 1)]
+    resumo = resumir_dias(CPF, marcacoes, [])
+    assert sorted(resumo) == [SEGUNDA, TERCA]
+    assert resumo[SEGUNDA]['anomalia'] and resumo[TERCA]['anomalia']
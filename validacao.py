@@ -0,0 +1,117 @@
+"""
+Validação de documentos: dígitos verificadores de CPF e PIS/PASEP/NIT.
+
+valida_cpf e valida_pis validam um número por vez. Para importações e
+verificações de muitos cadastros, validar_cpfs e validar_pis calculam os
+dígitos de uma sequência inteira de uma vez com o NumPy, sobre uma matriz de
+dígitos, e retornam uma lista de booleanos na mesma ordem. Sem o NumPy
+instalado, as funções em lote recorrem às funções de um número.
+"""
+try:
+    import numpy as np
+except ImportError:  # NumPy é opcional: as funções em lote usam as escalares
+    np = None
+
+
+def valida_cpf(cpf):
+    """
+    Valida o CPF de acordo com o algoritmo da Receita Federal.
+    Aceita CPF com ou sem pontos e traço.
+    """
+    cpf = ''.join(filter(str.isdigit, cpf)) # Remove pontos e traço
+
+    if len(cpf) != 11 or len(set(cpf)) == 1: # Verifica se tem 11 dígitos e não são todos iguais
+        return False
+
+    # Validação do primeiro dígito
+    soma = 0
+    for i in range(9):
+        soma += int(cpf[i]) * (10 - i)
+    digito1 = 11 - (soma % 11)
+    if digito1 > 9:
+        digito1 = 0
+    if digito1 != int(cpf[9]):
+        return False
+
+    # Validação do segundo dígito
+    soma = 0
+    for i in range(10):
+        soma += int(cpf[i]) * (11 - i)
+    digito2 = 11 - (soma % 11)
+    if digito2 > 9:
+        digito2 = 0
+    if digito2 != int(cpf[10]):
+        return False
+
+    return True
+
+
+# Pesos dos 10 primeiros dígitos do PIS/PASEP/NIT.
+PESOS_PIS = (3, 2, 9, 8, 7, 6, 5, 4, 3, 2)
+
+
+def valida_pis(pis):
+    """
+    Valida o PIS/PASEP/NIT pelo dígito verificador (módulo 11).
+    Aceita o número com ou sem pontuação.
+    """
+    pis = ''.join(filter(str.isdigit, pis))
+
+    if len(pis) != 11 or len(set(pis)) == 1:
+        return False
+
+    soma = sum(int(digito) * peso for digito, peso in zip(pis, PESOS_PIS))
+    digito = 11 - (soma % 11)
+    if digito > 9:
+        digito = 0
+    return digito == int(pis[10])
+
+
+def _matriz_digitos(valores, tamanho):
+    """
+    Converte uma sequência de strings em (digitos, validos): matriz n x
+    ``tamanho`` de inteiros e máscara das linhas com exatamente ``tamanho``
+    dígitos. Valores com pontuação, vazios ou None são marcados inválidos.
+    """
+    try:
+        brutos = np.asarray(valores, dtype=f'S{tamanho + 1}')
+    except UnicodeEncodeError:
+        brutos = np.asarray([str(v).encode('ascii', 'replace') for v in valores], dtype=f'S{tamanho + 1}')
+    # Cada string ocupa tamanho + 1 bytes, completados com zero: o byte extra
+    # zerado garante que o valor não tem mais dígitos que o esperado.
+    bytes_ = brutos.reshape(-1).view(np.uint8).reshape(-1, tamanho + 1)
+    digitos = bytes_[:, :tamanho].astype(np.int16) - ord('0')
+    validos = ((digitos >= 0) & (digitos <= 9)).all(axis=1) & (bytes_[:, tamanho] == 0)
+    # Todos os dígitos iguais (000.000.000-00, 111...) não são aceitos
+    validos &= ~(digitos == digitos[:, :1]).all(axis=1)
+    return digitos, validos
+
+
+def _digito_modulo_11(digitos, pesos):
+    digito = 11 - (digitos @ np.asarray(pesos)) % 11
+    return np.where(digito > 9, 0, digito)
+
+
+def validar_cpfs(cpfs):
+    """
+    Valida uma sequência de CPFs com apenas dígitos (11 caracteres) e retorna
+    uma lista de booleanos, na mesma ordem. Para CPFs formatados, remova a
+    pontuação antes.
+    """
+    if np is None:
+        return [len(cpf or '') == 11 and cpf.isdigit() and valida_cpf(cpf) for cpf in cpfs]
+    digitos, validos = _matriz_digitos(cpfs, 11)
+    digito1 = _digito_modulo_11(digitos[:, :9], range(10, 1, -1))
+    digito2 = _digito_modulo_11(digitos[:, :10], range(11, 1, -1))
+    return (validos & (digito1 == digitos[:, 9]) & (digito2 == digitos[:, 10])).tolist()
+
+
+def validar_pis(numeros):
+    """
+    Valida uma sequência de PIS/PASEP/NIT com apenas dígitos (11 caracteres)
+    e retorna uma lista de booleanos, na mesma ordem.
+    """
+    if np is None:
+        return [len(pis or '') == 11 and pis.isdigit() and valida_pis(pis) for pis in numeros]
+    digitos, validos = _matriz_digitos(numeros, 11)
+    return (validos & (_digito_modulo_11(digitos[:, :10], PESOS_PIS) == digitos[:, 10])).tolist()
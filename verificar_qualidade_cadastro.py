@@ -0,0 +1,39 @@
+"""
+Verifica os identificadores (CPF, PIS, IDFace) de funcionários, marcações de
+ponto e dependentes e, com --corrigir, normaliza os valores corrigíveis.
+
+Uso:
+    python verificar_qualidade_cadastro.py [--corrigir] [--lote 5000] [--saida ocorrencias.csv]
+"""
+import argparse
+
+from app import create_app
+from qualidade_cadastro import DESCRICOES_PROBLEMAS, TAMANHO_LOTE, verificar_cadastro
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verifica a qualidade dos identificadores do cadastro.')
+    parser.add_argument('--corrigir', action='store_true', help='Grava os valores normalizados e associa marcações órfãs')
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help='Registros lidos por lote')
+    parser.add_argument('--saida', help='Arquivo CSV com todas as ocorrências')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if args.saida:
+            with open(args.saida, 'w', newline='', encoding='utf-8') as arquivo:
+                relatorio = verificar_cadastro(args.corrigir, args.lote, arquivo)
+        else:
+            relatorio = verificar_cadastro(args.corrigir, args.lote)
+
+    if not relatorio.quantidades:
+        print("Nenhum problema encontrado.")
+    for problema, quantidade in relatorio.quantidades.most_common():
+        corrigidos = relatorio.corrigidos[problema]
+        print(f"{DESCRICOES_PROBLEMAS[problema]}: {quantidade}" + (f" ({corrigidos} corrigidos)" if corrigidos else ''))
+        for tabela, chave, valor in relatorio.amostras[problema]:
+            print(f"    {tabela} {chave}: {valor}")
+
+
+if __name__ == '__main__':
+    main()